@@ -0,0 +1,113 @@
+import sys
+import time
+import builtins
+import importlib
+from models.logs.logger import logger
+
+
+class LazyRegistry:
+    """
+    Registro de componentes resolvidos sob demanda.
+
+    Cada nome aponta para "pacote.modulo:Atributo"; o módulo só é importado na primeira
+    resolução. Assim cada subcomando do CLI paga apenas pelas bibliotecas que usa.
+    """
+
+    def __init__(self, entries: dict = None):
+        self._entries = dict(entries or {})
+        self._resolved = {}
+
+    def register(self, name: str, target: str):
+        if ":" not in target:
+            raise ValueError(f"Alvo inválido para '{name}': use 'modulo:atributo' (recebido '{target}').")
+        self._entries[name] = target
+        self._resolved.pop(name, None)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    @property
+    def names(self) -> list:
+        return list(self._entries)
+
+    def resolve(self, name: str):
+        if name in self._resolved:
+            return self._resolved[name]
+        if name not in self._entries:
+            raise KeyError(f"Componente desconhecido: {name}. Opções: {self.names}")
+
+        module_name, attribute = self._entries[name].split(":", 1)
+        start = time.perf_counter()
+        obj = getattr(importlib.import_module(module_name), attribute)
+        logger.debug(f"Componente '{name}' resolvido ({module_name}) em {time.perf_counter() - start:.3f}s")
+        self._resolved[name] = obj
+        return obj
+
+    def create(self, name: str, *args, **kwargs):
+        """Resolve e instancia (ou chama) o componente."""
+        return self.resolve(name)(*args, **kwargs)
+
+
+class ImportProfiler:
+    """
+    Mede o tempo de cada import feito enquanto ativo (equivalente em runtime ao `python -X importtime`).
+
+    Registra, para cada módulo carregado pela primeira vez, o tempo acumulado (incluindo os imports
+    que ele dispara) e o tempo próprio.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._stack = []
+        self._original_import = None
+        self._original_import_module = None
+
+    def _timed(self, name: str, load):
+        if name in sys.modules:
+            return load()
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            return load()
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.records.append((name, elapsed, elapsed - children))
+
+    def start(self) -> "ImportProfiler":
+        self._original_import = builtins.__import__
+        self._original_import_module = importlib.import_module
+        original_import, original_import_module = self._original_import, self._original_import_module
+
+        def profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+            load = lambda: original_import(name, globals, locals, fromlist, level)
+            return load() if level else self._timed(name, load)
+
+        def profiled_import_module(name, package=None):
+            return self._timed(name, lambda: original_import_module(name, package))
+
+        builtins.__import__ = profiled_import
+        importlib.import_module = profiled_import_module
+        return self
+
+    def stop(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            importlib.import_module = self._original_import_module
+            self._original_import = None
+
+    def report(self, top: int = 25) -> str:
+        # Imports circulares podem registrar o mesmo módulo duas vezes; fica a medição externa
+        modules = {}
+        for name, cumulative, self_time in self.records:
+            if name not in modules or cumulative > modules[name][0]:
+                modules[name] = (cumulative, self_time)
+        total = sum(self_time for _, self_time in modules.values())
+        lines = [f"Imports: {len(modules)} módulos, {total:.3f}s no total",
+                 f"{'acumulado (ms)':>15} {'próprio (ms)':>13}  módulo"]
+        ranked = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)
+        for name, (cumulative, self_time) in ranked[:top]:
+            lines.append(f"{cumulative * 1000:>15.1f} {self_time * 1000:>13.1f}  {name}")
+        return "\n".join(lines)
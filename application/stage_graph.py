@@ -0,0 +1,209 @@
+import os
+import hashlib
+import inspect
+from dataclasses import dataclass, field
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable
+from models.logs.logger import logger
+from models.logs.tracing import span
+
+CHECKPOINT_DIR = "models/checkpoints"
+# Código chamado pelos estágios (via components.resolve, sem import estático): qualquer mudança
+# nestes pacotes invalida os checkpoints, além do código do próprio estágio
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE_DIRS = ("models/service", "models/logs", "application", "ports")
+
+
+@dataclass
+class Stage:
+    """
+    Um estágio da pipeline.
+
+    `func` recebe os valores de `inputs` como argumentos nomeados (mais `params`) e
+    retorna um dict com exatamente as chaves de `outputs`. Estágios `cpu_bound` (treinos que já
+    usam todos os núcleos) nunca rodam ao mesmo tempo que outro estágio `cpu_bound`.
+    """
+    name: str
+    func: Callable[..., dict]
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    cpu_bound: bool = False
+
+
+def _hash(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+
+def _file_fingerprint(path: str) -> str:
+    # Import tardio: montar o grafo (ex.: para o --help do CLI) não deve carregar pandas
+    from models.service.dataset_cache import file_fingerprint
+    return file_fingerprint(path)
+
+
+def _value_fingerprint(value) -> str:
+    """Fingerprint de um valor inicial: arquivos pelo conteúdo, o resto pela representação."""
+    if isinstance(value, str) and os.path.isfile(value):
+        return _file_fingerprint(value)
+    return _hash(value)
+
+
+def _output_fingerprint(stage_fingerprint: str, name: str, value) -> str:
+    """Saídas que são arquivos (ex.: o dataset baixado) são identificadas pelo conteúdo."""
+    if isinstance(value, str) and os.path.isfile(value):
+        return _file_fingerprint(value)
+    return _hash(stage_fingerprint, name)
+
+
+@lru_cache(maxsize=None)
+def _package_fingerprint(code_dirs: tuple = CODE_DIRS, root: str = PROJECT_ROOT) -> str:
+    """Fingerprint do conteúdo de todos os .py de `code_dirs` (calculado uma vez por processo)."""
+    digest = hashlib.sha256()
+    for code_dir in code_dirs:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(root, code_dir)):
+            dirnames.sort()
+            for filename in sorted(f for f in filenames if f.endswith(".py")):
+                path = os.path.join(dirpath, filename)
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _code_fingerprint(func) -> str:
+    """Código do estágio mais o dos pacotes que ele chama."""
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = getattr(func, "__qualname__", repr(func))
+    return _hash(source, _package_fingerprint())
+
+
+class StageGraph:
+    """
+    Executa estágios respeitando as dependências declaradas (inputs/outputs).
+
+    O fingerprint de cada estágio combina seu código (e o dos pacotes em CODE_DIRS), seus
+    parâmetros e os fingerprints das entradas (que, por sua vez, vêm dos estágios anteriores). As saídas ficam salvas
+    em disco sob esse fingerprint; ao retomar, estágios inalterados são carregados em
+    vez de executados. Estágios sem dependência entre si rodam em paralelo.
+    """
+
+    def __init__(self, stages: list, checkpoint_dir: str = CHECKPOINT_DIR, max_workers: int = 2):
+        self.stages = {stage.name: stage for stage in stages}
+        self.checkpoint_dir = checkpoint_dir
+        self.max_workers = max_workers
+        if len(self.stages) != len(stages):
+            raise ValueError("Nomes de estágios duplicados na pipeline.")
+
+        self.producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"Saída '{output}' produzida por mais de um estágio.")
+                self.producers[output] = stage.name
+
+    @property
+    def names(self) -> list:
+        return list(self.stages)
+
+    def downstream_of(self, name: str) -> set:
+        """Retorna o estágio `name` e todos os que dependem (direta ou indiretamente) dele."""
+        if name not in self.stages:
+            raise ValueError(f"Estágio desconhecido: {name}. Opções: {self.names}")
+        affected = {name}
+        changed = True
+        while changed:
+            changed = False
+            for stage in self.stages.values():
+                if stage.name in affected:
+                    continue
+                if any(self.producers.get(i) in affected for i in stage.inputs):
+                    affected.add(stage.name)
+                    changed = True
+        return affected
+
+    def _checkpoint_path(self, stage: Stage, fingerprint: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{stage.name}-{fingerprint[:16]}.joblib")
+
+    def _fingerprint(self, stage: Stage, fingerprints: dict) -> str:
+        return _hash(stage.name, _code_fingerprint(stage.func), sorted(stage.params.items()),
+                     [fingerprints[i] for i in stage.inputs])
+
+    def _execute(self, stage: Stage, values: dict) -> dict:
+        logger.info(f"[pipeline] Executando estágio '{stage.name}'...")
+        kwargs = {name: values[name] for name in stage.inputs}
+        with span(f"stage.{stage.name}"):
+            outputs = stage.func(**kwargs, **stage.params) or {}
+        missing = set(stage.outputs) - set(outputs)
+        if missing:
+            raise ValueError(f"Estágio '{stage.name}' não produziu as saídas: {sorted(missing)}")
+        return outputs
+
+    def run(self, initial: dict = None, resume: bool = False, from_stage: str = None) -> dict:
+        """
+        Executa a pipeline.
+
+        Parâmetros:
+          - initial: valores de entrada que não são produzidos por nenhum estágio.
+          - resume: reaproveita checkpoints cujo fingerprint não mudou.
+          - from_stage: reexecuta este estágio e os dependentes, reaproveitando os anteriores.
+        """
+        import joblib
+
+        values = dict(initial or {})
+        fingerprints = {name: _value_fingerprint(value) for name, value in values.items()}
+        forced = self.downstream_of(from_stage) if from_stage else set()
+        reuse = resume or bool(from_stage)
+
+        for stage in self.stages.values():
+            unknown = [i for i in stage.inputs if i not in self.producers and i not in values]
+            if unknown:
+                raise ValueError(f"Estágio '{stage.name}' depende de entradas inexistentes: {unknown}")
+
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        pending = dict(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                ready = [s for s in pending.values() if all(i in fingerprints for i in s.inputs)]
+                for stage in ready:
+                    fingerprint = self._fingerprint(stage, fingerprints)
+                    path = self._checkpoint_path(stage, fingerprint)
+
+                    if reuse and stage.name not in forced and os.path.exists(path):
+                        del pending[stage.name]
+                        logger.info(f"[pipeline] Estágio '{stage.name}' inalterado; usando checkpoint {path}")
+                        outputs = joblib.load(path)
+                        values.update(outputs)
+                        fingerprints.update({o: _output_fingerprint(fingerprint, o, outputs[o]) for o in stage.outputs})
+                        continue
+
+                    if stage.cpu_bound and any(other.cpu_bound for other, _, _ in running.values()):
+                        # Dois treinos com n_jobs=-1 ao mesmo tempo só disputariam os mesmos núcleos
+                        continue
+                    del pending[stage.name]
+                    future = pool.submit(self._execute, stage, dict(values))
+                    running[future] = (stage, fingerprint, path)
+
+                if ready and not running:
+                    # Checkpoints carregados podem ter liberado novos estágios
+                    continue
+                if not running:
+                    raise ValueError(f"Estágios sem entradas disponíveis: {sorted(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, fingerprint, path = running.pop(future)
+                    outputs = future.result()
+                    joblib.dump(outputs, path)
+                    values.update(outputs)
+                    fingerprints.update({o: _output_fingerprint(fingerprint, o, outputs[o]) for o in stage.outputs})
+                    logger.info(f"[pipeline] Estágio '{stage.name}' concluído; checkpoint em {path}")
+
+        return values
@@ -1,50 +1,128 @@
 # application/use_cases.py
 import os
+import logging
+import numpy as np
 import pandas as pd
 from ports.dtale_port import DtalePort
 from ports.training_port import TrainingPort
-from models.service.data_preprocessor import preprocess_data
 from models.logs.logger import logger
+from models.service.dataset_cache import read_dataset, read_window, dataset_rows
+from models.service.edit_log import EditLog, apply_patches, diff_frames
 
 DATA_FOLDER = "models/dataset"
+# Linhas carregadas por vez no modo edição (--start/--rows escolhem a janela)
+EDIT_WINDOW_ROWS = 50_000
+# Nome do índice (posição da linha no dataset) na janela aberta no D-Tale
+ROW_COLUMN = "row"
+
+
+def _restore_row_index(edited: pd.DataFrame) -> pd.DataFrame:
+    """
+    O D-Tale devolve o índice nomeado como coluna. Volta a usá-lo como índice; linhas criadas
+    no D-Tale (sem posição) recebem rótulos negativos e são registradas como inserções.
+    """
+    if ROW_COLUMN not in edited.columns:
+        return edited
+    positions = edited[ROW_COLUMN].to_numpy(dtype=float)
+    new = np.isnan(positions)
+    positions[new] = -np.arange(1, new.sum() + 1)
+    return edited.drop(columns=[ROW_COLUMN]).set_axis(pd.Index(positions.astype(np.int64)))
 
 class MLUseCases:
-    def __init__(self, dtale_adapter: DtalePort, training_adapter: TrainingPort):
+    def __init__(self, dtale_adapter: DtalePort, training_adapter: TrainingPort, registry=None, renderer=None):
         self.dtale_adapter = dtale_adapter
         self.training_adapter = training_adapter
+        self.registry = registry
+        self.renderer = renderer
 
-    def edit_data(self, csv_filename: str) -> str:
-        """Abre o D-Tale para edição do dataset e salva as alterações."""
+    def edit_data(self, csv_filename: str, start: int = 0, rows: int = EDIT_WINDOW_ROWS) -> str:
+        """
+        Abre uma janela de `rows` linhas do dataset no D-Tale e registra só as células e linhas
+        alteradas no log de edições (models/dataset/edits/). Cada gravação no D-Tale acrescenta ao log
+        o que mudou desde a anterior; o CSV original não é reescrito.
+        """
         full_path = os.path.join(DATA_FOLDER, csv_filename)
-        logger.info(f"Lendo arquivo para edição: {full_path}")
-        df = pd.read_csv(full_path)
+        edit_log = EditLog(full_path)
+        total = dataset_rows(full_path)
+        logger.info(f"Abrindo linhas {start}-{min(start + rows, total)} de {total} para edição: {full_path}")
+        # A janela já mostra as edições anteriores; o índice (posição no dataset) identifica as linhas
+        window = apply_patches(read_window(full_path, start, rows), edit_log.read(), include_inserts=False)
+        # Categóricas viram texto livre na janela: o D-Tale não aceita valores fora das categorias
+        window = window.astype({col: object for col in window.select_dtypes(include='category').columns})
+        saved = {"data": window}
+        inserted_rows = {}  # rótulo provisório da linha criada no D-Tale -> posição atribuída no log
+
+        def save(edited: pd.DataFrame):
+            edited = _restore_row_index(edited).rename(index=inserted_rows)
+            patches = diff_frames(saved["data"], edited, edit_log.next_row(total))
+            new_labels = edited.index.difference(saved["data"].index)
+            inserted_rows.update(zip(new_labels, [p["row"] for p in patches if p["op"] == "insert"]))
+            edit_log.append(patches)
+            saved["data"] = edited.rename(index=inserted_rows)
+
+        self.dtale_adapter.open_in_dtale(window.rename_axis(ROW_COLUMN), on_save=save)
+        return edit_log.path
 
-        new_df = self.dtale_adapter.open_in_dtale(df)
-        edited_path = os.path.join(DATA_FOLDER, "edited_data.csv")
-        new_df.to_csv(edited_path, index=False)
-        logger.info(f"Dados editados salvos em {edited_path}")
+    def export_edits(self, csv_filename: str, output_filename: str = "edited_data.csv") -> str:
+        """Reaplica o log de edições sobre o cache colunar e grava o dataset editado completo."""
+        full_path = os.path.join(DATA_FOLDER, csv_filename)
+        edit_log = EditLog(full_path)
+        edited = apply_patches(read_dataset(full_path), edit_log.read())
+        edited_path = os.path.join(DATA_FOLDER, output_filename)
+        edited.to_csv(edited_path, index=False)
+        logger.info(f"Dataset com as edições de {edit_log.path} salvo em {edited_path} {edited.shape}")
         return edited_path
 
-    def train_model(self, csv_filename: str, target_col: str, task_type: str):
-        """Pré-processa os dados e treina o modelo."""
+    def train_model(self, csv_filename: str, target_col: str, task_type: str, preprocessor_path: str = None):
+        """
+        Pré-processa os dados e treina o modelo.
+        Se `preprocessor_path` existir, o pré-processador salvo é reutilizado; caso contrário é ajustado e salvo nele.
+        """
+        # Imports de treino ficam aqui para que o modo edição não carregue scikit-learn
+        from models.service.data_preprocessor import preprocess_data, build_training_frame, WatchPreprocessor, DROP_COLUMNS
+        from models.service.evaluation_cache import data_fingerprint
+        from models.service.model_registry import ModelRegistry
+
         full_path = os.path.join(DATA_FOLDER, csv_filename)
         logger.info(f"Lendo dados para treinamento: {full_path}")
-        raw_df = pd.read_csv(full_path)
+        raw_df = read_dataset(full_path, exclude=DROP_COLUMNS)
+
+        preprocessor = None
+        if preprocessor_path and os.path.exists(preprocessor_path):
+            preprocessor = WatchPreprocessor.load(preprocessor_path)
 
         logger.info("Iniciando pré-processamento dos dados.")
-        X_preprocessed_df, y, _ = preprocess_data(raw_df, target_col)
-        df_preprocessed = pd.concat([X_preprocessed_df, y.reset_index(drop=True)], axis=1)
+        X_preprocessed_df, y, preprocessor = preprocess_data(raw_df, target_col, preprocessor)
+        if preprocessor_path and not os.path.exists(preprocessor_path):
+            preprocessor.save(preprocessor_path)
+        # O PyCaret exige um frame único; a cópia rasa só aloca a coluna do alvo
+        df_preprocessed = build_training_frame(X_preprocessed_df, y)
         
         logger.info("Iniciando treinamento com PyCaret.")
         model = self.training_adapter.train_model(df_preprocessed, target_col, task_type)
 
         logger.info("Treinamento finalizado.")
+        if model is not None:
+            metrics = getattr(self.training_adapter, 'last_metrics', {})
+            registry = self.registry or ModelRegistry()
+            registry.register(
+                getattr(self.training_adapter, 'last_pipeline', None) or model, target_col,
+                preprocessor=preprocessor, source=type(self.training_adapter).__name__,
+                score=metrics.get('R2_cv'), metric="r2_cv_pycaret", features=X_preprocessed_df.columns.tolist(),
+                data_fingerprint=data_fingerprint(X_preprocessed_df, y), metrics=metrics,
+                params={'task_type': task_type}
+            )
+            # Os gráficos só são desenhados depois do modelo registrado, num pool de processos à parte
+            jobs = getattr(self.training_adapter, 'figure_jobs', lambda: [])()
+            if jobs:
+                from models.service.figure_renderer import FigureRenderer
+                (self.renderer or FigureRenderer()).render(jobs)
         print(f"Treinamento concluído. Modelo: {model}")
-        logger.info("Amostras antes:", raw_df.shape)
-        print("Amostras antes:", raw_df.shape)
-        logger.info("Amostras depois:", X_preprocessed_df.shape)
-        print("Amostras depois:", X_preprocessed_df.shape)
-        logger.info("Features:", X_preprocessed_df.columns.tolist())
-        print("Features:", X_preprocessed_df.columns.tolist())
-        logger.info("Alguma feature constante?", X_preprocessed_df.nunique())
-        print("Alguma feature constante?", X_preprocessed_df.nunique())
\ No newline at end of file
+        logger.info(f"Amostras antes: {raw_df.shape} | depois: {X_preprocessed_df.shape}",
+                    extra={'rows_before': raw_df.shape[0], 'rows_after': X_preprocessed_df.shape[0]})
+        logger.info(f"Features: {X_preprocessed_df.columns.tolist()}")
+        # Diagnóstico caro (nunique no frame inteiro): só com o logger em DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            nunique = X_preprocessed_df.nunique()
+            logger.debug(f"Features constantes: {nunique[nunique <= 1].index.tolist()}",
+                         extra={'nunique': nunique.to_dict()})
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Benchmark do cache colunar: pd.read_csv a frio contra read_dataset com cache quente.
+
+Uso:
+    python -m benchmarks.bench_dataset_cache --scales 1 10
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_preprocess import BASE_ROWS, make_listings
+from models.service import dataset_cache
+from models.service.data_preprocessor import DROP_COLUMNS
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _megabytes(frame: pd.DataFrame) -> float:
+    return frame.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do cache colunar de datasets")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    print(f"{'linhas':>10} {'read_csv (s)':>13} {'cache (s)':>10} {'projeção (s)':>13} {'speedup':>8} "
+          f"{'csv MB':>8} {'cache MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_cache.CACHE_DIR = os.path.join(tmp, ".cache")
+        for scale in args.scales:
+            csv_path = os.path.join(tmp, f"Watches_x{scale}.csv")
+            make_listings(BASE_ROWS * scale).to_csv(csv_path, index=False)
+
+            raw, csv_time = _timed(pd.read_csv, csv_path)
+            dataset_cache.build_cache(csv_path)
+            cached, cache_time = _timed(dataset_cache.read_dataset, csv_path)
+            # Projeção usada pelos caminhos de treino, que descartam as colunas de texto livre
+            _, projected_time = _timed(dataset_cache.read_dataset, csv_path, exclude=DROP_COLUMNS)
+            print(f"{len(raw):>10} {csv_time:>13.3f} {cache_time:>10.3f} {projected_time:>13.3f} "
+                  f"{csv_time / projected_time:>7.1f}x {_megabytes(raw):>8.1f} {_megabytes(cached):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Mede o custo do logging em preprocess_data: o mesmo pré-processamento com o logger em DEBUG
+(diagnósticos ligados), INFO (configuração de produção) e WARNING (mensagens descartadas).
+A diferença entre INFO e WARNING é o overhead do logging na thread que pré-processa.
+
+Também mede o custo por chamada de logger.info na thread que loga: handlers síncronos (arquivo +
+console, como antes) x QueueHandler com QueueListener em segundo plano (configuração atual).
+
+Uso:
+    python -m benchmarks.bench_logging --rows 100000 --repeat 5
+"""
+import argparse
+import logging
+import os
+import queue
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+os.environ.setdefault("WATCHES_TRACE", "0")  # isola o logging do custo dos spans
+
+from benchmarks.bench_preprocess import make_listings
+from models.logs.logger import logger
+from models.service.data_preprocessor import preprocess_data
+
+
+def run_once(data, level: int) -> float:
+    logger.setLevel(level)
+    start = time.perf_counter()
+    preprocess_data(data.copy(), 'price')
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(data, repeat: int, levels: tuple = (logging.DEBUG, logging.INFO, logging.WARNING)) -> list:
+    """
+    Menor tempo, em milissegundos, em cada nível. As execuções dos níveis são intercaladas e o
+    mínimo descarta interferências da máquina (o ruído só soma tempo).
+    """
+    times = {level: [] for level in levels}
+    for _ in range(repeat):
+        for level in levels:
+            times[level].append(run_once(data, level))
+    return [min(times[level]) for level in levels]
+
+
+def per_call_cost(calls: int, use_queue: bool) -> float:
+    """Microssegundos de CPU por logger.info na thread chamadora, com arquivo temporário + stderr."""
+    path = os.path.join(tempfile.mkdtemp(), "bench.log")
+    handlers = [logging.FileHandler(path), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    bench_logger = logging.getLogger(f"bench_logging.{'queue' if use_queue else 'sync'}")
+    bench_logger.propagate = False
+    bench_logger.setLevel(logging.INFO)
+    listener = None
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        bench_logger.addHandler(QueueHandler(log_queue))
+        listener = QueueListener(log_queue, *handlers)
+        listener.start()
+    else:
+        for handler in handlers:
+            bench_logger.addHandler(handler)
+
+    # CPU da própria thread: com a fila, a formatação e a escrita ficam na thread do listener
+    start = time.thread_time()
+    for i in range(calls):
+        bench_logger.info(f"Coluna col_{i % 20} - valores únicos: {i}")
+    elapsed = time.thread_time() - start
+    if listener is not None:
+        listener.stop()
+    for handler in handlers:
+        handler.close()
+    return elapsed / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead do logging em preprocess_data")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=20_000, help="Chamadas de logger.info na medição por chamada")
+    args = parser.parse_args()
+
+    print(f"{'linhas':>8} {'DEBUG (ms)':>11} {'INFO (ms)':>10} {'WARNING (ms)':>13} {'overhead INFO (ms)':>19} "
+          f"{'(%)':>7}")
+    for rows in args.rows:
+        data = make_listings(rows, seed=7)
+        run_once(data, logging.WARNING)  # aquecimento (imports, caches do pandas)
+        debug, info, quiet = measure(data, args.repeat)
+        print(f"{rows:>8} {debug:>11.1f} {info:>10.1f} {quiet:>13.1f} {info - quiet:>19.1f} "
+              f"{(info - quiet) / quiet * 100:>6.1f}%")
+    logger.setLevel(logging.NOTSET)
+
+    sync, queued = per_call_cost(args.calls, False), per_call_cost(args.calls, True)
+    print(f"\nlogger.info na thread chamadora: síncrono {sync:.1f} µs | fila {queued:.1f} µs "
+          f"({sync / queued:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
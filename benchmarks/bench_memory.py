@@ -0,0 +1,77 @@
+"""
+Pico de memória por estágio da pipeline de treino sobre listagens sintéticas: carregamento,
+preprocess_data, treino (busca com orçamento pequeno) e SHAP. Os estágios são chamados
+diretamente (sem a amostra de 10% do load_data) para que as cópias dos frames apareçam.
+
+Cada estágio é medido por um span (pico de RSS acima do RSS no início do estágio); também é
+impresso o tamanho em memória do dataset carregado e da matriz de features.
+
+O SHAP usa o caminho amostrado: o TreeSHAP exato em todas as linhas levaria horas em 1M linhas e
+o que interessa aqui é a memória do frame recebido, não a explicação.
+
+Uso:
+    python -m benchmarks.bench_memory --rows 1000000
+"""
+import argparse
+import gc
+import os
+
+os.environ["WATCHES_TRACE"] = "1"  # as medições vêm dos spans
+
+from models.logs.tracing import span
+from models.service.data_preprocessor import preprocess_data, DROP_COLUMNS
+from models.service.dataset_cache import read_dataset, build_cache
+from models.service.model_adapter import train_model_sklearn
+from models.service.powershap_adapter import calculate_shap_values
+from models.service.synthetic_listings import write_listings_csv
+
+
+def _frame_mb(frame) -> float:
+    return frame.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de memória por estágio da pipeline")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--max-fits", type=float, default=1, help="Orçamento da busca de modelos")
+    parser.add_argument("--seed", type=int, default=1179)
+    args = parser.parse_args()
+
+    path = os.path.join("models/dataset/synthetic", f"listings-{args.rows}-{args.seed}.csv")
+    if not os.path.exists(path):
+        write_listings_csv(path, args.rows, args.seed)
+    build_cache(path)  # a conversão do CSV não entra na medição
+
+    records = []
+    with span("bench.load") as s:
+        data = read_dataset(path, exclude=DROP_COLUMNS)
+    records.append(s.record)
+    data_mb = _frame_mb(data)
+
+    with span("bench.preprocess") as s:
+        X, y, _ = preprocess_data(data, 'price')
+    records.append(s.record)
+    del data
+    gc.collect()
+    features_mb = _frame_mb(X)
+
+    with span("bench.train") as s:
+        model, _ = train_model_sklearn(X, y, max_fits=args.max_fits, use_cache=False)
+    records.append(s.record)
+
+    with span("bench.shap") as s:
+        calculate_shap_values(model, X, y, method="sampled")
+    records.append(s.record)
+
+    print(f"\nDataset carregado: {data_mb:.1f} MB | features {list(X.shape)} {X.dtypes.iloc[0]}: {features_mb:.1f} MB")
+    print(f"\n{'estágio':<12} {'RSS início (MB)':>16} {'pico acima (MB)':>16} {'parede (s)':>11}")
+    for record in records:
+        print(f"{record['name'][6:]:<12} {record['rss_start_mb']:>16.1f} {record['peak_rss_delta_mb']:>16.1f} "
+              f"{record['wall_s']:>11.2f}")
+    # ru_maxrss não serve aqui: os spans zeram o pico do processo a cada estágio
+    peak = max(record["rss_start_mb"] + record["peak_rss_delta_mb"] for record in records)
+    print(f"\nPico de RSS nos estágios: {peak:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Compara a grade exaustiva original (GridSearchCV por família) com a busca adaptativa
+(successive halving com orçamento) em tempo e R² de validação cruzada.
+
+Uso:
+    python -m benchmarks.bench_model_search --rows 28449 --max-fits 60
+"""
+import argparse
+
+from benchmarks.bench_preprocess import make_listings
+from models.service.data_preprocessor import preprocess_data
+from models.service.model_adapter import build_candidates
+from models.service.model_search import grid_search, successive_halving_search
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade exaustiva x busca adaptativa")
+    parser.add_argument("--rows", type=int, default=28449)
+    parser.add_argument("--max-fits", type=float, default=60)
+    parser.add_argument("--time-budget", type=float, default=None)
+    args = parser.parse_args()
+
+    X, y, _ = preprocess_data(make_listings(args.rows), 'price')
+    y = y.reset_index(drop=True)
+
+    grid = grid_search(build_candidates(), X, y)
+    grid_time, grid_name, grid_score = grid.elapsed, grid.best_name, grid.best_score
+
+    result = successive_halving_search(build_candidates(), X, y, max_fits=args.max_fits,
+                                       time_budget=args.time_budget)
+
+    print(f"{'busca':<10} {'tempo (s)':>10} {'ajustes':>8} {'R² CV':>8}  modelo")
+    print(f"{'grid':<10} {grid_time:>10.1f} {450:>8} {grid_score:>8.4f}  {grid_name}")
+    print(f"{'adaptive':<10} {result.elapsed:>10.1f} {result.fits_used:>8.1f} {result.best_score:>8.4f}  "
+          f"{result.best_name} {result.best_params}")
+    print(f"Speedup: {grid_time / result.elapsed:.1f}x | ΔR²: {result.best_score - grid_score:+.4f}")
+
+
+if __name__ == "__main__":
+    main()
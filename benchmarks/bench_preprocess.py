@@ -0,0 +1,105 @@
+"""
+Benchmark da limpeza de dados: implementação antiga (lambdas por linha)
+contra a versão vetorizada de `clean_data`.
+
+Uso:
+    python -m benchmarks.bench_preprocess --scales 1 10 100
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from models.service.data_preprocessor import clean_data
+
+BASE_ROWS = 28449  # tamanho atual do Watches.csv
+
+
+def make_listings(n_rows: int, seed: int = 1179) -> pd.DataFrame:
+    """Gera listagens com o mesmo formato das colunas do Watches.csv."""
+    rng = np.random.default_rng(seed)
+    brands = np.array(['Rolex', 'Omega', 'Patek Philippe', 'Cartier', 'Seiko'])
+    brand_idx = rng.integers(0, len(brands), n_rows)
+    sizes_mm = rng.integers(28, 48, n_rows)
+    materials = np.array(['Steel', 'Yellow gold', 'Rose gold', 'Titanium', 'Ceramic', 'Leather', np.nan], dtype=object)
+    casem = rng.choice(materials, n_rows)
+    gold = np.array(['gold' in str(m) for m in casem])
+    # Preço com sinal nas features (marca, ouro, tamanho) para que os modelos tenham o que aprender
+    log_price = (np.array([9.3, 8.4, 10.5, 8.8, 6.5])[brand_idx] + 0.6 * gold + 0.03 * (sizes_mm - 38)
+                 + rng.normal(0, 0.5, n_rows))
+    prices = np.exp(log_price).astype(int)
+    price = np.char.add('$', np.char.mod('%d', prices)).astype(object)
+    price[rng.random(n_rows) < 0.05] = 'Price on request'
+    price[rng.random(n_rows) < 0.01] = np.nan
+    big = prices >= 1000
+    price[big] = [f"${p:,}" for p in prices[big]]
+
+    sizes = np.char.add(sizes_mm.astype(str), ' mm').astype(object)
+    sizes[rng.random(n_rows) < 0.03] = np.nan
+    years = rng.integers(1950, 2024, n_rows).astype(str).astype(object)
+    years[rng.random(n_rows) < 0.1] = 'Unknown'
+    models = np.array([f"Model {i}" for i in rng.zipf(1.6, n_rows) % 400], dtype=object)
+
+    return pd.DataFrame({
+        'Unnamed: 0': np.arange(n_rows),
+        'name': models,
+        'price': price,
+        'brand': brands[brand_idx],
+        'model': models,
+        'ref': rng.integers(1000, 99999, n_rows).astype(str),
+        'mvmt': rng.choice(['Automatic', 'Manual winding', 'Quartz'], n_rows),
+        'casem': casem,
+        'bracem': rng.choice(materials, n_rows),
+        'yop': years,
+        'cond': rng.choice(['New', 'Very good', 'Good', 'Unworn'], n_rows),
+        'sex': rng.choice(["Men's watch/Unisex", "Women's watch"], n_rows),
+        'size': sizes,
+        'condition': rng.choice(['A', 'B', 'C'], n_rows),
+    })
+
+
+def legacy_clean_data(data: pd.DataFrame, target: str) -> pd.DataFrame:
+    """Cópia da limpeza original baseada em .apply, mantida apenas como referência."""
+    data['price'] = data['price'].apply(lambda x: -1 if x == 'Price on request' else x)
+    data['price'] = data['price'].apply(lambda x: int(x.replace('$', '').replace(',', '').replace("'", '')) if isinstance(x, str) else x)
+    data[target] = pd.to_numeric(data[target], errors='coerce')
+    data = data[~data[target].isna()]
+    data = data[data[target] != -1]
+    data = data.drop(columns=[c for c in ['Unnamed: 0', 'name', 'ref'] if c in data.columns], errors='ignore')
+    data['yop'] = data['yop'].astype(str).str.extract(r'(\d{4})')
+    data['yop'] = pd.to_numeric(data['yop'], errors='coerce')
+    data['watch_age'] = pd.Timestamp.now().year - data['yop']
+    data['has_gold'] = data[['casem', 'bracem']].apply(lambda x: int('gold' in ' '.join(map(str, x)).lower()), axis=1)
+    # Mesmo dtype da limpeza atual (flag binária em int8), para comparar só os valores
+    data['has_gold'] = data['has_gold'].astype('int8')
+    data['size'] = data['size'].apply(lambda x: str(x).replace(' mm', '') if isinstance(x, str) else x)
+    data['size'] = pd.to_numeric(data['size'], errors='coerce')
+    top_models = data['model'].value_counts().nlargest(30).index
+    data['model'] = data['model'].apply(lambda x: x if x in top_models else 'Other')
+    data[target] = data[target].apply(lambda x: np.log1p(x) if x > 0 else 0)
+    return data
+
+
+def _timed(func, frame: pd.DataFrame):
+    start = time.perf_counter()
+    result = func(frame.copy(), 'price')
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da limpeza vetorizada")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    print(f"{'linhas':>10} {'antigo (s)':>12} {'vetorizado (s)':>15} {'speedup':>8}")
+    for scale in args.scales:
+        frame = make_listings(BASE_ROWS * scale)
+        legacy, legacy_time = _timed(legacy_clean_data, frame)
+        vectorized, new_time = _timed(clean_data, frame)
+        pd.testing.assert_frame_equal(legacy, vectorized)
+        print(f"{len(frame):>10} {legacy_time:>12.3f} {new_time:>15.3f} {legacy_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Suíte de escala: gera listagens sintéticas (models/service/synthetic_listings.py) em 10k, 100k, 1M e
+10M linhas e mede carregamento, preprocess_data, train_model_sklearn, calculate_shap_values e
+scoring (predict em lote) em cada tamanho: tempo de parede, CPU e pico de RSS.
+
+Os resultados são gravados em JSON. Com --save-baseline viram a nova linha de base; sem ele, são
+comparados com a linha de base e passos mais lentos que `--threshold` vezes o registrado são
+marcados como regressão (código de saída 1).
+
+Passos cuja memória estimada (extrapolada linearmente do tamanho anterior) não cabe na RAM
+disponível são pulados e registrados como tal.
+
+Uso:
+    python -m benchmarks.bench_scaling --sizes 10000 100000 --save-baseline
+    python -m benchmarks.bench_scaling --sizes 10000 100000
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+os.environ["WATCHES_TRACE"] = "1"  # as medições vêm dos spans
+
+import psutil
+
+from models.logs.tracing import span
+from models.service.data_preprocessor import preprocess_data, DROP_COLUMNS
+from models.service.dataset_cache import read_dataset, cache_path_for
+from models.service.model_adapter import train_model_sklearn
+from models.service.powershap_adapter import calculate_shap_values
+from models.service.synthetic_listings import write_listings_csv
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+DATA_DIR = "models/dataset/synthetic"
+BASELINE_PATH = "benchmarks/baselines/scaling.json"
+
+
+def _measure(name: str, rows: int, func, *args, **kwargs):
+    with span(f"bench.{name}", rows=rows) as s:
+        result = func(*args, **kwargs)
+    record = s.record
+    return result, {
+        "seconds": round(record["wall_s"], 4), "cpu_seconds": round(record["cpu_s"], 4),
+        "peak_rss_delta_mb": record["peak_rss_delta_mb"], "rows_per_second": round(rows / max(record["wall_s"], 1e-9)),
+    }
+
+
+def _fits_in_memory(step: str, rows: int, results: dict) -> bool:
+    """Extrapola o pico do mesmo passo no maior tamanho já medido e compara com a RAM disponível."""
+    measured = [(int(size), steps[step]) for size, steps in results.items()
+                if step in steps and "peak_rss_delta_mb" in steps[step]]
+    if not measured:
+        return True
+    size, last = max(measured)
+    estimate_mb = last["peak_rss_delta_mb"] * rows / size
+    return estimate_mb < 0.8 * psutil.virtual_memory().available / 2 ** 20
+
+
+def run_size(rows: int, results: dict, args) -> dict:
+    steps = {}
+
+    def skipped(step: str, reason: str):
+        steps[step] = {"skipped": reason}
+        print(f"{rows:>10} {step:<11} pulado: {reason}")
+
+    def report(step: str):
+        m = steps[step]
+        print(f"{rows:>10} {step:<11} {m['seconds']:>10.2f} {m['cpu_seconds']:>9.2f} {m['peak_rss_delta_mb']:>14.1f} "
+              f"{m['rows_per_second']:>12,}")
+
+    path = os.path.join(DATA_DIR, f"listings-{rows}-{args.seed}.csv")
+    if os.path.exists(path):
+        steps["generate"] = {"skipped": "arquivo já gerado"}
+    else:
+        _, steps["generate"] = _measure("generate", rows, write_listings_csv, path, rows, args.seed)
+        report("generate")
+
+    cache = cache_path_for(path)
+    if os.path.exists(cache):
+        os.remove(cache)
+    data = None
+    for step in ("load_cold", "load"):
+        if not _fits_in_memory(step, rows, results):
+            skipped(step, "memória insuficiente")
+            continue
+        data, steps[step] = _measure(step, rows, read_dataset, path, exclude=DROP_COLUMNS)
+        report(step)
+    if data is None:
+        return steps
+
+    X = y = model = None
+    if _fits_in_memory("preprocess", rows, results):
+        (X, y, _), steps["preprocess"] = _measure("preprocess", rows, preprocess_data, data, 'price')
+        report("preprocess")
+    else:
+        skipped("preprocess", "memória insuficiente")
+    del data
+    gc.collect()
+    if X is None:
+        return steps
+
+    if rows > args.train_max_rows:
+        skipped("train", f"acima de --train-max-rows ({args.train_max_rows})")
+    elif not _fits_in_memory("train", rows, results):
+        skipped("train", "memória insuficiente")
+    else:
+        (model, _), steps["train"] = _measure("train", rows, train_model_sklearn, X, y,
+                                              max_fits=args.max_fits, use_cache=False)
+        report("train")
+
+    if model is not None:
+        _, steps["shap"] = _measure("shap", rows, calculate_shap_values, model, X, y)
+        report("shap")
+        _, steps["score"] = _measure("score", rows, model.predict, X)
+        report("score")
+    return steps
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_seconds: float) -> list:
+    """Passos `threshold` vezes mais lentos que a linha de base (e ao menos `min_seconds` a mais)."""
+    regressions = []
+    for size, steps in results.items():
+        for step, current in steps.items():
+            before = baseline.get(size, {}).get(step, {})
+            if "seconds" not in current or "seconds" not in before:
+                continue
+            if current["seconds"] > before["seconds"] * threshold and current["seconds"] - before["seconds"] >= min_seconds:
+                regressions.append((int(size), step, before["seconds"], current["seconds"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de escala com linha de base de desempenho")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=1179)
+    parser.add_argument("--max-fits", type=float, default=3, help="Orçamento da busca de modelos em cada tamanho")
+    # Mesmo valor da linha de base versionada: passos sem linha de base nunca seriam comparados
+    parser.add_argument("--train-max-rows", type=int, default=100_000,
+                        help="Acima disto o treino (e SHAP/scoring) é pulado")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como nova linha de base")
+    parser.add_argument("--output", default=None, help="Onde gravar os resultados desta execução (JSON)")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--min-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{'linhas':>10} {'passo':<11} {'parede (s)':>10} {'CPU (s)':>9} {'pico RSS (MB)':>14} {'linhas/s':>12}")
+    results = {}
+    for rows in sorted(args.sizes):
+        results[str(rows)] = run_size(rows, results, args)
+        gc.collect()
+
+    document = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "memory_gb": round(psutil.virtual_memory().total / 2 ** 30, 1)},
+        "params": {"seed": args.seed, "max_fits": args.max_fits, "train_max_rows": args.train_max_rows},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"\nLinha de base gravada em {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nSem linha de base em {args.baseline}; rode com --save-baseline para criar.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("params") != document["params"]:
+        print("\nAviso: parâmetros diferentes dos da linha de base; a comparação pode não ser justa.")
+    regressions = compare(results, baseline["results"], args.threshold, args.min_seconds)
+    if regressions:
+        print(f"\nRegressões (> {args.threshold}x a linha de base):")
+        for rows, step, before, after in regressions:
+            print(f"  {rows:>10} {step:<11} {before:>8.2f}s -> {after:>8.2f}s ({after / before:.2f}x)")
+        sys.exit(1)
+    print("\nNenhuma regressão em relação à linha de base.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Mede latência e vazão do servidor de previsão com clientes concorrentes, com e sem
+micro-batching (janela 0 = um predict por requisição).
+
+Uso:
+    python -m benchmarks.bench_serving --clients 16 --requests 50
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from benchmarks.bench_preprocess import make_listings
+from models.service.data_preprocessor import preprocess_data
+from models.service.inference_adapter import ModelInferenceAdapter
+from models.service.prediction_server import MicroBatcher, make_handler
+
+
+def _post(url: str, payload) -> dict:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def run(inference, listings: list, window_ms: float, clients: int, requests: int) -> dict:
+    batcher = MicroBatcher(inference, window_ms=window_ms).start()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(batcher))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    def client(worker: int):
+        for i in range(requests):
+            _post(f"{url}/predict", listings[(worker * requests + i) % len(listings)])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - start
+
+    with urllib.request.urlopen(f"{url}/metrics") as response:
+        metrics = json.loads(response.read())
+    server.shutdown()
+    server.server_close()
+    batcher.stop()
+    metrics['wall_requests_per_s'] = clients * requests / elapsed
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de previsão: com x sem micro-batching")
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    data = make_listings(args.rows)
+    X, y, preprocessor = preprocess_data(data, 'price')
+    model = Pipeline([('scaler', StandardScaler()), ('regressor', GradientBoostingRegressor(random_state=123))])
+    model.fit(X, y)
+    inference = ModelInferenceAdapter(model, preprocessor)
+    listings = json.loads(data.drop(columns=['price']).head(500).astype(str).to_json(orient='records'))
+
+    print(f"{'janela (ms)':>11} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'linhas/lote':>12}")
+    for window_ms in (0.0, args.window_ms):
+        m = run(inference, listings, window_ms, args.clients, args.requests)
+        print(f"{window_ms:>11.1f} {m['wall_requests_per_s']:>8.1f} {m['latency_p50_ms']:>9.1f} "
+              f"{m['latency_p99_ms']:>9.1f} {m['mean_batch_rows']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compara o cálculo SHAP original (shap.Explainer(model.predict, X) sobre todas as linhas)
+com o motor rápido (TreeSHAP para ensembles de árvores, k-means + amostra estratificada
+para os demais) em tempo e concordância das atribuições.
+
+Uso:
+    python -m benchmarks.bench_shap --rows 3000
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.ensemble import AdaBoostRegressor, GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from benchmarks.bench_preprocess import make_listings
+from models.service.data_preprocessor import preprocess_data
+from models.service.powershap_adapter import calculate_shap_values
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _agreement(reference, candidate):
+    """Correlação por linha (nas linhas em comum) e da importância global (média |SHAP| por feature)."""
+    ref_rows = {tuple(row): i for i, row in enumerate(reference.data)}
+    pairs = [(ref_rows[tuple(row)], i) for i, row in enumerate(candidate.data) if tuple(row) in ref_rows]
+    ref_idx, cand_idx = map(list, zip(*pairs))
+    row_corr = np.corrcoef(reference.values[ref_idx].ravel(), candidate.values[cand_idx].ravel())[0, 1]
+    global_corr = np.corrcoef(np.abs(reference.values).mean(axis=0), np.abs(candidate.values).mean(axis=0))[0, 1]
+    return row_corr, global_corr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SHAP original x motor rápido")
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--max-samples", type=int, default=1000)
+    args = parser.parse_args()
+
+    X, y, _ = preprocess_data(make_listings(args.rows), 'price')
+
+    models = {
+        'gradient_boosting': Pipeline([('scaler', StandardScaler()),
+                                       ('regressor', GradientBoostingRegressor(random_state=123))]),
+        'adaboost': Pipeline([('scaler', StandardScaler()),
+                              ('regressor', AdaBoostRegressor(random_state=123))]),
+    }
+
+    print(f"{'modelo':<18} {'original (s)':>12} {'rápido (s)':>11} {'speedup':>8} {'corr linha':>11} {'corr global':>12}")
+    for name, model in models.items():
+        model.fit(X, y)
+        exact, exact_time = _timed(calculate_shap_values, model, X, y, method="exact")
+        fast, fast_time = _timed(calculate_shap_values, model, X, y, max_samples=args.max_samples)
+        row_corr, global_corr = _agreement(exact, fast)
+        print(f"{name:<18} {exact_time:>12.1f} {fast_time:>11.1f} {exact_time / fast_time:>7.1f}x "
+              f"{row_corr:>11.3f} {global_corr:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Mede o tempo de inicialização e o pico de memória do CLI em subcomandos que não deveriam
+carregar bibliotecas pesadas, e falha (código de saída 1) se algum passar do orçamento.
+
+O `edit` de verdade fica esperando o D-Tale; a entrada "edit" faz o mesmo caminho de
+inicialização (parse dos argumentos, adapter do D-Tale, casos de uso e read_dataset) e sai.
+
+Uso:
+    python -m benchmarks.bench_startup --budget 1.0 --repeat 5
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DTALE_AVAILABLE = importlib.util.find_spec("dtale") is not None
+
+EDIT_STARTUP = f"""
+import main
+args = main.build_parser().parse_args(["edit", "Watches.csv"])
+dtale_adapter = main.components.create("dtale_adapter") if {DTALE_AVAILABLE} else None
+main.components.create("ml_use_cases", dtale_adapter=dtale_adapter, training_adapter=None)
+"""
+
+COMMANDS = {
+    "--help": ["main.py", "--help"],
+    "edit --help": ["main.py", "edit", "--help"],
+    "edit": ["-c", EDIT_STARTUP],
+    "serve --help": ["main.py", "serve", "--help"],
+}
+
+
+def measure(args: list) -> tuple:
+    """Retorna (segundos, pico de RSS em MB) de uma execução em processo novo."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"Comando falhou: {' '.join(args)}")
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orçamento de inicialização do CLI")
+    parser.add_argument("--budget", type=float, default=1.0, help="Tempo máximo (mediana, em segundos)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not DTALE_AVAILABLE:
+        print("dtale não instalado: 'edit' medido sem o adapter do D-Tale (mesmo caminho do edit --export).")
+    over_budget = []
+    print(f"{'comando':<14} {'mediana (s)':>11} {'máx (s)':>8} {'RSS (MB)':>9}")
+    for name, command in COMMANDS.items():
+        runs = [measure(command) for _ in range(args.repeat)]
+        times = [elapsed for elapsed, _ in runs]
+        median = statistics.median(times)
+        print(f"{name:<14} {median:>11.3f} {max(times):>8.3f} {max(rss for _, rss in runs):>9.1f}")
+        if median > args.budget:
+            over_budget.append(name)
+
+    if over_budget:
+        print(f"Acima do orçamento de {args.budget}s: {over_budget}")
+        sys.exit(1)
+    print(f"Todos os comandos dentro do orçamento de {args.budget}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compara o pré-processamento em memória (CSV inteiro + preprocess_data) com o modo em blocos
+(StreamingWatchPreprocessor) em tempo, pico de memória (RSS) e diferença máxima das features.
+
+Uso:
+    python -m benchmarks.bench_streaming --rows 1000000 --chunk-size 200000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_preprocess import make_listings
+
+
+def write_listings(path: str, n_rows: int, block: int = 250_000):
+    """Gera o CSV sintético em blocos, sem manter o arquivo inteiro em memória."""
+    for start in range(0, n_rows, block):
+        chunk = make_listings(min(block, n_rows - start), seed=start)
+        chunk.index += start
+        chunk.to_csv(path, mode='a' if start else 'w', header=not start, index_label='Unnamed: 0.1')
+
+
+def peak_rss_mb() -> float:
+    """Pico de RSS do processo atual (VmHWM). ru_maxrss herdaria o pico do processo pai no fork."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmHWM indisponível neste sistema.")
+
+
+def run_worker(mode: str, csv_path: str, output: str, chunk_size: int):
+    from models.service.data_preprocessor import preprocess_data, DROP_COLUMNS
+    from models.service.dataset_cache import _read_csv_typed
+    from models.service.streaming_preprocessor import preprocess_file_streaming, iter_transformed_chunks
+
+    if mode == "memory":
+        data = _read_csv_typed(csv_path)
+        X, y, _ = preprocess_data(data.drop(columns=[c for c in DROP_COLUMNS if c in data]), 'price')
+        X.to_feather(output)
+    else:
+        preprocess_file_streaming(csv_path, 'price', output, chunk_size=chunk_size)
+    print(peak_rss_mb())
+
+
+def measure(mode: str, csv_path: str, output: str, chunk_size: int) -> tuple:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_streaming", "--worker", mode,
+                             "--csv", csv_path, "--output", output, "--chunk-size", str(chunk_size)],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+    return time.perf_counter() - start, float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-processamento em memória x em blocos")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=200_000)
+    parser.add_argument("--worker", choices=["memory", "streaming"], default=None)
+    parser.add_argument("--csv", default=None)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.csv, args.output, args.chunk_size)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "listings.csv")
+        write_listings(csv_path, args.rows)
+        memory_out = os.path.join(workdir, "memory.feather")
+        streaming_out = os.path.join(workdir, "streaming")
+
+        memory_time, memory_rss = measure("memory", csv_path, memory_out, args.chunk_size)
+        streaming_time, streaming_rss = measure("streaming", csv_path, streaming_out, args.chunk_size)
+
+        from models.service.streaming_preprocessor import iter_transformed_chunks
+        reference = pd.read_feather(memory_out)
+        streamed = pd.concat(iter_transformed_chunks(streaming_out, columns=reference.columns.tolist()),
+                             ignore_index=True)
+        max_diff = float(np.abs(reference.to_numpy() - streamed.to_numpy()).max())
+
+    print(f"{args.rows} linhas, blocos de {args.chunk_size}")
+    print(f"{'modo':<10} {'tempo (s)':>10} {'pico RSS (MB)':>14}")
+    print(f"{'memória':<10} {memory_time:>10.1f} {memory_rss:>14.0f}")
+    print(f"{'blocos':<10} {streaming_time:>10.1f} {streaming_rss:>14.0f}")
+    print(f"Diferença máxima nas features: {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
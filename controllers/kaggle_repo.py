@@ -1,10 +1,12 @@
 from kaggle.api.kaggle_api_extended import KaggleApi
+from ports.dataset_source_port import DatasetSourcePort
 import os
+import glob
 import logging
 
 logger = logging.getLogger("EDA_Project")
 
-class KaggleRepository:
+class KaggleRepository(DatasetSourcePort):
     def __init__(self, api: KaggleApi):
         self.api = api
 
@@ -14,4 +16,25 @@ class KaggleRepository:
             self.api.dataset_download_files(dataset_name, path=path, unzip=True)
             logger.info(f"Dataset {dataset_name} baixado com sucesso em {path}")
         except Exception as e:
-            logger.error(f"Erro ao baixar dataset: {e}")
\ No newline at end of file
+            logger.error(f"Erro ao baixar dataset: {e}")
+
+    def remote_version(self, dataset_name: str) -> dict:
+        """Arquivos da versão atual no Kaggle (nome, tamanho e data de criação), sem baixar nada."""
+        result = self.api.dataset_list_files(dataset_name)
+        files = getattr(result, "files", None) or []
+        return {"files": sorted(
+            ({"name": str(getattr(f, "name", f)),
+              "size": getattr(f, "total_bytes", None) or getattr(f, "totalBytes", None) or getattr(f, "size", None),
+              "created": str(getattr(f, "creation_date", None) or getattr(f, "creationDate", None))}
+             for f in files),
+            key=lambda f: f["name"]
+        )}
+
+    def download_archive(self, dataset_name: str, dest_dir: str) -> str:
+        os.makedirs(dest_dir, exist_ok=True)
+        self.api.dataset_download_files(dataset_name, path=dest_dir, unzip=False, quiet=True)
+        archives = glob.glob(os.path.join(dest_dir, "*.zip"))
+        if not archives:
+            raise FileNotFoundError(f"O download de {dataset_name} não produziu um arquivo zip em {dest_dir}.")
+        logger.info(f"Arquivo do dataset {dataset_name} baixado em {archives[0]}")
+        return archives[0]
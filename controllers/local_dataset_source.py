@@ -0,0 +1,37 @@
+import os
+import shutil
+import zipfile
+import logging
+from ports.dataset_source_port import DatasetSourcePort
+
+logger = logging.getLogger("EDA_Project")
+
+class LocalDatasetSource(DatasetSourcePort):
+    """
+    Substituto local da API do Kaggle (testes, CI, máquinas sem credenciais).
+    O dataset "dono/nome" é o zip `<root>/dono/nome.zip`.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _archive(self, dataset_name: str) -> str:
+        archive = os.path.join(self.root, f"{dataset_name}.zip")
+        if not os.path.exists(archive):
+            raise FileNotFoundError(f"Dataset {dataset_name} não encontrado em {self.root} (esperado {archive}).")
+        return archive
+
+    def remote_version(self, dataset_name: str) -> dict:
+        with zipfile.ZipFile(self._archive(dataset_name)) as zf:
+            return {"files": sorted(
+                ({"name": info.filename, "size": info.file_size, "crc": info.CRC}
+                 for info in zf.infolist() if not info.is_dir()),
+                key=lambda f: f["name"]
+            )}
+
+    def download_archive(self, dataset_name: str, dest_dir: str) -> str:
+        os.makedirs(dest_dir, exist_ok=True)
+        target = os.path.join(dest_dir, os.path.basename(self._archive(dataset_name)))
+        shutil.copyfile(self._archive(dataset_name), target)
+        logger.info(f"Dataset {dataset_name} copiado de {self.root}")
+        return target
@@ -1,33 +1,59 @@
 # main.py
 import os
+import math
+import sys
 import argparse
-import logging
-import shap
-import matplotlib
-import matplotlib.pyplot as plt
-import pandas as pd
-matplotlib.use("TkAgg")
-
-import matplotlib.pyplot as plt
-
-# Controllers
-from controllers.auth_kaggle import AuthKaggle
-from controllers.kaggle_repo import KaggleRepository
 
 # Models
 from models.logs.logger import logger
-from models.service.eda_report import EDAReport
-from models.service.variable_selection import train_tpot_model
-
-# Views
-from views.services import run_pipeline  # <- SHAP apenas
-
-# Adapters
-from models.service.dtale_adapter import DtaleAdapter
-from models.service.pycaret_adapter import PyCaretAdapter
 
 # Application
-from application.use_cases import MLUseCases
+from application.lazy_imports import LazyRegistry, ImportProfiler
+from application.stage_graph import Stage, StageGraph
+
+# Adapters e serviços pesados (shap, PyCaret, TPOT, dtale, sweetviz, ...) são resolvidos sob demanda:
+# cada subcomando importa só o que usa, e o --help não carrega nenhum deles.
+components = LazyRegistry({
+    # Controllers
+    "auth_kaggle": "controllers.auth_kaggle:AuthKaggle",
+    "kaggle_repository": "controllers.kaggle_repo:KaggleRepository",
+    "local_dataset_source": "controllers.local_dataset_source:LocalDatasetSource",
+    # Models
+    "acquire_dataset": "models.service.dataset_acquisition:acquire_dataset",
+    "eda_report": "models.service.eda_report:EDAReport",
+    "eda_tools": "models.service.eda_report:DEFAULT_TOOLS",
+    "train_tpot_on_data": "models.service.variable_selection:train_tpot_on_data",
+    "load_data": "models.service.data_repository:load_data",
+    "preprocess_data": "models.service.data_preprocessor:preprocess_data",
+    "preprocess_file_streaming": "models.service.streaming_preprocessor:preprocess_file_streaming",
+    "streaming_preprocessor": "models.service.streaming_preprocessor:StreamingWatchPreprocessor",
+    "drop_columns": "models.service.data_preprocessor:DROP_COLUMNS",
+    "preprocessor_path": "models.service.data_preprocessor:DEFAULT_PREPROCESSOR_PATH",
+    "build_model": "models.service.model_service:build_model",
+    "analyze_features": "models.service.feature_service:analyze_features",
+    "model_registry": "models.service.model_registry:ModelRegistry",
+    "score_metric": "models.service.model_registry:metric_of",
+    "inference_adapter": "models.service.inference_adapter:ModelInferenceAdapter",
+    "serve": "models.service.prediction_server:serve",
+    "run_update": "models.service.incremental_update:run_update",
+    "run_segmented": "models.service.segmented_training:run_segmented",
+    "profile_report": "models.logs.tracing:profile_report",
+    "figure_renderer": "models.service.figure_renderer:FigureRenderer",
+    "shap_summary_job": "models.service.figure_renderer:shap_summary_job",
+    "shap_store": "models.service.shap_store:ShapStore",
+    "explain_listing": "models.service.shap_store:explain_listing",
+    "explain_listings_file": "models.service.shap_store:explain_listings_file",
+    "load_preprocessor": "models.service.comparables:load_preprocessor",
+    "open_similarity_index": "models.service.comparables:open_similarity_index",
+    "find_similar": "models.service.comparables:find_similar",
+    "add_listings": "models.service.comparables:add_listings",
+    "read_listings": "models.service.comparables:read_listings",
+    # Adapters
+    "dtale_adapter": "models.service.dtale_adapter:DtaleAdapter",
+    "pycaret_adapter": "models.service.pycaret_adapter:PyCaretAdapter",
+    # Application
+    "ml_use_cases": "application.use_cases:MLUseCases",
+})
 
 # Caminhos padrão
 credentials_path = os.path.expanduser("~/.kaggle/kaggle.json")
@@ -35,103 +61,400 @@ download_path = os.path.expanduser("models/dataset")
 dataset_name = "philmorekoung11/luxury-watch-listings"
 dataset_path = os.path.join(download_path, "Watches.csv")
 
-def run_download():
+def dataset_source():
+    """Fonte do dataset: o Kaggle ou, com WATCHES_DATASET_SOURCE=<diretório>, zips locais (testes/CI)."""
+    local_root = os.environ.get("WATCHES_DATASET_SOURCE")
+    if local_root:
+        return components.create("local_dataset_source", local_root)
     logger.info("Iniciando autenticação no Kaggle.")
-    auth = AuthKaggle(credentials_path)
+    auth = components.create("auth_kaggle", credentials_path)
     api = auth.authenticate()
+    if not api:
+        raise RuntimeError("Falha na autenticação do Kaggle.")
+    return components.create("kaggle_repository", api)
 
-    if api:
-        logger.info("Autenticação bem-sucedida! Fazendo download do dataset.")
-        repo = KaggleRepository(api)
-        repo.download_dataset(dataset_name, download_path)
-    else:
-        logger.error("Falha na autenticação do Kaggle. Encerrando aplicação.")
+def run_download(offline=False, force=False):
+    """Baixa o dataset só se a versão no Kaggle mudou; offline usa a cópia registrada no manifesto."""
+    try:
+        components.resolve("acquire_dataset")(dataset_source, dataset_name, download_path,
+                                              offline=offline, force=force)
+    except RuntimeError as e:
+        logger.error(f"{e} Encerrando aplicação.")
         exit()
 
     if not os.path.exists(dataset_path):
         logger.error(f"Arquivo {dataset_path} não encontrado após o download.")
         exit()
 
-def generate_eda_reports(dataset_path):
+def generate_eda_reports(dataset_path, tools=None, mode="sampled", row_budget=50_000, max_workers=None):
+    """Relatórios em lote (processos paralelos, cacheados pelo fingerprint do dataset). D-Tale fica no comando edit."""
     logger.info("Dataset baixado com sucesso! Gerando relatórios de EDA.")
-    eda = EDAReport(dataset_path)
-    eda.generate_autoviz()
-    eda.generate_dtale()
-    eda.generate_ydata()
+    eda = components.create("eda_report", dataset_path, mode=mode, row_budget=row_budget)
+    results = eda.generate_all(tuple(tools) if tools else components.resolve("eda_tools"), max_workers=max_workers)
+    failed = [result['tool'] for result in results if result['error']]
+    if failed:
+        logger.warning(f"Relatórios de EDA com erro: {failed}")
     logger.info("Relatórios de EDA gerados com sucesso.")
+    return results
 
-def run_shap_analysis(file_path, target_col, save_path="shap_summary.png"):
-    logger.info("Executando análise com SHAP (pipeline separado de TPOT)...")
-    model, shap_summary = run_pipeline(file_path, target_col)
-
-    if shap_summary is not None:
-        logger.info("Gerando gráfico SHAP...")
-
-        # Abre figura com tamanho ideal
-        plt.figure(figsize=(10, 6))
+def save_shap_plot(shap_summary, save_path="shap_summary.png"):
+    """Desenha o resumo SHAP num processo à parte (backend Agg, pontos amostrados); pula se as entradas não mudaram."""
+    if shap_summary is None:
+        logger.warning("SHAP summary retornou None. Gráfico não foi gerado.")
+        return None
+    job = components.resolve("shap_summary_job")(shap_summary, save_path)
+    return components.create("figure_renderer").render([job])[0]['path']
 
-        # Garante que os dados são compatíveis
-        shap.summary_plot(
-            shap_summary.values,
-            pd.DataFrame(shap_summary.data, columns=shap_summary.feature_names),
-            show=False  # evita exibição automática
-        )
+# Estágios da pipeline completa. Cada um recebe suas entradas declaradas e devolve um dict de saídas.
 
-        # Salva o gráfico
-        plt.tight_layout()
-        plt.savefig(save_path, dpi=300)
-        plt.close()
+def stage_download(offline):
+    run_download(offline=offline)
+    return {"dataset_path": dataset_path}
 
-        logger.info(f"Gráfico SHAP salvo em: {os.path.abspath(save_path)}")
+def stage_eda(dataset_path):
+    results = generate_eda_reports(dataset_path)
+    return {"eda_reports": [result['path'] for result in results if result['path']]}
 
-    else:
-        logger.warning("SHAP summary retornou None. Gráfico não foi gerado.")
+def stage_preprocess(dataset_path, target):
+    logger.info("Pré-processando uma única vez para TPOT e SHAP...")
+    data = components.resolve("load_data")(dataset_path, exclude=components.resolve("drop_columns"))
+    # Pré-processador com estatísticas agregadas: o modelo registrado pode ser atualizado depois (update)
+    # só com as listagens novas, sem os dados de base
+    X, y, preprocessor = components.resolve("preprocess_data")(
+        data, target, components.create("streaming_preprocessor", target)
+    )
+    preprocessor.save(components.resolve("preprocessor_path"))
+    return {"preprocessor": preprocessor, "X": X, "y": y}
 
-def run_tpot_training(file_path, target_col):
+def stage_tpot(X, y, preprocessor, target, max_time_mins):
     logger.info("Executando treinamento com TPOT...")
-    model, score, pipeline = train_tpot_model(file_path, target_col)
+    model, score, pipeline = components.resolve("train_tpot_on_data")(
+        X, y, registry=components.create("model_registry"), preprocessor=preprocessor, target=target,
+        max_time_mins=max_time_mins
+    )
     logger.info(f"Modelo TPOT treinado com sucesso. Score: {score}")
     logger.info(f"Pipeline otimizado: {pipeline}")
+    return {"tpot_pipeline": pipeline, "tpot_score": score}
 
-def main():
+def stage_train(X, y, preprocessor):
+    model, _, entry = components.resolve("build_model")(X, y, registry=components.create("model_registry"),
+                                                        preprocessor=preprocessor, return_entry=True)
+    return {"model": model, "model_version": entry}
+
+def stage_shap(model, model_version, X, y):
+    logger.info("Executando análise com SHAP...")
+    shap_summary = components.resolve("analyze_features")(model, X, y)
+    if model_version is not None and shap_summary is not None and len(shap_summary.values) == len(X):
+        # TreeSHAP explicou todas as linhas: ficam guardadas para o comando explain (ids = posição no dataset),
+        # no armazenamento da versão registrada, o mesmo que o explain abre a partir do registro
+        store = components.resolve("shap_store").open(model_version, X.columns)
+        if len(store) == 0:
+            store.append(y.index, shap_summary.values, shap_summary.base_values, shap_summary.data)
+    return {"shap_summary": shap_summary}
+
+def stage_shap_plot(shap_summary, save_path):
+    save_shap_plot(shap_summary, save_path)
+    return {"shap_plot": save_path}
+
+# Nomes dos estágios de build_pipeline_graph, na ordem: o --from-stage é validado sem montar o grafo
+PIPELINE_STAGES = ["download", "eda", "preprocess", "tpot", "train", "shap", "shap_plot"]
+
+def build_pipeline_graph(target="price", save_path="shap_summary.png", tpot_minutes=30, offline=False):
+    return StageGraph([
+        Stage("download", stage_download, outputs=["dataset_path"], params={"offline": offline}),
+        Stage("eda", stage_eda, inputs=["dataset_path"], outputs=["eda_reports"]),
+        Stage("preprocess", stage_preprocess, inputs=["dataset_path"], outputs=["preprocessor", "X", "y"],
+              params={"target": target}),
+        Stage("tpot", stage_tpot, inputs=["X", "y", "preprocessor"], outputs=["tpot_pipeline", "tpot_score"],
+              params={"target": target, "max_time_mins": tpot_minutes}, cpu_bound=True),
+        Stage("train", stage_train, inputs=["X", "y", "preprocessor"], outputs=["model", "model_version"],
+              cpu_bound=True),
+        Stage("shap", stage_shap, inputs=["model", "model_version", "X", "y"], outputs=["shap_summary"]),
+        Stage("shap_plot", stage_shap_plot, inputs=["shap_summary"], outputs=["shap_plot"],
+              params={"save_path": save_path}),
+    ], max_workers=os.cpu_count() or 2)
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="ProjetoLuxuryWatches CLI")
+    parser.add_argument("--resume", action="store_true",
+                        help="Pipeline completa: reaproveita checkpoints de estágios inalterados")
+    parser.add_argument("--from-stage", choices=PIPELINE_STAGES, default=None,
+                        help="Pipeline completa: reexecuta a partir deste estágio, reaproveitando os anteriores")
+    parser.add_argument("--tpot-minutes", type=float, default=30,
+                        help="Pipeline completa: orçamento de tempo da busca do TPOT (define também o tamanho da amostra)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Não acessa o Kaggle: usa a cópia local do dataset registrada no manifesto "
+                             "(também via WATCHES_OFFLINE=1)")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Mede o tempo de import de cada módulo carregado pelo comando e imprime um relatório")
     subparsers = parser.add_subparsers(dest="command")
 
+    # Comando: download
+    download_parser = subparsers.add_parser(
+        "download", help="Baixa o dataset do Kaggle se a versão remota mudou (manifesto com tamanho e checksum)"
+    )
+    download_parser.add_argument("--force", action="store_true", help="Baixa mesmo com a cópia local em dia")
+
     # Comando: edit
     edit_parser = subparsers.add_parser("edit", help="Abrir dados com Dtale")
     edit_parser.add_argument("csv_filename", help="Arquivo CSV em data/ para editar")
+    edit_parser.add_argument("--start", type=int, default=0, help="Primeira linha da janela carregada no D-Tale")
+    edit_parser.add_argument("--rows", type=int, default=50_000, help="Linhas da janela carregada no D-Tale")
+    edit_parser.add_argument("--export", action="store_true",
+                             help="Não abre o D-Tale: reaplica o log de edições e grava data/edited_data.csv")
 
     # Comando: train
     train_parser = subparsers.add_parser("train", help="Treinar modelo com PyCaret")
     train_parser.add_argument("csv_filename", help="CSV em data/ para treinar")
     train_parser.add_argument("target_col", help="Coluna alvo")
     train_parser.add_argument("task_type", help="classification, regression, or clustering")
+    train_parser.add_argument("--preprocessor", default=None,
+                              help="Arquivo do pré-processador ajustado (reutilizado se existir, criado caso contrário)")
+    train_parser.add_argument("--profile", choices=["fast", "balanced", "thorough"], default="balanced",
+                              help="fast: poucos modelos, 3 folds, 2 min; balanced: 10 modelos, 5 folds, 10 min; "
+                                   "thorough: todos os modelos, 10 folds, sem limite")
+
+    # Comando: eda
+    eda_parser = subparsers.add_parser(
+        "eda", help="Gera relatórios de EDA em paralelo, reaproveitando os de um dataset inalterado"
+    )
+    eda_parser.add_argument("csv_path", help="Dataset (caminho completo)")
+    eda_parser.add_argument("--tools", nargs="+", choices=["ydata", "sweetviz", "autoviz"], default=None,
+                            help="Relatórios a gerar (padrão: todos)")
+    eda_parser.add_argument("--mode", choices=["full", "sampled", "minimal"], default="sampled",
+                            help="full: dataset inteiro; sampled: amostra de --row-budget linhas; "
+                                 "minimal: perfil sem correlações na amostra")
+    eda_parser.add_argument("--row-budget", type=int, default=50_000, help="Linhas analisadas fora do modo full")
+    eda_parser.add_argument("--workers", type=int, default=None, help="Processos simultâneos (padrão: um por relatório)")
 
-    args = parser.parse_args()
+    # Comando: preprocess
+    preprocess_parser = subparsers.add_parser(
+        "preprocess", help="Pré-processa um CSV maior que a memória em blocos, gravando os blocos transformados"
+    )
+    preprocess_parser.add_argument("csv_path", help="CSV de listagens (caminho completo)")
+    preprocess_parser.add_argument("--target", default="price")
+    preprocess_parser.add_argument("--output", default="models/dataset/preprocessed",
+                                   help="Diretório dos blocos transformados (part-NNNNN + manifest.json)")
+    preprocess_parser.add_argument("--chunk-size", type=int, default=200_000, help="Linhas por bloco")
+    preprocess_parser.add_argument("--preprocessor", default=None,
+                                   help="Onde salvar o pré-processador ajustado (padrão: o da pipeline)")
 
-    dtale_adapter = DtaleAdapter()
-    training_adapter = PyCaretAdapter()
-    ml_use_cases = MLUseCases(
-        dtale_adapter=dtale_adapter,
-        training_adapter=training_adapter
+    # Comando: update
+    update_parser = subparsers.add_parser(
+        "update", help="Atualiza incrementalmente o modelo registrado com novas listagens"
     )
+    update_parser.add_argument("new_csv", help="CSV só com as novas listagens (caminho completo)")
+    update_parser.add_argument("--target", default="price")
+    update_parser.add_argument("--version", default="best", help="Versão do registro a atualizar")
+    update_parser.add_argument("--base", default=None,
+                               help="CSV do treino anterior: ativa a comparação com um retreino completo")
+    update_parser.add_argument("--extra-trees", type=int, default=100, help="Árvores acrescentadas ao ensemble")
+    update_parser.add_argument("--holdout", type=float, default=0.2,
+                               help="Fração das novas linhas reservada para comparar os modelos")
 
-    if args.command == "edit":
+    # Comando: segments
+    segments_parser = subparsers.add_parser(
+        "segments", help="Treina um modelo por marca (ou marca x modelo) em paralelo, com um modelo global de reserva"
+    )
+    segments_parser.add_argument("csv_path", help="CSV de listagens (caminho completo)")
+    segments_parser.add_argument("--target", default="price")
+    segments_parser.add_argument("--by", nargs="+", default=["brand"],
+                                 help="Colunas que definem os segmentos (ex.: --by brand model)")
+    segments_parser.add_argument("--min-rows", type=int, default=500,
+                                 help="Segmentos menores usam o modelo global")
+    segments_parser.add_argument("--max-fits", type=float, default=None,
+                                 help="Orçamento da busca do modelo global e do maior segmento "
+                                      "(os menores recebem proporcionalmente menos; padrão: o da busca de modelos)")
+    segments_parser.add_argument("--workers", type=int, default=None, help="Processos simultâneos (padrão: um por CPU)")
+
+    # Comando: explain
+    explain_parser = subparsers.add_parser(
+        "explain", help="Explica o preço de uma listagem (contribuições SHAP guardadas em disco)"
+    )
+    explain_group = explain_parser.add_mutually_exclusive_group(required=True)
+    explain_group.add_argument("--listing", type=int, help="Id da listagem (posição da linha no dataset)")
+    explain_group.add_argument("--new", default=None,
+                               help="CSV ou JSON com listagens novas: explicadas e acrescentadas ao armazenamento")
+    explain_parser.add_argument("--dataset", default=dataset_path, help="Dataset de onde vem a listagem")
+    explain_parser.add_argument("--target", default="price")
+    explain_parser.add_argument("--version", default="best",
+                                   help="Versão do registro: best, best:<protocolo>, latest ou um id")
+    explain_parser.add_argument("--top", type=int, default=10, help="Quantas contribuições mostrar")
+
+    # Comando: similar
+    similar_parser = subparsers.add_parser(
+        "similar", help="Listagens mais parecidas (índice de vizinhos sobre as features pré-processadas)"
+    )
+    similar_group = similar_parser.add_mutually_exclusive_group(required=True)
+    similar_group.add_argument("--listing", type=int, nargs="+", help="Ids das listagens (posições no dataset)")
+    similar_group.add_argument("--query", default=None, help="CSV ou JSON com listagens a comparar (não entram no índice)")
+    similar_group.add_argument("--add", default=None, help="CSV ou JSON com listagens novas a acrescentar ao índice")
+    similar_parser.add_argument("--k", type=int, default=20, help="Vizinhos por listagem")
+    similar_parser.add_argument("--dataset", default=dataset_path)
+    similar_parser.add_argument("--target", default="price")
+    similar_parser.add_argument("--version", default="best", help="Versão do registro cujo pré-processador é usado")
+    similar_parser.add_argument("--preprocessor", default=None, help="Arquivo do pré-processador (em vez do registro)")
+    similar_parser.add_argument("--backend", choices=["auto", "kdtree", "balltree", "faiss"], default="auto",
+                                help="Índice na construção: árvores exatas ou faiss (HNSW aproximado, opcional)")
+    similar_parser.add_argument("--rebuild", action="store_true", help="Reconstrói o índice do zero")
+
+    # Comando: serve
+    serve_parser = subparsers.add_parser("serve", help="Servidor HTTP local de previsão de preços")
+    serve_parser.add_argument("--target", default="price", help="Alvo cujo modelo registrado será servido")
+    serve_parser.add_argument("--version", default="best",
+                                 help="Versão do registro: best, best:<protocolo>, latest ou um id")
+    serve_parser.add_argument("--model", default=None,
+                              help="Arquivo de modelo fora do registro (usa --preprocessor junto)")
+    serve_parser.add_argument("--preprocessor", default=None,
+                              help="Arquivo do pré-processador ajustado (só com --model; padrão: o da pipeline)")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--batch-window-ms", type=float, default=5.0,
+                              help="Janela para agrupar requisições concorrentes em um único predict")
+    serve_parser.add_argument("--max-batch-rows", type=int, default=512)
+
+    # Comando: models
+    models_parser = subparsers.add_parser("models", help="Listar ou podar versões do registro de modelos")
+    models_parser.add_argument("--target", default="price")
+    models_parser.add_argument("--prune", type=int, default=None, metavar="N",
+                               help="Mantém as N versões mais recentes (e a melhor) e remove o resto")
+
+    # Comando: profile-report
+    report_parser = subparsers.add_parser(
+        "profile-report", help="Resume os spans gravados: trechos mais lentos e regressões entre execuções"
+    )
+    report_parser.add_argument("--trace", default=None, help="Arquivo JSONL de spans (padrão: models/logs/traces.jsonl)")
+    report_parser.add_argument("--run", default=None, help="Execução analisada (padrão: a mais recente)")
+    report_parser.add_argument("--baseline", default=None, help="Execução de comparação (padrão: a anterior)")
+    report_parser.add_argument("--top", type=int, default=15, help="Quantos trechos listar")
+    report_parser.add_argument("--threshold", type=float, default=1.2,
+                               help="Razão de tempo a partir da qual um trecho é uma regressão")
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    args.offline = args.offline or os.environ.get("WATCHES_OFFLINE", "0") != "0"
+    graph = build_pipeline_graph(tpot_minutes=args.tpot_minutes, offline=args.offline)
+
+    profiler = ImportProfiler().start() if args.profile_imports else None
+    try:
+        run_command(args, graph)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            print(profiler.report(), file=sys.stderr)
+
+def run_command(args, graph):
+    if args.command == "download":
+        run_download(offline=args.offline, force=args.force)
+        print(f"Dataset disponível em: {dataset_path}")
+
+    elif args.command == "models":
+        registry = components.create("model_registry")
+        metric_of = components.resolve("score_metric")
+        if args.prune is not None:
+            registry.prune(args.target, keep=args.prune)
+        for entry in registry.versions(args.target):
+            print(f"{entry.version}  {entry.source:<16} {metric_of(entry)}={entry.score}  {entry.created_at}")
+
+    elif args.command == "profile-report":
+        print(components.resolve("profile_report")(args.trace, args.run, args.baseline, args.top, args.threshold))
+
+    elif args.command == "eda":
+        for result in generate_eda_reports(args.csv_path, args.tools, args.mode, args.row_budget, args.workers):
+            status = "cache" if result['cached'] else (f"erro: {result['error']}" if result['error'] else "gerado")
+            print(f"{result['tool']:<10} {result['seconds']:>7.1f}s  {status:<10} {result['path'] or ''}")
+
+    elif args.command == "preprocess":
+        manifest, preprocessor = components.resolve("preprocess_file_streaming")(
+            args.csv_path, args.target, args.output, chunk_size=args.chunk_size
+        )
+        preprocessor.save(args.preprocessor or components.resolve("preprocessor_path"))
+        print(f"{sum(part['rows'] for part in manifest['parts'])} linhas em {len(manifest['parts'])} blocos: {args.output}")
+
+    elif args.command == "update":
+        report = components.resolve("run_update")(args.new_csv, args.target, args.version, args.base,
+                                                  args.extra_trees, args.holdout)
+        print(f"Nova versão registrada: {report['version']}")
+        if 'full_retrain' in report:
+            print(f"{'modelo':<14} {'RMSE (log)':>10} {'R²':>8} {'tempo (s)':>10}")
+            for name in ('current', 'incremental', 'full_retrain'):
+                row = report[name]
+                print(f"{name:<14} {row['rmse_log']:>10.4f} {row['r2']:>8.4f} {row.get('seconds', 0.0):>10.2f}")
+
+    elif args.command == "segments":
+        budget = {} if args.max_fits is None else {'max_fits': args.max_fits}
+        report = components.resolve("run_segmented")(args.csv_path, args.target, tuple(args.by),
+                                                     min_segment_rows=args.min_rows, max_workers=args.workers,
+                                                     **budget)
+        print(f"{'segmento':<30} {'linhas':>8} {'ajustes':>8} {'modelo':<14} {'R² CV':>7} {'tempo (s)':>10}")
+        for row in report:
+            print(f"{row['label'][:30]:<30} {row['rows']:>8} {row['max_fits']:>8} {row['name']:<14} "
+                  f"{row['score']:>7.3f} {row['seconds']:>10.1f}")
+
+    elif args.command == "explain":
+        if args.new:
+            explanations = components.resolve("explain_listings_file")(args.new, args.dataset, args.target,
+                                                                       args.version, top=args.top)
+        else:
+            explanations = [components.resolve("explain_listing")(args.listing, args.dataset, args.target,
+                                                                  args.version, top=args.top)]
+        for explanation in explanations:
+            # O modelo prevê log1p(preço): as contribuições somam na escala log
+            print(f"Listagem {explanation['listing_id']}: preço previsto {math.expm1(explanation['prediction']):,.0f} "
+                  f"(base {math.expm1(explanation['base_value']):,.0f})")
+            for item in explanation['contributions']:
+                print(f"  {item['feature']:<28} {item['value']:>12.4g} {item['shap']:>+9.4f}")
+
+    elif args.command == "similar":
+        preprocessor, preprocessor_key = components.resolve("load_preprocessor")(
+            args.target, args.version, args.preprocessor, components.create("model_registry")
+        )
+        index = components.resolve("open_similarity_index")(args.dataset, preprocessor, preprocessor_key,
+                                                            args.backend, args.rebuild)
+        if args.add:
+            listings = components.resolve("read_listings")(args.add)
+            ids = components.resolve("add_listings")(index, preprocessor, args.dataset, listings)
+            print(f"{len(ids)} listagens acrescentadas ao índice (ids {ids[0]}-{ids[-1]}); total: {len(index)}")
+        else:
+            listings = components.resolve("read_listings")(args.query) if args.query else None
+            queries = args.listing or [f"consulta {i}" for i in range(len(listings))]
+            results = components.resolve("find_similar")(index, preprocessor, args.dataset, args.listing, listings,
+                                                         args.k)
+            for query, neighbors in zip(queries, results):
+                print(f"\nMais parecidas com {query}:")
+                print(neighbors.to_string(index=False))
+
+    elif args.command == "serve":
+        inference_adapter = components.resolve("inference_adapter")
+        if args.model:
+            inference = inference_adapter.from_files(
+                args.model, args.preprocessor or components.resolve("preprocessor_path")
+            )
+        else:
+            inference = inference_adapter.from_registry(args.target, args.version)
+        components.resolve("serve")(inference, args.host, args.port, args.batch_window_ms, args.max_batch_rows)
+
+    elif args.command == "edit":
         logger.info(f"Iniciando modo edição com o arquivo {args.csv_filename}")
-        ml_use_cases.edit_data(args.csv_filename)
+        # A edição não treina nada: o adapter do PyCaret não é carregado
+        if args.export:
+            ml_use_cases = components.create("ml_use_cases", dtale_adapter=None, training_adapter=None)
+            print(f"Dataset editado: {ml_use_cases.export_edits(args.csv_filename)}")
+        else:
+            ml_use_cases = components.create("ml_use_cases", dtale_adapter=components.create("dtale_adapter"),
+                                             training_adapter=None)
+            print(f"Edições registradas em: {ml_use_cases.edit_data(args.csv_filename, args.start, args.rows)}")
 
     elif args.command == "train":
         logger.info(f"Iniciando modo treinamento: arquivo={args.csv_filename}, target={args.target_col}, tipo={args.task_type}")
-        ml_use_cases.train_model(args.csv_filename, args.target_col, args.task_type)
+        ml_use_cases = components.create("ml_use_cases", dtale_adapter=None,
+                                         training_adapter=components.create("pycaret_adapter", profile=args.profile))
+        ml_use_cases.train_model(args.csv_filename, args.target_col, args.task_type, args.preprocessor)
 
     else:
         logger.info("Executando pipeline completa (download, EDA, treino TPOT e análise SHAP)...")
-        run_download()
-        generate_eda_reports(dataset_path)
-        target = "price"
-
-        run_tpot_training(dataset_path, target)
-        run_shap_analysis(dataset_path, target)
+        graph.run(resume=args.resume, from_stage=args.from_stage)
 
 if __name__ == "__main__":
     main()
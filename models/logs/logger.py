@@ -1,14 +1,120 @@
+import os
+import json
+import queue
+import atexit
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_PATH = "models/logs/logs.txt"
+LOG_LEVEL = os.environ.get("WATCHES_LOG_LEVEL", "INFO").upper()
+# text: linha legível com os campos estruturados no fim; json: um objeto JSON por linha
+LOG_FORMAT = os.environ.get("WATCHES_LOG_FORMAT", "text")
+MAX_BYTES = 5 * 2 ** 20
+BACKUP_COUNT = 3
+# Workers iniciados por spawn (loky do joblib) não alcançam o listener do processo principal:
+# cada um escreve num arquivo próprio, sem rotação, criado só se o worker registrar algo
+WORKER_LOG_DIR = "models/logs/workers"
+
+# Atributos padrão de um LogRecord: o que sobra veio de `extra=` e é um campo estruturado
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def structured_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formato de sempre, acrescido de `| chave=valor` para os campos passados em `extra`."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = structured_fields(record)
+        if fields:
+            line += " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+            "message": record.getMessage(), **structured_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _build_handlers(worker: bool = False) -> list:
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else StructuredFormatter()
+    if worker:
+        os.makedirs(WORKER_LOG_DIR, exist_ok=True)
+        file_handler = logging.FileHandler(os.path.join(WORKER_LOG_DIR, f"logs-{os.getpid()}.txt"),
+                                           encoding="utf-8", delay=True)
+    else:
+        file_handler = RotatingFileHandler(LOG_PATH, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8")
+    handlers = [file_handler, logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def _replace_handlers(root: logging.Logger, handlers: list):
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+
 
 def setup_logger():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler("models/logs/logs.txt"),
-            logging.StreamHandler()
-        ]
-    )
+    """
+    Logging em segundo plano: o código só enfileira o registro (QueueHandler) e uma thread
+    (QueueListener) formata e escreve no arquivo rotativo e no console.
+    Nível via WATCHES_LOG_LEVEL (DEBUG liga os diagnósticos caros); formato via WATCHES_LOG_FORMAT.
+
+    Só o processo principal abre o arquivo rotativo: processos filhos criados por fork (pools
+    de processos) enviam os registros por uma fila multiprocessing ao mesmo listener, e workers
+    iniciados por spawn escrevem em WORKER_LOG_DIR. Assim nenhum filho rotaciona o logs.txt.
+    """
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if multiprocessing.parent_process() is not None:
+        # Worker iniciado por spawn: importou este módulo do zero e não tem como alcançar o listener
+        _replace_handlers(root, _build_handlers(worker=True))
+        return logging.getLogger("EDA_Project")
+
+    handlers = _build_handlers()
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _replace_handlers(root, [QueueHandler(log_queue)])
+    listener.start()
+    atexit.register(listener.stop)
+
+    # Fila dos processos filhos, criada no primeiro fork, com um segundo listener sobre os mesmos handlers
+    children = {}
+    is_child = False
+
+    def open_child_queue():
+        if is_child or 'queue' in children:
+            return
+        children['queue'] = multiprocessing.Queue()
+        child_listener = QueueListener(children['queue'], *handlers, respect_handler_level=True)
+        child_listener.start()
+        atexit.register(child_listener.stop)
+
+    def send_to_parent_in_child():
+        # Processos criados por fork não herdam a thread do listener: no filho (e nos netos) os
+        # registros vão pela fila multiprocessing até o listener do processo principal
+        nonlocal is_child
+        is_child = True
+        _replace_handlers(root, [QueueHandler(children['queue'])])
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(before=open_child_queue, after_in_child=send_to_parent_in_child)
     return logging.getLogger("EDA_Project")
 
 logger = setup_logger()
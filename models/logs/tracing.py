@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import uuid
+import functools
+import threading
+from contextlib import contextmanager
+
+# Spans da execução: uma linha JSON por trecho medido (tempo de parede, CPU, pico de RSS e shapes).
+# Processos filhos (pools do joblib, EDA) herdam o run_id pelo ambiente e escrevem no mesmo arquivo.
+TRACE_PATH = os.environ.setdefault("WATCHES_TRACE_PATH", os.path.abspath("models/logs/traces.jsonl"))
+RUN_ID = os.environ.setdefault("WATCHES_RUN_ID", uuid.uuid4().hex[:12])
+ENABLED = os.environ.get("WATCHES_TRACE", "1") != "0"
+
+_lock = threading.Lock()
+_open_spans = {}
+_local = threading.local()
+
+
+def _memory_status() -> tuple:
+    """(RSS atual, pico de RSS) do processo em MB."""
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if line.startswith(("VmRSS", "VmHWM")))
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        import psutil
+        info = psutil.Process().memory_info()
+        # Windows expõe o pico (peak_wset); nos demais sistemas só há a amostra no fim do trecho
+        rss = info.rss / 2 ** 20
+        return rss, getattr(info, "peak_wset", info.rss) / 2 ** 20
+
+
+def _reset_peak() -> bool:
+    """Zera o pico de RSS do processo (Linux: escrever 5 em clear_refs). Retorna se foi possível."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def shape_of(value):
+    """Shape de DataFrames, Series e arrays (também dentro de tuplas/listas); None para o resto."""
+    if hasattr(value, "shape") and isinstance(getattr(value, "shape"), tuple):
+        return list(value.shape)
+    if isinstance(value, (tuple, list)) and value and not isinstance(value[0], (int, float, str)):
+        shapes = [shape_of(item) for item in value]
+        return shapes if any(s is not None for s in shapes) else None
+    return None
+
+
+class Span:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.id = uuid.uuid4().hex[:12]
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent_id = stack[-1].id if stack else None
+        self.attrs = dict(attrs)
+        self.input_shapes = None
+        self.output_shapes = None
+        self.peak_mb = 0.0
+        self.record = None  # preenchido ao terminar
+
+    def set(self, **attrs):
+        """Acrescenta campos ao span (ex.: shape da saída, nº de linhas) antes de ele terminar."""
+        self.attrs.update(attrs)
+
+    def _start(self):
+        _local.stack.append(self)
+        with _lock:
+            rss, peak = _memory_status()
+            # O pico é compartilhado pelo processo: antes de zerá-lo, os spans abertos registram o valor atual
+            for span in _open_spans.values():
+                span.peak_mb = max(span.peak_mb, peak)
+            _reset_peak()
+            _open_spans[self.id] = self
+        self.rss_start_mb = rss
+        self.peak_mb = max(self.peak_mb, rss)
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.started_at = time.time()
+
+    def _finish(self, error: BaseException = None):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        with _lock:
+            rss, peak = _memory_status()
+            for span in _open_spans.values():
+                span.peak_mb = max(span.peak_mb, peak)
+            _open_spans.pop(self.id, None)
+        _local.stack.pop()
+        record = {
+            "run_id": RUN_ID, "span_id": self.id, "parent_id": self.parent_id, "name": self.name,
+            "pid": os.getpid(), "started_at": self.started_at, "wall_s": round(wall, 6), "cpu_s": round(cpu, 6),
+            "rss_start_mb": round(self.rss_start_mb, 1), "rss_end_mb": round(rss, 1),
+            "peak_rss_delta_mb": round(max(self.peak_mb - self.rss_start_mb, 0.0), 1),
+            "input_shapes": self.input_shapes, "output_shapes": self.output_shapes,
+            "status": "error" if error is not None else "ok",
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        if self.attrs:
+            record["attrs"] = self.attrs
+        self.record = record
+        write_record(record)
+
+
+def write_record(record: dict, path: str = None):
+    """Anexa um registro ao JSONL. Uma única escrita com O_APPEND: linhas de processos diferentes não se misturam."""
+    path = path or TRACE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def span(name: str, inputs=None, **attrs):
+    """
+    Mede um trecho:
+
+        with span("preprocess.encode", inputs=X) as s:
+            X_t = transformer.fit_transform(X)
+            s.output_shapes = shape_of(X_t)
+    """
+    if not ENABLED:
+        yield Span(name, attrs)
+        return
+    current = Span(name, attrs)
+    current.input_shapes = shape_of(inputs) if inputs is not None else None
+    current._start()
+    try:
+        yield current
+    except BaseException as e:
+        current._finish(e)
+        raise
+    current._finish()
+
+
+def traced(name: str = None, **attrs):
+    """Decorador: um span por chamada, com os shapes dos argumentos e do retorno."""
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            shapes = [shape_of(arg) for arg in list(args) + list(kwargs.values())]
+            with span(span_name, **attrs) as current:
+                current.input_shapes = [s for s in shapes if s is not None] or None
+                result = func(*args, **kwargs)
+                current.output_shapes = shape_of(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def load_spans(path: str = None) -> list:
+    path = path or TRACE_PATH
+    if not os.path.exists(path):
+        return []
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # linha truncada por um processo interrompido
+    return spans
+
+
+def _summarize(spans: list) -> dict:
+    summary = {}
+    for record in spans:
+        row = summary.setdefault(record["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_delta_mb": 0.0,
+                                                  "errors": 0})
+        row["calls"] += 1
+        row["wall_s"] += record["wall_s"]
+        row["cpu_s"] += record["cpu_s"]
+        row["peak_rss_delta_mb"] = max(row["peak_rss_delta_mb"], record["peak_rss_delta_mb"])
+        row["errors"] += record["status"] == "error"
+    return summary
+
+
+def profile_report(path: str = None, run_id: str = None, baseline: str = None, top: int = 15,
+                   threshold: float = 1.2, min_seconds: float = 0.5) -> str:
+    """
+    Resumo de uma execução (padrão: a mais recente): trechos mais lentos por tempo total e regressões
+    em relação a outra execução (padrão: a anterior) — trechos `threshold` vezes mais lentos e com pelo
+    menos `min_seconds` de diferença.
+    """
+    spans = load_spans(path)
+    runs = []
+    for record in sorted(spans, key=lambda r: r["started_at"]):
+        if record["run_id"] not in runs:
+            runs.append(record["run_id"])
+    if not runs:
+        return "Nenhum span registrado."
+    run_id = run_id or runs[-1]
+    if baseline is None:
+        earlier = runs[:runs.index(run_id)] if run_id in runs else []
+        baseline = earlier[-1] if earlier else None
+
+    current = _summarize([r for r in spans if r["run_id"] == run_id])
+    lines = [f"Execução {run_id} ({len(current)} trechos)", "",
+             f"{'trecho':<40} {'chamadas':>8} {'parede (s)':>11} {'CPU (s)':>9} {'pico RSS (MB)':>14} {'erros':>6}"]
+    for name, row in sorted(current.items(), key=lambda item: -item[1]["wall_s"])[:top]:
+        lines.append(f"{name[:40]:<40} {row['calls']:>8} {row['wall_s']:>11.2f} {row['cpu_s']:>9.2f} "
+                     f"{row['peak_rss_delta_mb']:>14.1f} {row['errors']:>6}")
+
+    if baseline is not None:
+        previous = _summarize([r for r in spans if r["run_id"] == baseline])
+        regressions = [
+            (name, previous[name]["wall_s"], row["wall_s"]) for name, row in current.items()
+            if name in previous and row["wall_s"] > previous[name]["wall_s"] * threshold
+            and row["wall_s"] - previous[name]["wall_s"] >= min_seconds
+        ]
+        lines += ["", f"Regressões em relação a {baseline} (> {threshold:.2f}x e +{min_seconds}s):"]
+        if not regressions:
+            lines.append("  nenhuma")
+        for name, before, after in sorted(regressions, key=lambda r: r[1] - r[2]):
+            lines.append(f"  {name[:40]:<40} {before:>9.2f}s -> {after:>9.2f}s ({after / before:.2f}x)")
+    return "\n".join(lines)
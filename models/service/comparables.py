@@ -0,0 +1,99 @@
+import os
+import numpy as np
+import pandas as pd
+from models.logs.logger import logger
+from models.service.data_preprocessor import DROP_COLUMNS
+from models.service.dataset_cache import read_dataset, read_rows, dataset_rows, file_fingerprint
+from models.service.similarity_adapter import NeighborIndexAdapter
+
+SIMILARITY_DIR = "models/cache/similarity"
+DEFAULT_NEIGHBORS = 20
+# Colunas originais mostradas ao lado de cada listagem parecida
+DISPLAY_COLUMNS = ['brand', 'model', 'price', 'mvmt', 'casem', 'yop', 'cond', 'size']
+
+
+def index_path_for(dataset_path: str, preprocessor_key: str) -> str:
+    """Um índice por (dataset, pré-processador): mudar qualquer um dos dois muda o espaço das features."""
+    return os.path.join(SIMILARITY_DIR, f"{file_fingerprint(dataset_path)[:16]}-{preprocessor_key[:24]}")
+
+
+def load_preprocessor(target: str = 'price', version: str = "best", preprocessor_path: str = None,
+                      registry=None) -> tuple:
+    """
+    Pré-processador (de um arquivo ou de uma versão do registro) e a chave estável do seu índice:
+    o fingerprint do arquivo ou a versão do registro. O hash do objeto não serve de chave: muda
+    entre a carga com mmap do registro e WatchPreprocessor.load.
+    """
+    if preprocessor_path:
+        from models.service.data_preprocessor import WatchPreprocessor
+        return WatchPreprocessor.load(preprocessor_path), file_fingerprint(preprocessor_path)
+
+    from models.service.model_registry import ModelRegistry
+    _, preprocessor, entry = (registry or ModelRegistry()).load(target, version)
+    if preprocessor is None:
+        raise ValueError(f"A versão {entry.version} foi registrada sem pré-processador.")
+    return preprocessor, entry.version
+
+
+def open_similarity_index(dataset_path: str, preprocessor, preprocessor_key: str, backend: str = "auto",
+                          rebuild: bool = False) -> NeighborIndexAdapter:
+    """Carrega o índice do dataset ou o constrói (todas as linhas, ids = posição no dataset)."""
+    path = index_path_for(dataset_path, preprocessor_key)
+    if not rebuild and os.path.exists(os.path.join(path, "meta.json")):
+        return NeighborIndexAdapter.load(path)
+    data = read_dataset(dataset_path, exclude=DROP_COLUMNS)
+    X = preprocessor.transform(data)
+    return NeighborIndexAdapter.build(path, data.index, X.to_numpy(), X.columns.tolist(), backend)
+
+
+def _neighbors_frame(dataset_path: str, n_rows: int, distances: np.ndarray, ids: np.ndarray) -> pd.DataFrame:
+    """Vizinhos de uma consulta com as colunas originais (listagens acrescentadas depois do dataset ficam sem elas)."""
+    frame = pd.DataFrame({'listing_id': ids, 'distance': distances})
+    known = ids[ids < n_rows]
+    if len(known):
+        header = pd.read_csv(dataset_path, nrows=0).columns
+        columns = [col for col in DISPLAY_COLUMNS if col in header]
+        details = read_rows(dataset_path, known, columns)
+        frame = frame.join(details, on='listing_id')
+    return frame
+
+
+def find_similar(index: NeighborIndexAdapter, preprocessor, dataset_path: str, listing_ids: list = None,
+                 listings: pd.DataFrame = None, k: int = DEFAULT_NEIGHBORS) -> list:
+    """
+    Listagens mais parecidas, em lote: com `listing_ids` (posições no dataset) cada listagem é
+    excluída dos próprios vizinhos; com `listings` (linhas brutas) as consultas não entram no índice.
+    Retorna um DataFrame de vizinhos por consulta.
+    """
+    n_rows = dataset_rows(dataset_path)
+    if listing_ids is not None:
+        outside = [listing_id for listing_id in listing_ids if not 0 <= listing_id < n_rows]
+        if outside:
+            raise KeyError(f"Listagens fora do dataset {dataset_path}: {outside}")
+        features = preprocessor.transform(read_rows(dataset_path, listing_ids))
+        distances, ids = index.query(features.to_numpy(), k + 1)
+        results = []
+        for listing_id, row_distances, row_ids in zip(listing_ids, distances, ids):
+            keep = row_ids != listing_id
+            results.append(_neighbors_frame(dataset_path, n_rows, row_distances[keep][:k], row_ids[keep][:k]))
+        return results
+
+    distances, ids = index.query(preprocessor.transform(listings).to_numpy(), k)
+    return [_neighbors_frame(dataset_path, n_rows, row_distances, row_ids)
+            for row_distances, row_ids in zip(distances, ids)]
+
+
+def add_listings(index: NeighborIndexAdapter, preprocessor, dataset_path: str, listings: pd.DataFrame) -> np.ndarray:
+    """Acrescenta listagens novas ao índice, com ids depois do fim do dataset e dos já acrescentados."""
+    start = max(index.next_id, dataset_rows(dataset_path))
+    ids = np.arange(start, start + len(listings))
+    index.add(ids, preprocessor.transform(listings).to_numpy())
+    logger.info(f"{len(ids)} listagens acrescentadas ao índice de similaridade (ids {ids[0]}-{ids[-1]}).")
+    return ids
+
+
+def read_listings(path: str) -> pd.DataFrame:
+    """Listagens brutas de um CSV ou JSON (lista de objetos)."""
+    if path.endswith(".json"):
+        return pd.read_json(path, orient="records")
+    return pd.read_csv(path)
@@ -1,3 +1,6 @@
+import os
+import logging
+import joblib
 import pandas as pd
 import numpy as np
 from sklearn.pipeline import Pipeline
@@ -6,13 +9,89 @@ from sklearn.preprocessing import RobustScaler
 from sklearn.compose import ColumnTransformer
 from category_encoders import TargetEncoder
 from models.logs.logger import logger
+from models.logs.tracing import span, traced, shape_of
 
-def preprocess_data(data: pd.DataFrame, target: str):
-    logger.info("Iniciando o pré-processamento dos dados.")
-    
+PRICE_ON_REQUEST = 'Price on request'
+TOP_MODELS = 30
+# Colunas pouco informativas ou muito específicas, descartadas antes da modelagem
+DROP_COLUMNS = ['Unnamed: 0', 'name', 'ref']
+DEFAULT_PREPROCESSOR_PATH = "models/artifacts/preprocessor.joblib"
+# Tipo da matriz de features: metade da memória do float64 e precisão de sobra para os regressores
+FEATURE_DTYPE = np.float32
+
+
+def _is_text(series: pd.Series) -> bool:
+    """Indica se a coluna aceita o acessor .str (object/string ou categórica de strings)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+
+
+def _via_uniques(series: pd.Series, func) -> pd.Series:
+    """
+    Aplica `func` (vetorizada) apenas aos valores distintos e reexpande pelo código.
+    As colunas de listagem repetem muito os valores, então isso evita varrer as strings linha a linha.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        uniques = np.asarray(uniques, dtype=object)
+    transformed = func(pd.Series(uniques, dtype=object if _is_text(series) else None))
+    return pd.Series(transformed.to_numpy()[codes], index=series.index, name=series.name)
+
+
+def _parse_size(size: pd.Series) -> pd.Series:
+    """Remove o sufixo ' mm' dos valores string e converte para numérico."""
+    if not _is_text(size):
+        return pd.to_numeric(size, errors='coerce')
+
+    def parse(values: pd.Series) -> pd.Series:
+        stripped = values.str.replace(' mm', '', regex=False)
+        return pd.to_numeric(stripped.where(stripped.notna(), values), errors='coerce')
+
+    return _via_uniques(size, parse)
+
+
+def _clean_price(price: pd.Series) -> pd.Series:
+    """Converte strings como '$12,500' em números e 'Price on request' em -1."""
+    if not _is_text(price):
+        return price
+
+    def parse(values: pd.Series) -> pd.Series:
+        values = values.mask(values == PRICE_ON_REQUEST, -1)
+        stripped = values.str.replace(r"[$,']", '', regex=True)
+        parsed = pd.to_numeric(stripped, errors='coerce')
+        return parsed.where(stripped.notna(), values)
+
+    return _via_uniques(price, parse)
+
+
+def _extract_year(yop: pd.Series) -> pd.Series:
+    """Extrai o primeiro grupo de 4 dígitos de 'yop' e converte para numérico."""
+    def extract(values: pd.Series) -> pd.Series:
+        return pd.to_numeric(values.astype(str).str.extract(r'(\d{4})')[0], errors='coerce')
+
+    return _via_uniques(yop, extract)
+
+
+def _contains_gold(series: pd.Series) -> pd.Series:
+    """Equivalente vetorizado de 'gold' in str(x).lower()."""
+    return _via_uniques(series, lambda values: values.astype(str).str.lower().str.contains('gold', regex=False))
+
+
+def _collapse_rare(series: pd.Series, keep: list, other: str = 'Other') -> pd.Series:
+    """Troca por `other` todo valor (inclusive ausente) fora de `keep`; aceita colunas categóricas."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        kept = [cat for cat in series.cat.categories if cat in set(keep) and cat != other]
+        return series.cat.set_categories(kept + [other]).fillna(other)
+    return series.where(series.isin(keep), other)
+
+
+@traced("preprocess.clean_target")
+def clean_target(data: pd.DataFrame, target: str) -> pd.DataFrame:
+    """Converte o preço, remove linhas sem alvo válido e aplica log1p ao alvo."""
     # Corrigir preço
-    data['price'] = data['price'].apply(lambda x: -1 if x == 'Price on request' else x)
-    data['price'] = data['price'].apply(lambda x: int(x.replace('$', '').replace(',', '').replace("'", '')) if isinstance(x, str) else x)
+    data['price'] = _clean_price(data['price'])
     data[target] = pd.to_numeric(data[target], errors='coerce')
     
     # Remover valores ausentes ou inválidos
@@ -20,60 +99,63 @@ def preprocess_data(data: pd.DataFrame, target: str):
     data = data[data[target] != -1]
     logger.info("Linhas com valores ausentes ou -1 removidas da coluna alvo.")
 
+    # Aplicar log1p ao target (preço)
+    # Valores <= 0 viram 0, exatamente como log1p(0)
+    data[target] = np.log1p(data[target].clip(lower=0))
+    logger.info("Transformação log1p aplicada ao alvo.")
+
+    return data
+
+
+def top_models_of(data: pd.DataFrame) -> list:
+    """Retorna os modelos mais frequentes, usados para reduzir a cardinalidade de 'model'."""
+    if 'model' not in data.columns:
+        return []
+    # Contagem sobre object: em colunas categóricas o desempate seguiria a ordem das categorias
+    return data['model'].astype(object).value_counts().nlargest(TOP_MODELS).index.tolist()
+
+
+@traced("preprocess.clean_features")
+def clean_features(data: pd.DataFrame, reference_year: int, top_models: list) -> pd.DataFrame:
+    """
+    Limpa as features com operações vetorizadas, usando ano de referência e top models fixos.
+    Com `top_models=None` a coluna 'model' é mantida sem redução de cardinalidade.
+    """
     # Remover colunas pouco informativas ou muito específicas
-    drop_cols = ['Unnamed: 0', 'name', 'ref']
-    data = data.drop(columns=[col for col in drop_cols if col in data.columns], errors='ignore')
+    data = data.drop(columns=[col for col in DROP_COLUMNS if col in data.columns], errors='ignore')
 
     # Criar novas features
     if 'yop' in data.columns:
         # Tenta extrair o ano (os 4 primeiros dígitos)
-        data['yop'] = data['yop'].astype(str).str.extract(r'(\d{4})')  # pega apenas o ano
-        data['yop'] = pd.to_numeric(data['yop'], errors='coerce')  # converte para numérico
-
-        current_year = pd.Timestamp.now().year
-        data['watch_age'] = current_year - data['yop']
+        data['yop'] = _extract_year(data['yop'])  # pega apenas o ano, já numérico
+        data['watch_age'] = reference_year - data['yop']
         logger.info("Coluna 'yop' limpa e feature 'watch_age' criada.")
 
 
     if 'casem' in data.columns and 'bracem' in data.columns:
-        data['has_gold'] = data[['casem', 'bracem']].apply(lambda x: int('gold' in ' '.join(map(str, x)).lower()), axis=1)
+        has_gold = _contains_gold(data['casem']) | _contains_gold(data['bracem'])
+        data['has_gold'] = has_gold.astype('int8')
         logger.info("Feature binária 'has_gold' criada com base em materiais.")
 
     if 'size' in data.columns:
-        data['size'] = data['size'].apply(lambda x: str(x).replace(' mm', '') if isinstance(x, str) else x)
-        data['size'] = pd.to_numeric(data['size'], errors='coerce')
+        data['size'] = _parse_size(data['size'])
         logger.info("Coluna 'size' convertida para numérico.")
 
     # Reduzir cardinalidade de 'model' se necessário
-    if 'model' in data.columns:
-        top_models = data['model'].value_counts().nlargest(30).index
-        data['model'] = data['model'].apply(lambda x: x if x in top_models else 'Other')
-        logger.info("Cardinalidade da coluna 'model' reduzida (top 30).")
+    if 'model' in data.columns and top_models is not None:
+        data['model'] = _collapse_rare(data['model'], top_models)
+        logger.info(f"Cardinalidade da coluna 'model' reduzida (top {TOP_MODELS}).")
 
-    # Aplicar log1p ao target (preço)
-    data[target] = data[target].apply(lambda x: np.log1p(x) if x > 0 else 0)
-    logger.info("Transformação log1p aplicada ao alvo.")
+    return data
 
-    # Separar X e y
-    logger.info(f"Shape após limpeza inicial: {data.shape}")
 
-    # Separar X e y
-    X = data.drop(columns=[target])
-    y = data[target]
-    
-    # Features
-    numeric_features = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
-    categorical_features = X.select_dtypes(include=['object', 'category']).columns.tolist()
-    
-    logger.info(f"Numéricas: {numeric_features}")
-    logger.info(f"Categóricas: {categorical_features}")
-    logger.info(f"Nº de amostras: {len(X)}")
-    
-    # Evitar erro se tiver poucas amostras
-    if len(X) < 5:
-        logger.warning("Número muito pequeno de amostras para modelagem!")
-    
-    # Pipelines
+def clean_data(data: pd.DataFrame, target: str) -> pd.DataFrame:
+    """Limpa o dataset bruto com operações vetorizadas por coluna."""
+    data = clean_target(data, target)
+    return clean_features(data, pd.Timestamp.now().year, top_models_of(data))
+
+
+def build_column_transformer(numeric_features: list, categorical_features: list) -> ColumnTransformer:
     numeric_pipeline = Pipeline(steps=[
         ('imputer', SimpleImputer(strategy='median')),
         ('scaler', RobustScaler())
@@ -84,26 +166,146 @@ def preprocess_data(data: pd.DataFrame, target: str):
         ('target_encoder', TargetEncoder(smoothing=0.3))
     ])
     
-    preprocessor = ColumnTransformer(transformers=[
+    return ColumnTransformer(transformers=[
         ('num', numeric_pipeline, numeric_features),
         ('cat', categorical_pipeline, categorical_features)
     ])
+
+
+class WatchPreprocessor:
+    """
+    Pré-processador ajustado uma única vez e reutilizável.
+
+    Guarda a lista de top models, o ano de referência usado em 'watch_age' e o
+    ColumnTransformer ajustado, para que novas listagens sejam transformadas sem retreino.
+    """
+
+    def __init__(self, target: str = 'price'):
+        self.target = target
+        self.reference_year = None
+        self.top_models = None
+        self.feature_columns = None
+        self.numeric_features = None
+        self.categorical_features = None
+        self.column_transformer = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.column_transformer is not None
+
+    @property
+    def output_columns(self) -> list:
+        return self.numeric_features + self.categorical_features
+
+    def fit_transform(self, data: pd.DataFrame):
+        """Ajusta o pré-processador em dados rotulados e retorna (X, y) transformados."""
+        data = clean_target(data, self.target)
+        self.reference_year = pd.Timestamp.now().year
+        self.top_models = top_models_of(data)
+        data = clean_features(data, self.reference_year, self.top_models)
+
+        # Separar X e y
+        logger.info(f"Shape após limpeza inicial: {data.shape}")
+        X = data.drop(columns=[self.target])
+        y = data[self.target]
+
+        # Features
+        self.feature_columns = X.columns.tolist()
+        self.numeric_features = X.select_dtypes(include=[np.number]).columns.tolist()
+        self.categorical_features = X.select_dtypes(include=['object', 'category']).columns.tolist()
+
+        logger.info(f"Numéricas: {self.numeric_features}")
+        logger.info(f"Categóricas: {self.categorical_features}")
+        logger.info(f"Nº de amostras: {len(X)}")
+
+        # Evitar erro se tiver poucas amostras
+        if len(X) < 5:
+            logger.warning("Número muito pequeno de amostras para modelagem!")
+
+        self.column_transformer = build_column_transformer(self.numeric_features, self.categorical_features)
+
+        logger.info("Aplicando pré-processador...")
+        with span("preprocess.encode", inputs=X, fit=True) as s:
+            X_preprocessed = self.column_transformer.fit_transform(X, y)
+            s.output_shapes = shape_of(X_preprocessed)
+        return self._to_frame(X_preprocessed), y
+
+    def fit(self, data: pd.DataFrame) -> "WatchPreprocessor":
+        self.fit_transform(data)
+        return self
+
+    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Transforma listagens (com ou sem a coluna alvo) sem reajustar nada."""
+        if not self.is_fitted:
+            raise ValueError("WatchPreprocessor precisa ser ajustado antes de transformar dados.")
+
+        data = clean_features(data.copy(), self.reference_year, self.top_models)
+        X = data.reindex(columns=self.feature_columns)
+        with span("preprocess.encode", inputs=X, fit=False) as s:
+            X_preprocessed = self.column_transformer.transform(X)
+            s.output_shapes = shape_of(X_preprocessed)
+        return self._to_frame(X_preprocessed)
+
+    def _to_frame(self, X_preprocessed) -> pd.DataFrame:
+        """Saída do ColumnTransformer como DataFrame float32 (um único bloco, sem cópia extra)."""
+        return pd.DataFrame(np.asarray(X_preprocessed, dtype=FEATURE_DTYPE), columns=self.output_columns, copy=False)
+
+    def transform_labelled(self, data: pd.DataFrame):
+        """Transforma dados rotulados, retornando (X, y) com as mesmas regras de limpeza do alvo."""
+        data = clean_target(data, self.target)
+        return self.transform(data), data[self.target]
+
+    def save(self, path: str = DEFAULT_PREPROCESSOR_PATH) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump(self, path)
+        logger.info(f"Pré-processador salvo em {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PREPROCESSOR_PATH) -> "WatchPreprocessor":
+        preprocessor = joblib.load(path)
+        if not isinstance(preprocessor, cls):
+            raise TypeError(f"Arquivo {path} não contém um WatchPreprocessor.")
+        logger.info(f"Pré-processador carregado de {path}")
+        return preprocessor
+
+
+@traced("preprocess_data")
+def preprocess_data(data: pd.DataFrame, target: str, preprocessor: WatchPreprocessor = None):
+    """
+    Pré-processa os dados rotulados.
+    Sem `preprocessor`, ajusta um novo WatchPreprocessor; com um ainda não ajustado (ex.: um
+    StreamingWatchPreprocessor, atualizável depois), ajusta esse; com um já ajustado, apenas transforma.
+    """
+    logger.info("Iniciando o pré-processamento dos dados.")
+
+    if preprocessor is None or not preprocessor.is_fitted:
+        preprocessor = preprocessor or WatchPreprocessor(target)
+        X_preprocessed_df, y = preprocessor.fit_transform(data)
+    else:
+        logger.info("Reutilizando pré-processador já ajustado (somente transform).")
+        X_preprocessed_df, y = preprocessor.transform_labelled(data)
     
-    # Aplicar preprocessor
-    logger.info("Aplicando pré-processador...")
-    X_preprocessed = preprocessor.fit_transform(X, y)
-    X_preprocessed_df = pd.DataFrame(X_preprocessed, columns=numeric_features + categorical_features)
-    
-    # Verificar variância das colunas
-    for col in X_preprocessed_df.columns:
-        nunique = X_preprocessed_df[col].nunique()
-        logger.info(f"Coluna {col} - valores únicos: {nunique}")
+    # Variância das colunas: diagnóstico caro, só calculado com o logger em DEBUG
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Valores únicos por coluna", extra={'nunique': X_preprocessed_df.nunique().to_dict()})
     
     # Validar se ainda tem dados
     if X_preprocessed_df.empty or y.empty:
         logger.error("Dataset vazio após pré-processamento.")
         raise ValueError("Dataset vazio após pré-processamento.")
     
-    logger.info(f"Shape final de X: {X_preprocessed_df.shape}")
+    logger.info(f"Shape final de X: {X_preprocessed_df.shape}",
+                extra={'rows': X_preprocessed_df.shape[0], 'columns': X_preprocessed_df.shape[1]})
     logger.info(f"Pré-processamento finalizado com sucesso.")
-    return X_preprocessed_df, y, preprocessor
\ No newline at end of file
+    return X_preprocessed_df, y, preprocessor
+
+
+def build_training_frame(X: pd.DataFrame, y: pd.Series) -> pd.DataFrame:
+    """
+    Features e alvo num único DataFrame, para quem exige um frame só (PyCaret).
+    A cópia rasa reaproveita o bloco float32 de X: só a coluna do alvo é alocada.
+    """
+    frame = X.copy(deep=False)
+    frame[y.name] = y.to_numpy()
+    return frame
@@ -1,11 +1,14 @@
 import pandas as pd
 from models.logs.logger import logger
+from models.logs.tracing import traced
+from models.service.dataset_cache import read_dataset
 
-def load_data(file_path: str) -> pd.DataFrame:
-    """Carrega os dados de um arquivo CSV."""
+@traced("load_data")
+def load_data(file_path: str, columns: list = None, exclude: list = None) -> pd.DataFrame:
+    """Carrega os dados de um arquivo CSV (via cache colunar), opcionalmente só as colunas pedidas."""
     logger.info(f"Iniciando o carregamento dos dados do arquivo: {file_path}")
     
-    data = pd.read_csv(file_path)
+    data = read_dataset(file_path, columns, exclude)
     logger.info(f"Dados carregados com sucesso do arquivo: {file_path}")
     
     # Amostrando 10% dos dados
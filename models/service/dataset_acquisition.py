@@ -0,0 +1,148 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+from models.logs.logger import logger
+from models.service.dataset_cache import cache_from_stream, file_fingerprint
+
+MANIFEST_FILE = "manifest.json"
+
+
+class DatasetUnavailableError(RuntimeError):
+    """Não há cópia local utilizável e o dataset não pôde ser baixado."""
+
+
+def manifest_path_for(download_dir: str) -> str:
+    return os.path.join(download_dir, MANIFEST_FILE)
+
+
+def load_manifest(download_dir: str) -> dict:
+    path = manifest_path_for(download_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(download_dir: str, manifest: dict):
+    path = manifest_path_for(download_dir)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(f"{path}.tmp", path)
+
+
+def local_copy_is_valid(entry: dict, download_dir: str) -> bool:
+    """Todos os arquivos do manifesto existem com o mesmo tamanho e checksum."""
+    if not entry:
+        return False
+    for name, expected in entry["files"].items():
+        path = os.path.join(download_dir, name)
+        if not os.path.exists(path) or os.path.getsize(path) != expected["size"]:
+            return False
+        if file_fingerprint(path) != expected["sha256"]:
+            return False
+    return True
+
+
+def _member_target(download_dir: str, name: str) -> str:
+    """Destino de um membro do zip; caminhos que escapariam de download_dir são recusados."""
+    target = os.path.normpath(os.path.join(download_dir, name))
+    if os.path.isabs(name) or os.path.commonpath([os.path.abspath(target), os.path.abspath(download_dir)]) \
+            != os.path.abspath(download_dir):
+        raise ValueError(f"Membro do arquivo fora do diretório de destino: {name}")
+    return target
+
+
+def extract_archive(archive: str, download_dir: str) -> dict:
+    """
+    Extrai o zip membro a membro, em streaming. CSVs vão direto para o cache colunar na mesma
+    passada (cache_from_stream); os demais arquivos são copiados calculando o checksum.
+    Retorna {nome: {"size", "sha256"}}.
+    """
+    files = {}
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            target = _member_target(download_dir, info.filename)
+            with zf.open(info) as stream:
+                if info.filename.lower().endswith(".csv"):
+                    sha256 = cache_from_stream(stream, target)
+                else:
+                    sha256 = _copy_stream(stream, target)
+            files[info.filename] = {"size": os.path.getsize(target), "sha256": sha256}
+            logger.info(f"Extraído {info.filename} ({files[info.filename]['size']} bytes)")
+    return files
+
+
+def _copy_stream(stream, target: str) -> str:
+    digest = hashlib.sha256()
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    with open(f"{target}.partial", "wb") as out:
+        for block in iter(lambda: stream.read(1 << 20), b""):
+            digest.update(block)
+            out.write(block)
+    os.replace(f"{target}.partial", target)
+    return digest.hexdigest()
+
+
+def acquire_dataset(source_factory, dataset_name: str, download_dir: str, offline: bool = False,
+                    force: bool = False) -> dict:
+    """
+    Garante uma cópia local do dataset, baixando-o só quando a versão remota mudou.
+
+    Parâmetros:
+      - source_factory: função sem argumentos que retorna um DatasetSourcePort (a autenticação no
+        Kaggle só acontece se for preciso consultar a versão remota).
+      - offline: não acessa a rede; usa a cópia local registrada no manifesto.
+      - force: baixa de novo mesmo com a cópia local em dia.
+
+    O manifesto (download_dir/manifest.json) guarda, por dataset, a versão remota (arquivos, tamanhos,
+    datas) e o tamanho e o SHA-256 de cada arquivo extraído. Sem rede, a cópia local válida é usada.
+    Retorna a entrada do manifesto.
+    """
+    manifest = load_manifest(download_dir)
+    entry = manifest.get(dataset_name)
+    local_ok = local_copy_is_valid(entry, download_dir)
+
+    if offline:
+        if local_ok:
+            logger.info(f"Modo offline: usando a cópia local de {dataset_name} em {download_dir}.")
+            return entry
+        raise DatasetUnavailableError(
+            f"Modo offline sem cópia local válida de {dataset_name} em {download_dir}. "
+            "Rode uma vez com acesso ao Kaggle para baixar e registrar o dataset."
+        )
+
+    try:
+        source = source_factory()
+        # Ida e volta por JSON: a comparação com o manifesto gravado não depende dos tipos da API
+        remote = json.loads(json.dumps(source.remote_version(dataset_name), default=str))
+    except Exception as e:
+        if local_ok:
+            logger.warning(f"Versão remota de {dataset_name} indisponível ({e}); usando a cópia local.")
+            return entry
+        raise DatasetUnavailableError(f"Não foi possível consultar {dataset_name} e não há cópia local válida: {e}") from e
+
+    if local_ok and not force and entry["remote"] == remote:
+        logger.info(f"{dataset_name} inalterado desde {entry['fetched_at']}; download pulado.")
+        return entry
+
+    logger.info(f"Baixando {dataset_name} ({'forçado' if force else 'versão remota nova ou cópia local ausente'}).")
+    os.makedirs(download_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".download-", dir=download_dir)
+    try:
+        archive = source.download_archive(dataset_name, staging)
+        files = extract_archive(archive, download_dir)
+        archive_size = os.path.getsize(archive)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    entry = {"remote": remote, "files": files, "archive_size": archive_size,
+             "fetched_at": datetime.now(timezone.utc).isoformat()}
+    manifest[dataset_name] = entry
+    _save_manifest(download_dir, manifest)
+    return entry
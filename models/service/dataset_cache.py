@@ -0,0 +1,245 @@
+import io
+import os
+import json
+import hashlib
+import threading
+import pandas as pd
+from models.logs.logger import logger
+
+CACHE_DIR = "models/dataset/.cache"
+
+# Colunas de baixa cardinalidade do Watches.csv
+CATEGORICAL_COLUMNS = ['brand', 'model', 'casem', 'bracem', 'mvmt', 'cond', 'sex']
+# Colunas de texto livre que o pré-processamento ainda limpa. Também ficam como categóricas:
+# os valores se repetem muito e o dicionário do Arrow evita materializar milhões de objetos str.
+TEXT_COLUMNS = ['name', 'price', 'ref', 'yop', 'size', 'condition']
+
+DATASET_DTYPES = {col: 'category' for col in CATEGORICAL_COLUMNS + TEXT_COLUMNS}
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    COLUMNAR_AVAILABLE = True
+except ImportError:
+    COLUMNAR_AVAILABLE = False
+
+
+# Serializa a releitura + gravação do manifesto entre as threads (estágios) do processo
+_MANIFEST_LOCK = threading.Lock()
+
+
+def _load_fingerprints() -> dict:
+    manifest_path = os.path.join(CACHE_DIR, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _record_fingerprint(path: str, sha256: str):
+    """
+    Registra o hash de um arquivo no manifesto, junto com o tamanho/mtime atuais.
+    Estágios paralelos e processos de EDA leem o manifesto enquanto ele é gravado: a gravação vai
+    para um arquivo temporário próprio e entra com os.replace (nunca se lê um JSON pela metade).
+    O manifesto é relido logo antes da troca, sob um lock entre as threads do processo, para não
+    apagar entradas gravadas por outro estágio.
+    """
+    stat = os.stat(path)
+    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    manifest_path = os.path.join(CACHE_DIR, "manifest.json")
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with _MANIFEST_LOCK:
+        manifest = _load_fingerprints()
+        manifest[os.path.abspath(path)] = entry
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, manifest_path)
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    Retorna o SHA-256 do arquivo.
+    O hash fica registrado num manifesto ao lado do cache e só é recalculado quando tamanho/mtime mudam.
+    """
+    stat = os.stat(path)
+    entry = _load_fingerprints().get(os.path.abspath(path))
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    _record_fingerprint(path, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def _dtypes_for(columns) -> dict:
+    return {col: dtype for col, dtype in DATASET_DTYPES.items() if col in columns}
+
+
+def downcast_integers(data: pd.DataFrame) -> pd.DataFrame:
+    """Reduz as colunas inteiras ao menor tipo que comporta os valores (ex.: o índice 'Unnamed: 0' vira int32)."""
+    for col in data.select_dtypes(include=['integer']).columns:
+        data[col] = pd.to_numeric(data[col], downcast='integer')
+    return data
+
+
+def _read_csv_typed(path: str, columns: list = None) -> pd.DataFrame:
+    header = pd.read_csv(path, nrows=0).columns
+    return downcast_integers(pd.read_csv(path, usecols=columns, dtype=_dtypes_for(header)))
+
+
+def cache_path_for(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{file_fingerprint(path)[:16]}.feather")
+
+
+def _drop_stale_caches(path: str, keep: str):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for name in os.listdir(CACHE_DIR):
+        candidate = os.path.join(CACHE_DIR, name)
+        if name.startswith(f"{stem}-") and name.endswith(".feather") and candidate != keep:
+            os.remove(candidate)
+            logger.info(f"Cache antigo removido: {candidate}")
+
+
+def build_cache(path: str) -> str:
+    """Converte o CSV para Feather tipado (uma única vez por conteúdo do arquivo)."""
+    target = cache_path_for(path)
+    if os.path.exists(target):
+        return target
+
+    logger.info(f"Convertendo {path} para cache colunar em {target}")
+    _write_cache(path, _read_csv_typed(path), target)
+    return target
+
+
+def _write_cache(path: str, data: pd.DataFrame, target: str):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{target}.tmp"
+    # Sem compressão: a leitura vira praticamente uma cópia de memória
+    data.to_feather(tmp_path, compression='uncompressed')
+    os.replace(tmp_path, target)
+    _drop_stale_caches(path, target)
+
+
+class _HashingTee(io.RawIOBase):
+    """Leitura de um stream que, de passagem, grava os bytes em `sink` e atualiza o hash."""
+
+    def __init__(self, source, sink, digest):
+        self.source, self.sink, self.digest = source, sink, digest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self.source.read(len(buffer))
+        self.sink.write(chunk)
+        self.digest.update(chunk)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def cache_from_stream(stream, path: str) -> str:
+    """
+    Grava o CSV lido de `stream` (ex.: um membro de um zip) em `path` e, na mesma passada, monta o
+    cache colunar e calcula o SHA-256, sem reler o arquivo do disco. Retorna o SHA-256.
+    """
+    digest = hashlib.sha256()
+    partial = f"{path}.partial"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(partial, 'wb') as sink:
+        reader = io.BufferedReader(_HashingTee(stream, sink, digest), buffer_size=1 << 20)
+        data = downcast_integers(pd.read_csv(reader, dtype=DATASET_DTYPES))
+        while reader.read(1 << 20):  # o que o parser não consumiu (ex.: linhas vazias no fim)
+            pass
+    os.replace(partial, path)
+    _record_fingerprint(path, digest.hexdigest())
+
+    if COLUMNAR_AVAILABLE:
+        target = cache_path_for(path)
+        logger.info(f"Cache colunar de {path} montado durante a extração: {target}")
+        _write_cache(path, data, target)
+    return digest.hexdigest()
+
+
+def read_dataset(path: str, columns: list = None, exclude: list = None) -> pd.DataFrame:
+    """
+    Carrega o dataset através do cache colunar.
+
+    Parâmetros:
+      - path: CSV de origem (o cache é identificado pelo hash do arquivo).
+      - columns: projeção opcional de colunas; apenas elas são lidas do disco.
+      - exclude: colunas que não devem ser lidas (ex.: texto livre descartado no pré-processamento).
+    """
+    if not COLUMNAR_AVAILABLE:
+        logger.warning("pyarrow não instalado; lendo o CSV diretamente (sem cache colunar).")
+        if exclude:
+            columns = [col for col in (columns or pd.read_csv(path, nrows=0).columns) if col not in exclude]
+        return _read_csv_typed(path, columns)
+
+    cached = build_cache(path)
+    if exclude:
+        with pa_ipc.open_file(cached) as reader:
+            available = reader.schema.names
+        columns = [col for col in (columns or available) if col not in exclude]
+    data = pd.read_feather(cached, columns=columns)
+    logger.info(f"Dataset carregado do cache colunar: {cached} {data.shape}")
+    return data
+
+
+def read_window(path: str, start: int, rows: int, columns: list = None) -> pd.DataFrame:
+    """
+    Lê apenas as linhas [start, start + rows) do dataset, indexadas pela posição no arquivo.
+    O cache colunar é mapeado em memória (sem compressão): só a janela é convertida para pandas.
+    """
+    if not COLUMNAR_AVAILABLE:
+        window = pd.read_csv(path, usecols=columns, dtype=_dtypes_for(pd.read_csv(path, nrows=0).columns),
+                             skiprows=range(1, start + 1), nrows=rows)
+        return downcast_integers(window).set_axis(pd.RangeIndex(start, start + len(window)))
+
+    with pa.memory_map(build_cache(path)) as source:
+        table = pa_ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        window = table.slice(start, rows).to_pandas()
+    return window.set_axis(pd.RangeIndex(start, start + len(window)))
+
+
+def read_rows(path: str, positions, columns: list = None) -> pd.DataFrame:
+    """Lê linhas avulsas do dataset pelas posições, indexadas por elas (take no cache mapeado em memória)."""
+    positions = [int(position) for position in positions]
+    if not COLUMNAR_AVAILABLE:
+        data = pd.read_csv(path, usecols=columns, dtype=_dtypes_for(pd.read_csv(path, nrows=0).columns))
+        return downcast_integers(data.iloc[positions]).set_axis(pd.Index(positions))
+
+    with pa.memory_map(build_cache(path)) as source:
+        table = pa_ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        rows = table.take(pa.array(positions, type=pa.int64())).to_pandas()
+    return rows.set_axis(pd.Index(positions))
+
+
+def dataset_rows(path: str) -> int:
+    """Número de linhas do dataset, lido dos metadados do cache colunar."""
+    if not COLUMNAR_AVAILABLE:
+        with open(path, 'rb') as f:
+            return max(sum(1 for _ in f) - 1, 0)
+    with pa.memory_map(build_cache(path)) as source:
+        reader = pa_ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def iter_dataset_chunks(path: str, chunk_size: int, columns: list = None, exclude: list = None):
+    """
+    Lê o CSV em blocos de `chunk_size` linhas, com os mesmos tipos do cache colunar.
+    A memória usada depende do tamanho do bloco, não do arquivo.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [col for col in (columns or header) if col not in (exclude or [])]
+    with pd.read_csv(path, usecols=columns, dtype=_dtypes_for(columns), chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield downcast_integers(chunk)
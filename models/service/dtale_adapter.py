@@ -5,7 +5,7 @@ import dtale
 import pandas as pd
 
 class DtaleAdapter(DtalePort):
-    def open_in_dtale(self, df: pd.DataFrame) -> pd.DataFrame:
+    def open_in_dtale(self, df: pd.DataFrame, on_save=None) -> pd.DataFrame:
         d = dtale.show(
             df,
             subprocess=False,
@@ -16,8 +16,21 @@ class DtaleAdapter(DtalePort):
 
         print(f"Dtale está rodando em: {d._main_url}")
         print("Abra essa URL no navegador para editar os dados.")
-        input("Pressione Enter quando terminar de editar no D-Tale...")
+        if on_save is None:
+            input("Pressione Enter quando terminar de editar no D-Tale...")
+            return self._current_data(d, df)
 
+        # Cada Enter grava as edições feitas até ali; 'q' grava e encerra
+        while True:
+            answer = input("Enter grava as edições feitas até agora; 'q' grava e encerra: ").strip().lower()
+            edited_df = self._current_data(d, df)
+            on_save(edited_df)
+            if answer == "q":
+                d.kill()
+                return edited_df
+
+    @staticmethod
+    def _current_data(d, df: pd.DataFrame) -> pd.DataFrame:
         try:
             # Tenta pegar os dados modificados
             edited_df = d.data
@@ -1,49 +1,172 @@
-import pandas as pd
-import sweetviz as sv
-import dtale
-from autoviz.AutoViz_Class import AutoViz_Class
-from ydata_profiling import ProfileReport
+import os
+import multiprocessing
+import time
+import shutil
 import logging
-from models.logs.logger import logger
+from concurrent.futures import ProcessPoolExecutor
+from models.logs.tracing import span
+from models.service.dataset_cache import read_dataset, build_cache, file_fingerprint, COLUMNAR_AVAILABLE
 
 
 logger = logging.getLogger("EDA_Project")
 
+EDA_DIR = "views/eda"
+# full: dataset inteiro com correlações/interações; sampled: o mesmo numa amostra de `row_budget`
+# linhas; minimal: perfil mínimo (sem correlações nem interações) na amostra.
+EDA_MODES = ("full", "sampled", "minimal")
+DEFAULT_MODE = "sampled"
+DEFAULT_ROW_BUDGET = 50_000
+DEFAULT_TOOLS = ("ydata", "sweetviz", "autoviz")
+
+
+def load_report_data(dataset_path: str, mode: str = DEFAULT_MODE, row_budget: int = DEFAULT_ROW_BUDGET):
+    """Carrega o dataset para um relatório, amostrando `row_budget` linhas fora do modo full."""
+    data = read_dataset(dataset_path)
+    if mode != "full" and len(data) > row_budget:
+        data = data.sample(n=row_budget, random_state=123)
+        logger.info(f"EDA no modo {mode}: amostra de {row_budget} linhas.")
+    return data
+
+
+def _ydata_job(data, output: str, mode: str):
+    from ydata_profiling import ProfileReport
+    if mode == "minimal":
+        profile = ProfileReport(data, minimal=True)
+    else:
+        profile = ProfileReport(data, explorative=True)
+    profile.to_file(output)
+
+
+def _sweetviz_job(data, output: str, mode: str):
+    import sweetviz as sv
+    report = sv.analyze(data, pairwise_analysis="off" if mode == "minimal" else "auto")
+    report.show_html(output, open_browser=False)
+
+
+def _autoviz_job(data, output: str, mode: str):
+    from autoviz.AutoViz_Class import AutoViz_Class
+    # AutoViz grava um gráfico por arquivo: o "relatório" é um diretório
+    os.makedirs(output, exist_ok=True)
+    AutoViz_Class().AutoViz(filename="", dfte=data, verbose=2, chart_format="svg",
+                            max_rows_analyzed=len(data), save_plot_dir=output)
+
+
+REPORT_JOBS = {
+    "ydata": (_ydata_job, ".html"),
+    "sweetviz": (_sweetviz_job, ".html"),
+    "autoviz": (_autoviz_job, ""),
+}
+
+
+def report_path(tool: str, fingerprint: str, mode: str, row_budget: int, output_dir: str = EDA_DIR) -> str:
+    """Caminho do relatório renderizado: identificado pelo fingerprint do dataset e pela configuração."""
+    budget = "all" if mode == "full" else str(row_budget)
+    return os.path.join(output_dir, f"{tool}-{fingerprint[:16]}-{mode}-{budget}{REPORT_JOBS[tool][1]}")
+
+
+def run_report_job(tool: str, dataset_path: str, output: str, mode: str, row_budget: int) -> dict:
+    """Executa um relatório (em um processo do pool). A saída só aparece no caminho final quando completa."""
+    start = time.perf_counter()
+    job, _ = REPORT_JOBS[tool]
+    partial = f"{output}.partial{REPORT_JOBS[tool][1]}"
+    try:
+        with span(f"eda.{tool}", mode=mode, row_budget=row_budget) as s:
+            data = load_report_data(dataset_path, mode, row_budget)
+            s.input_shapes = list(data.shape)
+            job(data, partial, mode)
+        os.replace(partial, output)
+    except Exception as e:
+        logger.error(f"Erro ao gerar o relatório {tool}: {e}")
+        if os.path.isdir(partial):
+            shutil.rmtree(partial, ignore_errors=True)
+        elif os.path.exists(partial):
+            os.remove(partial)
+        return {'tool': tool, 'path': None, 'cached': False, 'seconds': time.perf_counter() - start, 'error': str(e)}
+    elapsed = time.perf_counter() - start
+    logger.info(f"Relatório {tool} gerado em {elapsed:.1f}s: {output}")
+    return {'tool': tool, 'path': output, 'cached': False, 'seconds': elapsed, 'error': None}
+
+
 class EDAReport:
-    def __init__(self, dataset_path: str):
+    """
+    Relatórios de EDA como jobs independentes.
+
+    Cada relatório é gerado em um processo separado e salvo em `output_dir` sob o fingerprint do
+    dataset; se o dataset não mudou, o relatório existente é reaproveitado sem recalcular nada.
+    """
+
+    def __init__(self, dataset_path: str, mode: str = DEFAULT_MODE, row_budget: int = DEFAULT_ROW_BUDGET,
+                 output_dir: str = EDA_DIR):
+        if mode not in EDA_MODES:
+            raise ValueError(f"Modo de EDA inválido: {mode}. Opções: {EDA_MODES}")
+        self.dataset_path = dataset_path
+        self.mode = mode
+        self.row_budget = row_budget
+        self.output_dir = output_dir
+        self._dataset = None
         try:
-            self.dataset = pd.read_csv(dataset_path)
-            logger.info(f"Dataset carregado com sucesso: {dataset_path}")
+            self.fingerprint = file_fingerprint(dataset_path)
+            logger.info(f"Dataset para EDA: {dataset_path} ({self.fingerprint[:16]})")
         except Exception as e:
             logger.error(f"Erro ao carregar o dataset: {e}")
-            self.dataset = None
+            self.fingerprint = None
+
+    @property
+    def dataset(self):
+        if self._dataset is None and self.fingerprint is not None:
+            self._dataset = read_dataset(self.dataset_path)
+        return self._dataset
+
+    def generate_all(self, tools: tuple = DEFAULT_TOOLS, max_workers: int = None) -> list:
+        """Gera os relatórios pedidos em paralelo (um processo por job), pulando os já renderizados."""
+        if self.fingerprint is None:
+            logger.error("Dataset não carregado. Relatórios de EDA não podem ser gerados.")
+            return []
+        unknown = [tool for tool in tools if tool not in REPORT_JOBS]
+        if unknown:
+            raise ValueError(f"Relatórios desconhecidos: {unknown}. Opções: {list(REPORT_JOBS)}")
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        results, pending = [], {}
+        for tool in tools:
+            output = report_path(tool, self.fingerprint, self.mode, self.row_budget, self.output_dir)
+            if os.path.exists(output):
+                logger.info(f"Relatório {tool} inalterado; reaproveitando {output}")
+                results.append({'tool': tool, 'path': output, 'cached': True, 'seconds': 0.0, 'error': None})
+            else:
+                pending[tool] = output
+
+        if pending:
+            if COLUMNAR_AVAILABLE:
+                build_cache(self.dataset_path)  # uma conversão só, antes de os processos lerem o cache
+            workers = max_workers or min(len(pending), os.cpu_count() or 1)
+            # spawn: a pipeline chama daqui de uma thread, com outras threads (treino, logging) ativas,
+            # e um fork nesse estado pode herdar locks travados (BLAS, OpenMP, logging)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [pool.submit(run_report_job, tool, self.dataset_path, output, self.mode, self.row_budget)
+                           for tool, output in pending.items()]
+                results.extend(future.result() for future in futures)
+        return results
+
+    def _generate(self, tool: str):
+        if self.fingerprint is None:
+            logger.error(f"Dataset não carregado. Relatório {tool} não pode ser gerado.")
+            return None
+        return self.generate_all((tool,), max_workers=1)[0]
 
     def generate_autoviz(self):
-        if self.dataset is not None:
-            av = AutoViz_Class()
-            av.AutoViz(self.dataset)
-        else:
-            logger.error("Dataset não carregado. Relatório AutoViz não pode ser gerado.")
+        return self._generate("autoviz")
 
     def generate_sweetviz(self):
-        if self.dataset is not None:
-            report = sv.analyze(self.dataset)
-            report.show_html("sweetviz_report.html")
-        else:
-            logger.error("Dataset não carregado. Relatório Sweetviz não pode ser gerado.")
+        return self._generate("sweetviz")
+
+    def generate_ydata(self):
+        return self._generate("ydata")
 
     def generate_dtale(self):
+        """D-Tale é interativo (sobe um servidor): fica fora dos jobs em lote."""
         if self.dataset is not None:
+            import dtale
             dtale.show(self.dataset)
         else:
             logger.error("Dataset não carregado. Relatório D-Tale não pode ser gerado.")
-
-    def generate_ydata(self):
-        if self.dataset is not None:
-            profile = ProfileReport(self.dataset, explorative=True)
-            profile.to_file("views/ydata_profiling_report.html")
-            logger.info("Relatório ydata-profiling gerado com sucesso.")
-        else:
-            logger.error("Dataset não carregado. Relatório ydata-profiling não pode ser gerado.")
-
-
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from models.logs.logger import logger
+from models.service.dataset_cache import file_fingerprint
+
+EDITS_DIR = "models/dataset/edits"
+
+
+def edit_log_path(dataset_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(dataset_path))[0]
+    return os.path.join(EDITS_DIR, f"{stem}.jsonl")
+
+
+def _json_value(value):
+    """Valores do pandas/numpy em tipos JSON (ausentes viram null)."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _same(before: pd.Series, after: pd.Series) -> np.ndarray:
+    """Igualdade célula a célula em que ausente == ausente (categóricas comparadas como valores)."""
+    before, after = before.astype(object), after.astype(object)
+    return ((before == after) | (before.isna() & after.isna())).to_numpy()
+
+
+def diff_frames(before: pd.DataFrame, after: pd.DataFrame, next_row: int) -> list:
+    """
+    Patches que levam `before` a `after`; as linhas são identificadas pelo rótulo do índice
+    (a posição da linha no dataset).
+
+      - {"op": "set", "row", "column", "old", "new"} para cada célula alterada;
+      - {"op": "delete", "row"} para linhas removidas;
+      - {"op": "insert", "row", "values"} para linhas novas, numeradas a partir de `next_row`.
+    """
+    patches = []
+    common = before.index.intersection(after.index)
+    columns = [col for col in before.columns if col in after.columns]
+    ignored = sorted(set(before.columns).symmetric_difference(after.columns))
+    if ignored:
+        logger.warning(f"Colunas adicionadas/removidas não são registradas no log de edições: {ignored}")
+
+    old, new = before.loc[common, columns], after.loc[common, columns]
+    for col in columns:
+        changed = ~_same(old[col], new[col])
+        for row, old_value, new_value in zip(common[changed], old[col][changed], new[col][changed]):
+            patches.append({"op": "set", "row": int(row), "column": col,
+                            "old": _json_value(old_value), "new": _json_value(new_value)})
+
+    for row in before.index.difference(after.index):
+        patches.append({"op": "delete", "row": int(row)})
+    for offset, row in enumerate(after.index.difference(before.index)):
+        values = {col: _json_value(value) for col, value in after.loc[row, columns].items()}
+        patches.append({"op": "insert", "row": next_row + offset, "values": values})
+    return patches
+
+
+def _fold(patches: list):
+    """Reduz o log ao estado final: células alteradas, linhas removidas e linhas inseridas (a última escrita vale)."""
+    cells, deleted, inserted = {}, set(), {}
+    for patch in patches:
+        row = patch["row"]
+        if patch["op"] == "set":
+            if row in inserted:
+                inserted[row][patch["column"]] = patch["new"]
+            else:
+                cells.setdefault(patch["column"], {})[row] = patch["new"]
+        elif patch["op"] == "delete":
+            inserted.pop(row, None)
+            deleted.add(row)
+        elif patch["op"] == "insert":
+            deleted.discard(row)
+            inserted[row] = dict(patch["values"])
+    return cells, deleted, inserted
+
+
+def _with_categories(series: pd.Series, values) -> pd.Series:
+    """Acrescenta às categorias da coluna os valores editados que ainda não existem nela."""
+    missing = [v for v in pd.unique(pd.Series(values, dtype=object).dropna()) if v not in series.cat.categories]
+    return series.cat.add_categories(missing) if missing else series
+
+
+def _assign(series: pd.Series, rows: list, values: list) -> pd.Series:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = _with_categories(series, values)
+    elif pd.api.types.is_numeric_dtype(series.dtype):
+        values = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy()
+        if pd.api.types.is_integer_dtype(series.dtype) and np.isnan(values).any():
+            series = series.astype(float)
+    series = series.copy()
+    series.loc[rows] = values
+    return series
+
+
+def apply_patches(data: pd.DataFrame, patches: list, include_inserts: bool = True) -> pd.DataFrame:
+    """
+    Reaplica o log sobre `data` (o dataset inteiro ou uma janela dele). Patches de linhas fora de
+    `data` são ignorados; com `include_inserts=False` as linhas inseridas não são acrescentadas.
+    """
+    cells, deleted, inserted = _fold(patches)
+    data = data.copy(deep=False)
+    for col, changes in cells.items():
+        if col not in data.columns:
+            continue
+        rows = [row for row in changes if row in data.index]
+        if rows:
+            data[col] = _assign(data[col], rows, [changes[row] for row in rows])
+
+    data = data.drop(index=[row for row in deleted if row in data.index])
+    if include_inserts and inserted:
+        new_rows = pd.DataFrame.from_dict(inserted, orient='index').reindex(columns=data.columns)
+        for col in data.select_dtypes(include='category').columns:
+            data[col] = _with_categories(data[col], new_rows[col])
+        data = pd.concat([data, new_rows.astype(data.dtypes.to_dict(), errors='ignore')])
+    return data
+
+
+class EditLog:
+    """
+    Log de edições de um dataset, só de acréscimo: models/dataset/edits/<arquivo>.jsonl.
+
+    Cada linha é um patch (célula alterada, linha removida ou inserida) com a hora da edição e o
+    fingerprint do arquivo de origem. O CSV original nunca é reescrito; o dataset editado é obtido
+    reaplicando o log sobre o cache colunar (apply_patches).
+    """
+
+    def __init__(self, dataset_path: str, path: str = None):
+        self.dataset_path = dataset_path
+        self.path = path or edit_log_path(dataset_path)
+        self.source = file_fingerprint(dataset_path)[:16]
+
+    def read(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        patches = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    patch = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # linha truncada por uma escrita interrompida
+                if patch.get("source") != self.source:
+                    raise ValueError(f"O log {self.path} foi gravado para outra versão de {self.dataset_path}.")
+                patches.append(patch)
+        return patches
+
+    def next_row(self, n_rows: int) -> int:
+        """Primeiro número de linha livre para inserções (depois do dataset e das linhas já inseridas)."""
+        inserted = [patch["row"] for patch in self.read() if patch["op"] == "insert"]
+        return max([n_rows - 1] + inserted) + 1
+
+    def append(self, patches: list) -> int:
+        """Acrescenta os patches ao log numa única escrita com O_APPEND. Retorna quantos foram gravados."""
+        if not patches:
+            return 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        now = time.time()
+        lines = "".join(json.dumps({**patch, "at": now, "source": self.source}, default=str) + "\n"
+                        for patch in patches)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode("utf-8"))
+        finally:
+            os.close(fd)
+        logger.info(f"{len(patches)} edições registradas em {self.path}")
+        return len(patches)
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import joblib
+from sklearn.base import clone
+from models.logs.logger import logger
+
+CACHE_DIR = "models/cache"
+
+# Memoização dos passos de transformação (ex.: StandardScaler) dentro dos Pipelines candidatos:
+# o mesmo fold ajustado com hiperparâmetros diferentes do regressor reaproveita o transformador.
+PIPELINE_MEMORY = joblib.Memory(os.path.join(CACHE_DIR, "pipeline"), verbose=0)
+
+
+def data_fingerprint(X, y) -> str:
+    """Fingerprint da matriz de treino e do alvo."""
+    return joblib.hash((X, y))
+
+
+def _estimator_signature(pipeline, params: dict) -> tuple:
+    """Classe de cada passo e todos os hiperparâmetros efetivos (sem objetos de memória/cache)."""
+    estimator = clone(pipeline).set_params(**params)
+    steps = tuple(f"{type(step).__module__}.{type(step).__qualname__}" for _, step in estimator.steps)
+    values = {
+        key: value for key, value in estimator.get_params(deep=True).items()
+        if key not in ('memory', 'steps') and not hasattr(value, 'get_params')
+    }
+    return steps, sorted((key, repr(value)) for key, value in values.items())
+
+
+class EvaluationCache:
+    """
+    Cache persistente (SQLite) de scores de CV por fold.
+
+    A chave combina o fingerprint dos dados, a classe e os parâmetros do estimador,
+    o modo de avaliação (com ou sem parada antecipada) e os índices do fold.
+    """
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, "evaluations.sqlite")):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations "
+                "(key TEXT PRIMARY KEY, score REAL NOT NULL, n_trees INTEGER)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(data_fp: str, pipeline, params: dict, early_stopping: bool, train_idx, val_idx) -> str:
+        return joblib.hash((data_fp, _estimator_signature(pipeline, params), early_stopping,
+                            joblib.hash(train_idx), joblib.hash(val_idx)))
+
+    def get_many(self, keys: list) -> dict:
+        """Retorna {chave: (score, n_trees)} para as chaves já avaliadas."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._connect() as conn:
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, score, n_trees FROM evaluations WHERE key IN ({placeholders})", chunk
+                )
+                found.update({key: (score, n_trees) for key, score, n_trees in rows})
+        return found
+
+    def put_many(self, results: dict):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO evaluations (key, score, n_trees) VALUES (?, ?, ?)",
+                [(key, float(score), n_trees) for key, (score, n_trees) in results.items()]
+            )
+        logger.info(f"{len(results)} avaliações de fold gravadas no cache {self.path}")
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM evaluations")
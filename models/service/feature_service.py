@@ -1,13 +1,13 @@
 from models.service.powershap_adapter import calculate_shap_values
 from models.logs.logger import logger
 
-def analyze_features(model, data, target: str):
+def analyze_features(model, X, y):
     """
     Analisa as features utilizando SHAP e retorna um resumo dos valores.
     """
-    logger.info(f"Iniciando a análise das features para o modelo com a variável alvo '{target}'.")
+    logger.info(f"Iniciando a análise das features para o modelo com a variável alvo '{y.name}'.")
 
-    shap_summary = calculate_shap_values(model, data, target)
-    logger.info(f"Análise SHAP concluída para o modelo com a variável alvo '{target}'.")
+    shap_summary = calculate_shap_values(model, X, y)
+    logger.info(f"Análise SHAP concluída para o modelo com a variável alvo '{y.name}'.")
 
     return shap_summary
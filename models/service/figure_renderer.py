@@ -0,0 +1,191 @@
+import os
+import multiprocessing
+import json
+import time
+import hashlib
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from models.logs.logger import logger
+from models.logs.tracing import span
+
+FIGURE_MANIFEST = "models/cache/figures.json"
+# Gráficos de dispersão (beeswarm do SHAP, resíduos) acima disto são amostrados: mais pontos só
+# custam tempo de renderização sem mudar a leitura do gráfico
+MAX_SCATTER_POINTS = 5000
+DEFAULT_DPI = 150
+
+
+@dataclass
+class FigureJob:
+    """
+    Um gráfico a renderizar: o tipo (chave de RENDERERS), o arquivo de saída, os arrays já
+    reduzidos ao que o gráfico mostra e as opções. É o que vai para o processo do pool.
+    """
+    kind: str
+    output: str
+    arrays: dict
+    options: dict = field(default_factory=dict)
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256(repr((self.kind, sorted(self.options.items()))).encode())
+        for name in sorted(self.arrays):
+            array = np.ascontiguousarray(self.arrays[name])
+            digest.update(f"{name}:{array.dtype}:{array.shape}".encode())
+            digest.update(array.tobytes() if array.dtype != object else repr(array.tolist()).encode())
+        return digest.hexdigest()
+
+
+def sample_rows(n_rows: int, max_points: int = MAX_SCATTER_POINTS, seed: int = 123) -> np.ndarray:
+    """Posições (ordenadas) de no máximo `max_points` linhas, sempre as mesmas para o mesmo n_rows."""
+    if n_rows <= max_points:
+        return np.arange(n_rows)
+    return np.sort(np.random.default_rng(seed).choice(n_rows, size=max_points, replace=False))
+
+
+def shap_summary_job(shap_summary, output: str, max_points: int = MAX_SCATTER_POINTS,
+                     dpi: int = DEFAULT_DPI) -> FigureJob:
+    rows = sample_rows(len(shap_summary.values), max_points)
+    return FigureJob("shap_summary", output,
+                     {'values': np.asarray(shap_summary.values)[rows], 'data': np.asarray(shap_summary.data)[rows]},
+                     {'feature_names': tuple(shap_summary.feature_names), 'dpi': dpi})
+
+
+def residuals_job(y_true, y_pred, output: str, max_points: int = MAX_SCATTER_POINTS,
+                  dpi: int = DEFAULT_DPI) -> FigureJob:
+    y_true, y_pred = np.asarray(y_true, dtype=float), np.asarray(y_pred, dtype=float)
+    rows = sample_rows(len(y_true), max_points)
+    return FigureJob("residuals", output, {'y_true': y_true[rows], 'y_pred': y_pred[rows]},
+                     {'dpi': dpi, 'rows': len(y_true)})
+
+
+def confusion_matrix_job(y_true, y_pred, output: str, dpi: int = DEFAULT_DPI) -> FigureJob:
+    """A matriz é contada aqui: o processo do pool recebe só as contagens, não as predições."""
+    labels, codes = np.unique(np.concatenate([np.asarray(y_true), np.asarray(y_pred)]).astype(str),
+                              return_inverse=True)
+    true_codes, pred_codes = codes[:len(y_true)], codes[len(y_true):]
+    counts = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    np.add.at(counts, (true_codes, pred_codes), 1)
+    return FigureJob("confusion_matrix", output, {'counts': counts}, {'labels': tuple(labels), 'dpi': dpi})
+
+
+def _render_shap_summary(job: FigureJob, plt):
+    import shap
+    plt.figure(figsize=(10, 6))
+    shap.summary_plot(job.arrays['values'], job.arrays['data'], feature_names=list(job.options['feature_names']),
+                      show=False)
+
+
+def _render_residuals(job: FigureJob, plt):
+    y_true, y_pred = job.arrays['y_true'], job.arrays['y_pred']
+    residuals = y_true - y_pred
+    fig, (scatter, hist) = plt.subplots(1, 2, figsize=(12, 5), gridspec_kw={'width_ratios': [3, 1]})
+    scatter.scatter(y_pred, residuals, s=6, alpha=0.4, rasterized=True)
+    scatter.axhline(0, color="black", linewidth=1)
+    scatter.set_xlabel("Previsto")
+    scatter.set_ylabel("Resíduo")
+    scatter.set_title(f"Resíduos ({len(y_true)} de {job.options['rows']} linhas)")
+    hist.hist(residuals, bins=50, orientation="horizontal")
+    hist.set_xlabel("Frequência")
+
+
+def _render_confusion_matrix(job: FigureJob, plt):
+    counts, labels = job.arrays['counts'], job.options['labels']
+    fig, ax = plt.subplots(figsize=(max(5, len(labels) * 0.6 + 2),) * 2)
+    ax.imshow(counts, cmap="Blues")
+    ax.set_xticks(range(len(labels)), labels, rotation=45, ha="right")
+    ax.set_yticks(range(len(labels)), labels)
+    ax.set_xlabel("Previsto")
+    ax.set_ylabel("Real")
+    for (i, j), count in np.ndenumerate(counts):
+        ax.text(j, i, str(count), ha="center", va="center",
+                color="white" if count > counts.max() / 2 else "black")
+
+
+RENDERERS = {
+    "shap_summary": _render_shap_summary,
+    "residuals": _render_residuals,
+    "confusion_matrix": _render_confusion_matrix,
+}
+
+
+def render_job(job: FigureJob) -> dict:
+    """Renderiza um gráfico (em um processo do pool) com o backend Agg, sem janela nem servidor X."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(job.output) or ".", exist_ok=True)
+    partial = f"{job.output}.partial{os.path.splitext(job.output)[1]}"
+    try:
+        with span(f"figures.{job.kind}", output=job.output):
+            RENDERERS[job.kind](job, plt)
+            plt.tight_layout()
+            plt.savefig(partial, dpi=job.options.get('dpi', DEFAULT_DPI))
+        os.replace(partial, job.output)
+    except Exception as e:
+        logger.error(f"Erro ao renderizar {job.output}: {e}")
+        if os.path.exists(partial):
+            os.remove(partial)
+        return {'kind': job.kind, 'path': None, 'cached': False, 'seconds': time.perf_counter() - start,
+                'error': str(e)}
+    finally:
+        plt.close("all")
+    return {'kind': job.kind, 'path': job.output, 'cached': False, 'seconds': time.perf_counter() - start,
+            'error': None}
+
+
+class FigureRenderer:
+    """
+    Renderiza gráficos num pool de processos separado do treino.
+
+    O fingerprint de cada gráfico (entradas já amostradas + opções) fica em `manifest_path`; um
+    gráfico cujo arquivo existe e cujo fingerprint não mudou não é renderizado de novo.
+    """
+
+    def __init__(self, max_workers: int = None, manifest_path: str = FIGURE_MANIFEST):
+        self.max_workers = max_workers
+        self.manifest_path = manifest_path
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: dict):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        with open(f"{self.manifest_path}.tmp", "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(f"{self.manifest_path}.tmp", self.manifest_path)
+
+    def render(self, jobs: list) -> list:
+        unknown = sorted({job.kind for job in jobs} - set(RENDERERS))
+        if unknown:
+            raise ValueError(f"Gráficos desconhecidos: {unknown}. Opções: {list(RENDERERS)}")
+
+        manifest = self._load_manifest()
+        results, pending = [], {}
+        for job in jobs:
+            fingerprint = job.fingerprint()
+            if os.path.exists(job.output) and manifest.get(job.output) == fingerprint:
+                logger.info(f"Gráfico {job.output} inalterado; renderização pulada.")
+                results.append({'kind': job.kind, 'path': job.output, 'cached': True, 'seconds': 0.0, 'error': None})
+            else:
+                pending[job.output] = (job, fingerprint)
+
+        if pending:
+            workers = self.max_workers or min(len(pending), os.cpu_count() or 1)
+            # Processos novos (spawn), não fork: o estágio shap_plot chega aqui com as threads do logging
+            # e do BLAS já ativas
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [(fingerprint, pool.submit(render_job, job)) for job, fingerprint in pending.values()]
+                for fingerprint, future in futures:
+                    result = future.result()
+                    results.append(result)
+                    if result['path']:
+                        manifest[result['path']] = fingerprint
+                        logger.info(f"Gráfico salvo em {os.path.abspath(result['path'])} ({result['seconds']:.1f}s)")
+            self._save_manifest(manifest)
+        return results
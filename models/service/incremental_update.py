@@ -0,0 +1,166 @@
+import copy
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import lightgbm as lgb
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.pipeline import Pipeline
+from models.logs.logger import logger
+from models.service.data_preprocessor import WatchPreprocessor, clean_target, DROP_COLUMNS
+from models.service.dataset_cache import read_dataset, file_fingerprint
+from models.service.model_registry import ModelRegistry
+from models.service.streaming_preprocessor import StreamingWatchPreprocessor
+
+DEFAULT_EXTRA_TREES = 100
+DEFAULT_HOLDOUT = 0.2
+
+
+def _split_model(model):
+    """Retorna (passos de transformação já ajustados ou None, regressor final)."""
+    if isinstance(model, Pipeline):
+        return (model[:-1] if len(model.steps) > 1 else None), model.steps[-1][1]
+    return None, model
+
+
+def supports_warm_start(model) -> bool:
+    _, regressor = _split_model(model)
+    return isinstance(regressor, (GradientBoostingRegressor, xgb.XGBRegressor, lgb.LGBMRegressor))
+
+
+def warm_start_model(model, X_new: pd.DataFrame, y_new, extra_trees: int = DEFAULT_EXTRA_TREES):
+    """
+    Acrescenta `extra_trees` árvores ajustadas aos resíduos das novas linhas, sem refazer as existentes.
+
+    Os passos anteriores do Pipeline (ex.: StandardScaler) não são reajustados: as árvores antigas
+    continuam recebendo a mesma escala. O modelo original não é alterado (trabalha numa cópia).
+    """
+    model = copy.deepcopy(model)
+    steps, regressor = _split_model(model)
+    X_t = steps.transform(X_new) if steps is not None else X_new
+
+    if isinstance(regressor, GradientBoostingRegressor):
+        regressor.set_params(warm_start=True, n_estimators=regressor.n_estimators_ + extra_trees)
+        regressor.fit(X_t, y_new)
+    elif isinstance(regressor, xgb.XGBRegressor):
+        total = regressor.get_booster().num_boosted_rounds() + extra_trees
+        regressor.set_params(n_estimators=extra_trees, early_stopping_rounds=None)
+        regressor.fit(X_t, y_new, xgb_model=regressor.get_booster(), verbose=False)
+        regressor.set_params(n_estimators=total)
+    elif isinstance(regressor, lgb.LGBMRegressor):
+        total = regressor.booster_.num_trees() + extra_trees
+        regressor.set_params(n_estimators=extra_trees)
+        regressor.fit(X_t, y_new, init_model=regressor.booster_)
+        regressor.set_params(n_estimators=total)
+    else:
+        raise ValueError(f"{type(regressor).__name__} não suporta atualização incremental; faça um retreino completo.")
+
+    logger.info(f"{type(regressor).__name__} atualizado com {extra_trees} árvores a partir de {len(X_t)} novas linhas.")
+    return model
+
+
+def as_updatable(preprocessor: WatchPreprocessor, base_data: pd.DataFrame = None) -> StreamingWatchPreprocessor:
+    """
+    Garante um pré-processador com estatísticas agregadas. Um WatchPreprocessor comum só guarda as
+    codificações finais: as estatísticas vêm dos dados de base, mas medianas, escalas e codificações
+    ajustadas são mantidas, para o modelo registrado continuar recebendo as features em que foi treinado.
+    """
+    if isinstance(preprocessor, StreamingWatchPreprocessor):
+        return copy.deepcopy(preprocessor)
+    if base_data is None:
+        raise ValueError("O pré-processador salvo não guarda estatísticas agregadas; informe os dados de base.")
+    logger.info("Acumulando estatísticas dos dados de base sobre o pré-processador ajustado.")
+    return StreamingWatchPreprocessor.from_fitted(preprocessor, base_data.copy())
+
+
+def update_model(model, preprocessor: WatchPreprocessor, new_data: pd.DataFrame,
+                 extra_trees: int = DEFAULT_EXTRA_TREES, base_data: pd.DataFrame = None):
+    """
+    Atualiza pré-processador (TargetEncoder e vocabulário de top models) e modelo só com as novas linhas.
+    Retorna (modelo atualizado, pré-processador atualizado).
+    """
+    preprocessor = as_updatable(preprocessor, base_data)
+    preprocessor.update(new_data.copy())
+    X_new, y_new = preprocessor.transform_labelled(new_data.copy())
+    return warm_start_model(model, X_new, y_new, extra_trees), preprocessor
+
+
+def _holdout_metrics(model, preprocessor: WatchPreprocessor, holdout: pd.DataFrame) -> dict:
+    X, y = preprocessor.transform_labelled(holdout.copy())
+    predictions = model.predict(X)
+    return {'rmse_log': float(np.sqrt(mean_squared_error(y, predictions))), 'r2': float(r2_score(y, predictions))}
+
+
+def compare_with_full_retrain(model, preprocessor: WatchPreprocessor, base_data: pd.DataFrame,
+                              new_data: pd.DataFrame, holdout_fraction: float = DEFAULT_HOLDOUT,
+                              extra_trees: int = DEFAULT_EXTRA_TREES, random_state: int = 123):
+    """
+    Separa `holdout_fraction` das novas linhas e compara, nelas, três modelos:
+    o atual sem atualização, a atualização incremental e um retreino completo (mesma configuração,
+    pré-processador reajustado em base + novas).
+    Retorna (relatório com erros e tempos, modelo atualizado, pré-processador atualizado).
+    """
+    target = preprocessor.target
+    # Sorteia entre as linhas com alvo válido, mas mantém os valores brutos (cada passo limpa de novo)
+    labelled = clean_target(new_data.copy(), target)
+    holdout = new_data.loc[labelled.sample(frac=holdout_fraction, random_state=random_state).index]
+    fresh = new_data.loc[new_data.index.difference(holdout.index)]
+
+    report = {'rows': {'base': len(base_data), 'new': len(fresh), 'holdout': len(holdout)}}
+    report['current'] = _holdout_metrics(model, preprocessor, holdout)
+    # Conversão única (fora da medição): em produção o pré-processador atualizável já vem do registro
+    preprocessor = as_updatable(preprocessor, base_data)
+
+    start = time.perf_counter()
+    updated_model, updated_preprocessor = update_model(model, preprocessor, fresh, extra_trees)
+    report['incremental'] = {**_holdout_metrics(updated_model, updated_preprocessor, holdout),
+                             'seconds': time.perf_counter() - start}
+
+    start = time.perf_counter()
+    full_preprocessor = WatchPreprocessor(target)
+    X_full, y_full = full_preprocessor.fit_transform(pd.concat([base_data, fresh]))
+    full_model = clone(model).fit(X_full, y_full)
+    report['full_retrain'] = {**_holdout_metrics(full_model, full_preprocessor, holdout),
+                              'seconds': time.perf_counter() - start}
+
+    logger.info(f"Atualização incremental x retreino completo: {report}")
+    return report, updated_model, updated_preprocessor
+
+
+def run_update(new_path: str, target: str = 'price', version: str = "best", base_path: str = None,
+               extra_trees: int = DEFAULT_EXTRA_TREES, holdout_fraction: float = DEFAULT_HOLDOUT,
+               registry: ModelRegistry = None) -> dict:
+    """
+    Atualiza a versão registrada (`version`) com as listagens de `new_path` e registra o resultado.
+    Com `base_path` (dados do treino anterior) também compara com um retreino completo.
+    """
+    registry = registry or ModelRegistry()
+    model, preprocessor, entry = registry.load(target, version)
+    if preprocessor is None:
+        raise ValueError(f"A versão {entry.version} foi registrada sem pré-processador.")
+    if not supports_warm_start(model):
+        raise ValueError(f"O modelo da versão {entry.version} não suporta atualização incremental.")
+
+    new_data = read_dataset(new_path, exclude=DROP_COLUMNS)
+    base_data = read_dataset(base_path, exclude=DROP_COLUMNS) if base_path else None
+
+    if base_data is not None:
+        report, updated_model, updated_preprocessor = compare_with_full_retrain(
+            model, preprocessor, base_data, new_data, holdout_fraction, extra_trees
+        )
+        score = report['incremental']['r2']
+    else:
+        start = time.perf_counter()
+        updated_model, updated_preprocessor = update_model(model, preprocessor, new_data, extra_trees)
+        report = {'rows': {'new': len(new_data)}, 'incremental': {'seconds': time.perf_counter() - start}}
+        score = None
+
+    updated = registry.register(
+        updated_model, target, preprocessor=updated_preprocessor, source="incremental", score=score,
+        metric="r2_holdout_new_rows", data_fingerprint=file_fingerprint(new_path), metrics=report,
+        params={'base_version': entry.version, 'extra_trees': extra_trees}
+    )
+    report['version'] = updated.version
+    return report
@@ -0,0 +1,60 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from ports.inference_port import InferencePort
+from models.service.data_preprocessor import WatchPreprocessor, DEFAULT_PREPROCESSOR_PATH
+from models.service.model_registry import ModelRegistry
+from models.logs.logger import logger
+
+
+def unwrap_model(model):
+    """
+    Extrai o estimador com `predict` de qualquer saída de treino do projeto:
+    Pipeline do train_model_sklearn, pipeline do PyCaret ou objeto TPOT (fitted_pipeline_).
+    """
+    fitted = getattr(model, 'fitted_pipeline_', None)
+    if fitted is not None:
+        return fitted
+    if not hasattr(model, 'predict'):
+        raise TypeError(f"Modelo do tipo {type(model).__name__} não possui método predict.")
+    return model
+
+
+class ModelInferenceAdapter(InferencePort):
+    """
+    Pontua listagens brutas: aplica o WatchPreprocessor salvo e o modelo treinado.
+
+    Os modelos são treinados sobre log1p(preço); as previsões retornam em escala de preço.
+    """
+
+    def __init__(self, model, preprocessor: WatchPreprocessor, log_target: bool = True):
+        if not preprocessor.is_fitted:
+            raise ValueError("O pré-processador informado não está ajustado.")
+        self.model = unwrap_model(model)
+        self.preprocessor = preprocessor
+        self.log_target = log_target
+
+    @classmethod
+    def from_registry(cls, target: str = 'price', version: str = "best",
+                      registry: ModelRegistry = None) -> "ModelInferenceAdapter":
+        """Carrega modelo e pré-processador do registro (memory-mapped); version: best, latest ou id."""
+        model, preprocessor, entry = (registry or ModelRegistry()).load(target, version)
+        if preprocessor is None:
+            raise ValueError(f"A versão {entry.version} foi registrada sem pré-processador.")
+        return cls(model, preprocessor)
+
+    @classmethod
+    def from_files(cls, model_path: str,
+                   preprocessor_path: str = DEFAULT_PREPROCESSOR_PATH) -> "ModelInferenceAdapter":
+        for path in (model_path, preprocessor_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Artefato não encontrado: {path}")
+        logger.info(f"Carregando modelo de {model_path} e pré-processador de {preprocessor_path}")
+        return cls(joblib.load(model_path), WatchPreprocessor.load(preprocessor_path))
+
+    def predict(self, listings: pd.DataFrame) -> np.ndarray:
+        X = self.preprocessor.transform(listings)
+        predictions = np.asarray(self.model.predict(X), dtype=float).ravel()
+        return np.expm1(predictions) if self.log_target else predictions
+
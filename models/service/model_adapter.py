@@ -3,17 +3,29 @@ import pandas as pd
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import GradientBoostingRegressor, AdaBoostRegressor
-from sklearn.model_selection import GridSearchCV
+from scipy.stats import loguniform, randint, uniform
 import xgboost as xgb
 from lightgbm import LGBMRegressor
 from sklearn.preprocessing import LabelEncoder
 from models.logs.logger import logger
+from models.service.model_search import successive_halving_search, grid_search, DEFAULT_MAX_FITS
+from models.service.evaluation_cache import EvaluationCache, PIPELINE_MEMORY
 
-def train_model_sklearn(data: pd.DataFrame, target: str):
+def train_model_sklearn(X: pd.DataFrame, y: pd.Series, search: str = "adaptive",
+                        max_fits: float = DEFAULT_MAX_FITS, time_budget: float = None, use_cache: bool = True,
+                        return_result: bool = False):
+    """
+    Treina e seleciona o melhor regressor.
+
+    Parâmetros:
+      - X, y: features pré-processadas e alvo, separados (X não é copiado nem alterado).
+      - search: "adaptive" (successive halving com orçamento, padrão) ou "grid" (GridSearchCV exaustivo).
+      - max_fits: orçamento da busca adaptativa em ajustes equivalentes ao dataset completo.
+      - time_budget: limite opcional, em segundos, para a busca adaptativa.
+      - use_cache: reaproveita scores de fold já avaliados (models/cache/evaluations.sqlite).
+      - return_result: retorna o SearchResult completo (score CV, parâmetros) no lugar do modelo.
+    """
     logger.info("Iniciando o treinamento do modelo.")
-    
-    X = data.drop(columns=[target])
-    y = data[target]
 
     if y.dtype == 'object' or y.dtype.name == 'category':
         logger.info("Coluna alvo é categórica. Aplicando LabelEncoder.")
@@ -35,12 +47,13 @@ def train_model_sklearn(data: pd.DataFrame, target: str):
 
     if 'size' not in X.columns:
         logger.warning("Coluna 'size' não encontrada. Renomeando a coluna 0 para 'size'.")
-        X.columns = ['size']  # Renomear a coluna numerada para 'size'
+        X = X.set_axis(['size'], axis=1)  # Renomear a coluna numerada para 'size'
 
     logger.info("Primeiros 5 valores da coluna 'size' antes da conversão:")
     logger.info(f"{X['size'].head()}")
 
-    X['size'] = pd.to_numeric(X['size'], errors='coerce')  # Tentar converter explicitamente a coluna 'size'
+    if not pd.api.types.is_numeric_dtype(X['size']):
+        X = X.assign(size=pd.to_numeric(X['size'], errors='coerce'))  # Tentar converter explicitamente a coluna 'size'
     
     logger.info("Primeiros 5 valores da coluna 'size' após conversão:")
     logger.info(f"{X['size'].head()}")
@@ -56,14 +69,44 @@ def train_model_sklearn(data: pd.DataFrame, target: str):
 
     logger.info(f"Shape de X após conversão para numérico: {X.shape}")
 
-    candidates = {
+    candidates = build_candidates()
+    cache = EvaluationCache() if use_cache else None
+
+    if search == "grid":
+        result = grid_search(candidates, X, y, cache=cache)
+    elif search == "adaptive":
+        result = successive_halving_search(candidates, X, y, max_fits=max_fits, time_budget=time_budget, cache=cache)
+    else:
+        raise ValueError("search deve ser 'adaptive' ou 'grid'.")
+    best_model, best_model_name, best_score = result.best_model, result.best_name, result.best_score
+
+    logger.info(f"\nModelo Selecionado: {best_model_name} com R² CV: {best_score:.4f}")
+    
+    if return_result:
+        return result, le
+    return best_model, le
+
+
+def build_candidates() -> dict:
+    """
+    Famílias candidatas com a grade original ('params') e o espaço de amostragem da busca adaptativa ('space').
+    Em 'early_stopping' as famílias com parada antecipada nativa (XGBoost/LightGBM).
+    """
+    return {
         'gradient_boosting': {
             'pipeline': Pipeline([('scaler', StandardScaler()), 
-                                  ('regressor', GradientBoostingRegressor(random_state=123))]),
+                                  ('regressor', GradientBoostingRegressor(random_state=123))],
+                                 memory=PIPELINE_MEMORY),
             'params': {
                 'regressor__n_estimators': [50, 100, 200],
                 'regressor__learning_rate': [0.01, 0.1, 0.2],
                 'regressor__max_depth': [3, 5, 7]
+            },
+            'space': {
+                'regressor__n_estimators': randint(50, 301),
+                'regressor__learning_rate': loguniform(0.01, 0.3),
+                'regressor__max_depth': randint(3, 8),
+                'regressor__subsample': uniform(0.7, 0.3)
             }
         },
         'ada_boost': {
@@ -71,6 +114,10 @@ def train_model_sklearn(data: pd.DataFrame, target: str):
             'params': {
                 'regressor__n_estimators': [50, 100, 200],
                 'regressor__learning_rate': [0.01, 0.1, 0.2]
+            },
+            'space': {
+                'regressor__n_estimators': randint(50, 301),
+                'regressor__learning_rate': loguniform(0.01, 1.0)
             }
         },
         'xgboost': {
@@ -79,7 +126,17 @@ def train_model_sklearn(data: pd.DataFrame, target: str):
                 'regressor__n_estimators': [50, 100, 200],
                 'regressor__learning_rate': [0.01, 0.1, 0.2],
                 'regressor__max_depth': [3, 5, 7]
-            }
+            },
+            # n_estimators é só o teto: a parada antecipada nativa decide quantas árvores usar
+            'space': {
+                'regressor__n_estimators': [1000],
+                'regressor__learning_rate': loguniform(0.01, 0.3),
+                'regressor__max_depth': randint(3, 9),
+                'regressor__subsample': uniform(0.6, 0.4),
+                'regressor__colsample_bytree': uniform(0.6, 0.4),
+                'regressor__min_child_weight': loguniform(1, 10)
+            },
+            'early_stopping': True
         },
         'lightgbm': {
             'pipeline': Pipeline([('regressor', LGBMRegressor(random_state=123))]),
@@ -87,31 +144,16 @@ def train_model_sklearn(data: pd.DataFrame, target: str):
                 'regressor__n_estimators': [50, 100, 200],
                 'regressor__learning_rate': [0.01, 0.1, 0.2],
                 'regressor__max_depth': [-1, 5, 10]
-            }
+            },
+            'space': {
+                'regressor__n_estimators': [1000],
+                'regressor__learning_rate': loguniform(0.01, 0.3),
+                'regressor__max_depth': [-1, 5, 10],
+                'regressor__num_leaves': randint(15, 128),
+                'regressor__min_child_samples': randint(5, 51),
+                'regressor__colsample_bytree': uniform(0.6, 0.4),
+                'regressor__verbose': [-1]
+            },
+            'early_stopping': True
         }
     }
-
-    best_score = -np.inf
-    best_model = None
-    best_model_name = None
-
-    for name, candidate in candidates.items():
-        logger.info(f"Iniciando treinamento do modelo: {name}")
-        grid = GridSearchCV(candidate['pipeline'], candidate['params'], cv=5, scoring='r2', n_jobs=-1)
-        
-        logger.info(f"Shape de X antes do treinamento: {X.shape}")
-        logger.info(f"Shape de y antes do treinamento: {y.shape}")
-        
-        try:
-            grid.fit(X, y)
-            logger.info(f"Modelo: {name} | Melhor R² CV: {grid.best_score_:.4f}")
-            if grid.best_score_ > best_score:
-                best_score = grid.best_score_
-                best_model = grid.best_estimator_
-                best_model_name = name
-        except Exception as e:
-            logger.error(f"Erro com o modelo {name}: {e}")
-
-    logger.info(f"\nModelo Selecionado: {best_model_name} com R² CV: {best_score:.4f}")
-    
-    return best_model, le
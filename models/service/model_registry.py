@@ -0,0 +1,188 @@
+import os
+import json
+import shutil
+import uuid
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+import joblib
+from models.logs.logger import logger
+
+REGISTRY_DIR = "models/registry"
+MODEL_FILE = "model.joblib"
+PREPROCESSOR_FILE = "preprocessor.joblib"
+METADATA_FILE = "metadata.json"
+# Protocolo de avaliação do score: só scores do mesmo protocolo são comparados em best()
+DEFAULT_METRIC = "r2_cv"
+# Protocolo de cada origem, quando o register não informa (e nas versões gravadas antes do campo `metric`);
+# as demais origens são os adapters do PyCaret
+SOURCE_METRICS = {
+    "sklearn": "r2_cv",
+    "segmented": "r2_cv_segmented",
+    "tpot": "r2_holdout",
+    "incremental": "r2_holdout_new_rows",
+}
+
+
+@dataclass
+class ModelVersion:
+    """Metadados de uma versão registrada (gravados em metadata.json ao lado dos artefatos)."""
+    target: str
+    version: str
+    created_at: str
+    source: str
+    score: float = None
+    metric: str = None
+    features: list = field(default_factory=list)
+    data_fingerprint: str = None
+    metrics: dict = field(default_factory=dict)
+    params: dict = field(default_factory=dict)
+    path: str = None
+
+
+def source_metric(source: str) -> str:
+    return SOURCE_METRICS.get(source, "r2_cv_pycaret")
+
+
+def metric_of(entry: ModelVersion) -> str:
+    """Protocolo do score da versão."""
+    return entry.metric or source_metric(entry.source)
+
+
+def _json_safe(value):
+    return json.loads(json.dumps(value, default=str))
+
+
+class ModelRegistry:
+    """
+    Registro versionado de modelos treinados: models/registry/<target>/<versão>/.
+
+    Cada versão guarda o modelo, o pré-processador e metadata.json (features, score de validação e
+    o protocolo em que ele foi medido, fingerprint dos dados de treino, métricas). Os artefatos são salvos sem compressão para que
+    os arrays grandes sejam carregados por memory-mapping (mmap_mode='r'): a carga a frio é rápida
+    e vários processos de pontuação compartilham as mesmas páginas do cache do sistema.
+    """
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+
+    def _target_dir(self, target: str) -> str:
+        return os.path.join(self.root, target)
+
+    def register(self, model, target: str, preprocessor=None, source: str = "sklearn", score: float = None,
+                 features: list = None, data_fingerprint: str = None, metrics: dict = None,
+                 params: dict = None, metric: str = None) -> ModelVersion:
+        """
+        Salva uma nova versão e retorna seus metadados. `metric` nomeia o protocolo do score
+        (ex.: r2_cv, r2_holdout); sem ele, vale o da origem.
+        """
+        created = datetime.now(timezone.utc)
+        version = f"{created:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(self._target_dir(target), version)
+        os.makedirs(path)
+
+        if features is None and preprocessor is not None:
+            features = preprocessor.output_columns
+        entry = ModelVersion(
+            target=target, version=version, created_at=created.isoformat(), source=source,
+            score=None if score is None else float(score), metric=metric or source_metric(source),
+            features=list(features or []),
+            data_fingerprint=data_fingerprint, metrics=_json_safe(metrics or {}),
+            params=_json_safe(params or {}), path=path
+        )
+
+        joblib.dump(model, os.path.join(path, MODEL_FILE))
+        if preprocessor is not None:
+            joblib.dump(preprocessor, os.path.join(path, PREPROCESSOR_FILE))
+        # metadata.json por último: versões sem ele são gravações interrompidas e ficam invisíveis
+        with open(os.path.join(path, METADATA_FILE), "w") as f:
+            json.dump(asdict(entry), f, indent=4)
+
+        logger.info(f"Modelo registrado: {target}/{version} (origem={source}, {entry.metric}={entry.score})")
+        return entry
+
+    def versions(self, target: str) -> list:
+        """Versões completas de `target`, da mais antiga para a mais recente."""
+        target_dir = self._target_dir(target)
+        if not os.path.isdir(target_dir):
+            return []
+        entries = []
+        for version in sorted(os.listdir(target_dir)):
+            metadata_path = os.path.join(target_dir, version, METADATA_FILE)
+            if os.path.exists(metadata_path):
+                with open(metadata_path) as f:
+                    entry = ModelVersion(**json.load(f))
+                entry.path = os.path.join(target_dir, version)
+                entries.append(entry)
+        return entries
+
+    def get(self, target: str, version: str) -> ModelVersion:
+        for entry in self.versions(target):
+            if entry.version == version:
+                return entry
+        raise KeyError(f"Versão {version} não encontrada para o alvo '{target}'.")
+
+    def latest(self, target: str) -> ModelVersion:
+        entries = self.versions(target)
+        if not entries:
+            raise KeyError(f"Nenhum modelo registrado para o alvo '{target}'.")
+        return entries[-1]
+
+    def best(self, target: str, metric: str = None) -> ModelVersion:
+        """
+        Versão com maior score entre as medidas no mesmo protocolo `metric`; empates ficam com a
+        mais recente. Sem `metric`: o único protocolo registrado ou, havendo vários, DEFAULT_METRIC.
+        Scores de protocolos diferentes (CV, holdout, linhas novas...) nunca são comparados.
+        """
+        scored = [entry for entry in self.versions(target) if entry.score is not None]
+        if not scored:
+            return self.latest(target)
+        available = sorted({metric_of(entry) for entry in scored})
+        if metric is None:
+            if len(available) == 1:
+                metric = available[0]
+            elif DEFAULT_METRIC in available:
+                metric = DEFAULT_METRIC
+            else:
+                raise ValueError(f"Scores de '{target}' em protocolos diferentes ({available}): "
+                                 f"use best:<protocolo> ou o id de uma versão.")
+        candidates = [entry for entry in scored if metric_of(entry) == metric]
+        if not candidates:
+            raise KeyError(f"Nenhuma versão de '{target}' com score {metric}. Protocolos: {available}")
+        return max(reversed(candidates), key=lambda entry: entry.score)
+
+    def resolve(self, target: str, version: str = "best") -> ModelVersion:
+        """Aceita 'best', 'best:<protocolo>' (ex.: best:r2_holdout), 'latest' ou o identificador de uma versão."""
+        if version == "best":
+            return self.best(target)
+        if version.startswith("best:"):
+            return self.best(target, version.split(":", 1)[1])
+        if version == "latest":
+            return self.latest(target)
+        return self.get(target, version)
+
+    def load(self, target: str, version: str = "best", mmap: bool = True):
+        """Carrega (modelo, pré-processador, metadados); o pré-processador é None se não foi salvo."""
+        entry = self.resolve(target, version)
+        mmap_mode = 'r' if mmap else None
+        model = joblib.load(os.path.join(entry.path, MODEL_FILE), mmap_mode=mmap_mode)
+        preprocessor_path = os.path.join(entry.path, PREPROCESSOR_FILE)
+        preprocessor = joblib.load(preprocessor_path, mmap_mode=mmap_mode) if os.path.exists(preprocessor_path) else None
+        logger.info(f"Modelo carregado do registro: {target}/{entry.version}")
+        return model, preprocessor, entry
+
+    def prune(self, target: str, keep: int = 5, keep_best: bool = True) -> list:
+        """Remove versões antigas, mantendo as `keep` mais recentes (e a melhor de cada protocolo, se `keep_best`)."""
+        entries = self.versions(target)
+        kept = {entry.version for entry in entries[-keep:]} if keep > 0 else set()
+        if keep_best and entries:
+            metrics = {metric_of(entry) for entry in entries if entry.score is not None}
+            for metric in metrics:
+                kept.add(self.best(target, metric).version)
+            if not metrics:
+                kept.add(entries[-1].version)
+        removed = [entry for entry in entries if entry.version not in kept]
+        for entry in removed:
+            shutil.rmtree(entry.path)
+        if removed:
+            logger.info(f"{len(removed)} versões antigas de '{target}' removidas do registro.")
+        return [entry.version for entry in removed]
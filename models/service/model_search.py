@@ -0,0 +1,269 @@
+import math
+import time
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+import lightgbm as lgb
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+from models.logs.logger import logger
+from models.logs.tracing import span
+from models.service.evaluation_cache import EvaluationCache, data_fingerprint
+
+# Orçamento padrão, em ajustes equivalentes a um ajuste no dataset completo
+# (a grade exaustiva original custa 450 ajustes completos).
+DEFAULT_MAX_FITS = 60
+EARLY_STOPPING_ROUNDS = 30
+# Fração das linhas de treino de cada fold separada como eval_set da parada antecipada:
+# o fold de validação fica só para o score, senão o nº de árvores seria escolhido nele
+EARLY_STOPPING_FRACTION = 0.1
+MIN_RUNG_ROWS = 500
+
+
+def feature_matrix(X) -> np.ndarray:
+    """
+    X como matriz float32, o tipo da saída do pré-processamento: sem cópia quando X já é float32.
+    As árvores do scikit-learn e o XGBoost convertem para float32 internamente de qualquer forma.
+    """
+    return np.asarray(X, dtype=np.float32)
+
+
+@dataclass
+class SearchResult:
+    best_model: object
+    best_name: str
+    best_params: dict
+    best_score: float
+    fits_used: float
+    elapsed: float
+    history: list = field(default_factory=list)
+
+
+def _rung_sizes(n_rows: int, eta: int, max_rungs: int) -> list:
+    """Tamanhos de amostra de cada rodada; a última sempre usa todas as linhas."""
+    n_rungs = 1
+    while n_rungs < max_rungs and n_rows / eta ** n_rungs >= MIN_RUNG_ROWS:
+        n_rungs += 1
+    return [int(n_rows / eta ** (n_rungs - 1 - i)) for i in range(n_rungs)]
+
+
+def _initial_configs(max_fits: float, cv: int, eta: int, sizes: list) -> int:
+    """Quantas configurações iniciais cabem no orçamento (custo proporcional às linhas usadas)."""
+    n_rows = sizes[-1]
+    cost_per_config = cv * sum(size / n_rows / eta ** i for i, size in enumerate(sizes))
+    return max(1, int(max_fits / cost_per_config))
+
+
+def _fit_with_early_stopping(pipeline, X_train, y_train, X_val, y_val):
+    """Ajusta os passos anteriores e depois o regressor com eval_set; retorna o nº de árvores usadas."""
+    steps = pipeline[:-1]
+    regressor = pipeline.steps[-1][1]
+    X_train_t = steps.fit_transform(X_train, y_train) if len(steps) else X_train
+    X_val_t = steps.transform(X_val) if len(steps) else X_val
+
+    if isinstance(regressor, xgb.XGBRegressor):
+        regressor.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        regressor.fit(X_train_t, y_train, eval_set=[(X_val_t, y_val)], verbose=False)
+        return regressor.best_iteration + 1
+    if isinstance(regressor, lgb.LGBMRegressor):
+        regressor.fit(X_train_t, y_train, eval_set=[(X_val_t, y_val)],
+                      callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        return regressor.best_iteration_ or regressor.n_estimators
+    raise TypeError(f"Parada antecipada não suportada para {type(regressor).__name__}.")
+
+
+def _early_stopping_split(train_idx: np.ndarray, random_state: int = 123):
+    """Divide as linhas de treino do fold em (ajuste, eval_set da parada antecipada)."""
+    shuffled = np.random.RandomState(random_state).permutation(train_idx)
+    n_stop = max(1, int(len(shuffled) * EARLY_STOPPING_FRACTION))
+    return np.sort(shuffled[n_stop:]), np.sort(shuffled[:n_stop])
+
+
+def _evaluate_fold(pipeline, params: dict, early_stopping: bool, X: np.ndarray, y: np.ndarray,
+                   train_idx: np.ndarray, val_idx: np.ndarray):
+    """
+    Score R² de uma configuração num fold. Um erro (parâmetros inválidos, falha do regressor)
+    vale -inf só para este job: as outras configurações e famílias continuam na disputa.
+    """
+    try:
+        return _fit_and_score(pipeline, params, early_stopping, X, y, train_idx, val_idx)
+    except Exception as e:
+        name = type(pipeline.steps[-1][1]).__name__
+        logger.error(f"Erro ao avaliar {name} {params} ({len(train_idx)} linhas de treino): {e}")
+        return -np.inf, None
+
+
+def _fit_and_score(pipeline, params: dict, early_stopping: bool, X: np.ndarray, y: np.ndarray,
+                   train_idx: np.ndarray, val_idx: np.ndarray):
+    estimator = clone(pipeline).set_params(**params)
+    with span("search.candidate", model=type(estimator.steps[-1][1]).__name__, params=params,
+              train_rows=len(train_idx), val_rows=len(val_idx)) as s:
+        if early_stopping:
+            estimator.set_params(regressor__n_jobs=1)
+            fit_idx, stop_idx = _early_stopping_split(train_idx)
+            n_trees = _fit_with_early_stopping(estimator, X[fit_idx], y[fit_idx], X[stop_idx], y[stop_idx])
+        else:
+            estimator.fit(X[train_idx], y[train_idx])
+            n_trees = None
+        score = r2_score(y[val_idx], estimator.predict(X[val_idx]))
+        s.set(score=score)
+    return score, n_trees
+
+
+def evaluate_configs(candidates: dict, configs: list, X: np.ndarray, y: np.ndarray, folds: list,
+                     parallel: Parallel, cache: EvaluationCache = None, data_fp: str = None,
+                     early_stopping: bool = True) -> int:
+    """
+    Avalia cada configuração em todos os folds, preenchendo config['score'] e config['n_trees'].
+    Folds já presentes no cache não são reajustados. Retorna quantos ajustes foram de fato executados.
+    Com `early_stopping=False`, nenhuma família usa parada antecipada (ajuste completo em cada fold).
+    """
+    jobs = [(ci, fi) for ci in range(len(configs)) for fi in range(len(folds))]
+
+    def spec(job):
+        config = configs[job[0]]
+        candidate = candidates[config['name']]
+        return candidate['pipeline'], config['params'], early_stopping and candidate.get('early_stopping', False)
+
+    results, keys = {}, {}
+    if cache is not None:
+        for job in jobs:
+            train_idx, val_idx = folds[job[1]]
+            pipeline, params, job_early_stopping = spec(job)
+            # O protocolo da parada antecipada entra na chave: scores de outro protocolo não são reaproveitados
+            keys[job] = cache.key(data_fp, pipeline, params, job_early_stopping and EARLY_STOPPING_FRACTION,
+                                  train_idx, val_idx)
+        cached = cache.get_many(list(keys.values()))
+        results = {job: cached[keys[job]] for job in jobs if keys[job] in cached}
+
+    missing = [job for job in jobs if job not in results]
+    if results:
+        logger.info(f"{len(results)} de {len(jobs)} avaliações reaproveitadas do cache.")
+    computed = parallel(
+        delayed(_evaluate_fold)(*spec(job), X, y, *folds[job[1]]) for job in missing
+    )
+    results.update(zip(missing, computed))
+    failed = [job for job in missing if results[job][0] == -np.inf]
+    if failed:
+        logger.warning(f"{len(failed)} de {len(missing)} avaliações falharam e ficam com score -inf.")
+    if cache is not None and missing:
+        # Falhas não vão para o cache: podem ser transitórias (memória, worker perdido)
+        cache.put_many({keys[job]: results[job] for job in missing if job not in failed})
+
+    for ci, config in enumerate(configs):
+        fold_results = [results[(ci, fi)] for fi in range(len(folds))]
+        config['score'] = float(np.mean([score for score, _ in fold_results]))
+        trees = [n for _, n in fold_results if n is not None]
+        config['n_trees'] = int(np.median(trees)) if trees else None
+    return len(missing)
+
+
+def _refit_best(candidates: dict, best: dict, X: pd.DataFrame, y):
+    if best['score'] == -np.inf:
+        raise RuntimeError("Todas as configurações da busca falharam; veja os erros no log.")
+    best_params = dict(best['params'])
+    if best['n_trees'] is not None:
+        # Sem conjunto de validação no ajuste final: usa o nº de árvores escolhido pela parada antecipada
+        best_params['regressor__n_estimators'] = best['n_trees']
+    best_model = clone(candidates[best['name']]['pipeline']).set_params(**best_params)
+    with span("search.refit_best", inputs=X, model=best['name']):
+        best_model.fit(X, y)
+    return best_model, best_params
+
+
+def grid_search(candidates: dict, X: pd.DataFrame, y, cv: int = 5, n_jobs: int = -1,
+                cache: EvaluationCache = None) -> SearchResult:
+    """
+    Grade exaustiva de cada família ('params'), com os mesmos folds do GridSearchCV (KFold sem shuffle)
+    e o mesmo protocolo: cada configuração é ajustada por inteiro em cada fold, sem parada antecipada.
+    Com `cache`, apenas as combinações (configuração, fold) ainda não avaliadas são ajustadas.
+    """
+    start = time.perf_counter()
+    X_values = feature_matrix(X)
+    y_values = np.asarray(y, dtype=float)
+    folds = list(KFold(n_splits=cv).split(X_values))
+    configs = [{'name': name, 'params': params}
+               for name, candidate in candidates.items() for params in ParameterGrid(candidate['params'])]
+
+    fits = evaluate_configs(candidates, configs, X_values, y_values, folds, Parallel(n_jobs=n_jobs),
+                            cache, data_fingerprint(X_values, y_values) if cache is not None else None,
+                            early_stopping=False)
+    for name in candidates:
+        family = [c for c in configs if c['name'] == name]
+        logger.info(f"Modelo: {name} | Melhor R² CV: {max(c['score'] for c in family):.4f}")
+
+    best = max(configs, key=lambda c: c['score'])
+    best_model, best_params = _refit_best(candidates, best, X, y)
+    history = [{'rung': 0, 'rows': len(X_values), 'name': c['name'], 'params': c['params'], 'score': c['score']}
+               for c in configs]
+    return SearchResult(best_model, best['name'], best_params, best['score'], fits + 1,
+                        time.perf_counter() - start, history)
+
+
+def successive_halving_search(candidates: dict, X: pd.DataFrame, y, max_fits: float = DEFAULT_MAX_FITS,
+                              time_budget: float = None, eta: int = 3, cv: int = 5, max_rungs: int = 3,
+                              n_jobs: int = -1, random_state: int = 123,
+                              cache: EvaluationCache = None) -> SearchResult:
+    """
+    Busca adaptativa (successive halving) sobre todas as famílias candidatas ao mesmo tempo.
+
+    Configurações são amostradas do 'space' de cada família e avaliadas por CV em amostras
+    crescentes dos dados; a cada rodada só o melhor 1/eta segue adiante. Todas as avaliações
+    (configuração x fold, de todas as famílias) disputam o mesmo pool de workers. XGBoost e
+    LightGBM usam parada antecipada nativa numa parte separada do treino de cada fold.
+    """
+    start = time.perf_counter()
+    X_values = feature_matrix(X)
+    y_values = np.asarray(y, dtype=float)
+    n_rows = len(X_values)
+
+    sizes = _rung_sizes(n_rows, eta, max_rungs)
+    n_initial = _initial_configs(max_fits, cv, eta, sizes)
+    per_family = max(1, n_initial // len(candidates))
+
+    configs = []
+    for name, candidate in candidates.items():
+        space = candidate.get('space', candidate['params'])
+        for params in ParameterSampler(space, per_family, random_state=random_state):
+            configs.append({'name': name, 'params': params})
+
+    logger.info(f"Busca adaptativa: {len(configs)} configurações, rodadas com {sizes} linhas, "
+                f"orçamento de {max_fits} ajustes completos.")
+
+    order = np.random.RandomState(random_state).permutation(n_rows)
+    data_fp = data_fingerprint(X_values, y_values) if cache is not None else None
+    history = []
+    fits_used = 0.0
+    parallel = Parallel(n_jobs=n_jobs)
+
+    for rung, size in enumerate(sizes):
+        if time_budget is not None and rung > 0 and time.perf_counter() - start > time_budget:
+            logger.warning(f"Orçamento de tempo ({time_budget}s) esgotado; encerrando na rodada {rung}.")
+            break
+
+        subset = order[:size]
+        folds = [(subset[train_idx], subset[val_idx])
+                 for train_idx, val_idx in KFold(n_splits=cv, shuffle=True, random_state=random_state).split(subset)]
+        fits = evaluate_configs(candidates, configs, X_values, y_values, folds, parallel, cache, data_fp)
+        fits_used += fits * size / n_rows
+
+        for config in configs:
+            history.append({'rung': rung, 'rows': size, 'name': config['name'],
+                            'params': config['params'], 'score': config['score']})
+
+        configs.sort(key=lambda c: c['score'], reverse=True)
+        logger.info(f"Rodada {rung} ({size} linhas): melhor {configs[0]['name']} R² CV {configs[0]['score']:.4f}")
+        if rung < len(sizes) - 1:
+            configs = configs[:max(1, math.ceil(len(configs) / eta))]
+
+    best = configs[0]
+    best_model, best_params = _refit_best(candidates, best, X, y)
+    fits_used += 1
+    elapsed = time.perf_counter() - start
+
+    logger.info(f"Busca adaptativa concluída em {elapsed:.1f}s ({fits_used:.1f} ajustes completos): "
+                f"{best['name']} R² CV {best['score']:.4f}")
+    return SearchResult(best_model, best['name'], best_params, best['score'], fits_used, elapsed, history)
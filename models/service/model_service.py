@@ -1,17 +1,60 @@
 from models.service.model_adapter import train_model_sklearn
+from models.service.evaluation_cache import data_fingerprint
+from models.service.model_registry import ModelRegistry
 from models.logs.logger import logger
 
-def build_model(data, target: str):
+def build_model(X, y, search: str = "adaptive", registry: ModelRegistry = None,
+                preprocessor=None, return_entry: bool = False, **search_options):
     """
-    Orquestra o treinamento do modelo.
+    Orquestra o treinamento do modelo com as features (X) e o alvo (y) separados; o alvo é y.name.
+    `search` e `search_options` (max_fits, time_budget) são repassados a train_model_sklearn.
+    Com `registry`, o modelo escolhido é registrado junto com o pré-processador e o score CV;
+    com `return_entry`, retorna também a versão registrada (None se nada foi registrado).
     """
+    target = y.name
     logger.info(f"Iniciando a construção do modelo para a variável alvo '{target}'.")
 
-    model, le = train_model_sklearn(data, target)
+    result, le = train_model_sklearn(X, y, search=search, return_result=True, **search_options)
+    model = result.best_model if result is not None else None
+    entry = None
 
     if model is not None:
         logger.info(f"Modelo treinado com sucesso: {model}")
+        if registry is not None:
+            entry = registry.register(
+                model, target, preprocessor=preprocessor, source="sklearn", score=result.best_score, metric="r2_cv",
+                features=X.columns.tolist(), data_fingerprint=data_fingerprint(X, y),
+                metrics={'R2_cv': result.best_score, 'fits_used': result.fits_used, 'elapsed_s': result.elapsed},
+                params={'name': result.best_name, **result.best_params}
+            )
     else:
         logger.warning("Falha no treinamento do modelo. Nenhum modelo retornado.")
 
+    if return_entry:
+        return model, le, entry
     return model, le
+
+
+def build_segmented_model(X, y, by: tuple = ("brand",), registry: ModelRegistry = None, preprocessor=None,
+                          labels=None, **options):
+    """
+    Treina o modelo segmentado (um regressor por segmento + global) e o registra com o score
+    CV ponderado pelas linhas de cada segmento. `options` vão para train_segmented.
+    """
+    from models.service.segmented_training import train_segmented, weighted_score
+
+    target = y.name
+    logger.info(f"Iniciando o treino segmentado por {list(by)} para a variável alvo '{target}'.")
+    model, report = train_segmented(X, y, by=by, labels=labels, **options)
+    score = weighted_score(report)
+    logger.info(f"Modelo segmentado treinado: {model} | R² CV ponderado: {score:.4f}")
+
+    if registry is not None:
+        registry.register(
+            model, target, preprocessor=preprocessor, source="segmented", score=score, metric="r2_cv_segmented",
+            features=X.columns.tolist(), data_fingerprint=data_fingerprint(X, y),
+            metrics={'R2_cv': score, 'segments': len(model.routes),
+                     'elapsed_s': max(r['seconds'] for r in report)},
+            params={'by': list(by), 'segments': [{k: v for k, v in r.items() if k != 'key'} for r in report]}
+        )
+    return model, report
@@ -1,31 +1,181 @@
+import numpy as np
+import pandas as pd
 import shap
+import xgboost as xgb
+import lightgbm as lgb
+from joblib import Parallel, delayed
+from sklearn.pipeline import Pipeline
+from sklearn.ensemble import (
+    GradientBoostingRegressor, RandomForestRegressor, ExtraTreesRegressor
+)
+from sklearn.tree import DecisionTreeRegressor
 from models.logs.logger import logger
+from models.logs.tracing import traced
 
-def calculate_shap_values(model, data, target: str):
+# Modelos explicados com o algoritmo exato para árvores (TreeSHAP).
+# AdaBoost não é suportado pelo TreeExplainer e segue o caminho agnóstico.
+TREE_MODELS = (
+    GradientBoostingRegressor, RandomForestRegressor, ExtraTreesRegressor, DecisionTreeRegressor,
+    xgb.XGBRegressor, lgb.LGBMRegressor
+)
+
+DEFAULT_MAX_SAMPLES = 2000
+DEFAULT_BACKGROUND_SIZE = 50
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def split_pipeline(model):
+    """Separa um Pipeline em (transformação, estimador final); modelos simples retornam (None, modelo)."""
+    if isinstance(model, Pipeline):
+        transform = model[:-1] if len(model.steps) > 1 else None
+        return transform, model.steps[-1][1]
+    return None, model
+
+
+def is_tree_model(model) -> bool:
+    return isinstance(split_pipeline(model)[1], TREE_MODELS)
+
+
+def stratified_sample(X: pd.DataFrame, y: pd.Series, max_samples: int, n_bins: int = 10,
+                      random_state: int = 123) -> pd.DataFrame:
+    """Amostra até `max_samples` linhas preservando a distribuição do alvo (faixas por quantil)."""
+    if len(X) <= max_samples:
+        return X
+    bins = pd.qcut(y.reset_index(drop=True), q=n_bins, labels=False, duplicates='drop')
+    fraction = max_samples / len(X)
+    positions = (
+        pd.Series(np.arange(len(X)))
+        .groupby(bins.to_numpy())
+        .sample(frac=fraction, random_state=random_state)
+        .sort_values()
+        .to_numpy()
+    )
+    return X.iloc[positions]
+
+
+def _chunks(X: pd.DataFrame, chunk_size: int):
+    return [X.iloc[start:start + chunk_size] for start in range(0, len(X), chunk_size)]
+
+
+def _explain_tree_chunk(estimator, X_chunk: np.ndarray):
+    explainer = shap.TreeExplainer(estimator)
+    return explainer.shap_values(X_chunk, check_additivity=False), explainer.expected_value
+
+
+def _explain_model_chunk(predict, background: np.ndarray, X_chunk: pd.DataFrame):
+    explainer = shap.Explainer(predict, shap.maskers.Independent(background, max_samples=len(background)))
+    explanation = explainer(X_chunk)
+    return explanation.values, explanation.base_values
+
+
+@traced("calculate_shap_values")
+def calculate_shap_values(model, X: pd.DataFrame, y: pd.Series, method: str = "auto",
+                          max_samples: int = DEFAULT_MAX_SAMPLES, background_size: int = DEFAULT_BACKGROUND_SIZE,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE, n_jobs: int = -1):
     """
     Calcula os valores SHAP para as features usando o modelo treinado.
-    
+
     Parâmetros:
       - model: Modelo treinado (deve ter um método predict ou similar).
-      - data: DataFrame com os dados completos.
-      - target: Nome da coluna alvo (a ser removida para obter X).
-    
+      - X: features pré-processadas (não são copiadas).
+      - y: alvo, usado na amostra estratificada do caminho agnóstico.
+      - method: "auto" (TreeSHAP para ensembles de árvores, agnóstico amostrado para o resto),
+        "tree", "sampled" ou "exact" (comportamento original: todas as linhas como background).
+      - max_samples: linhas explicadas no caminho agnóstico (amostra estratificada pelo alvo).
+      - background_size: centróides k-means usados como background no caminho agnóstico.
+      - chunk_size / n_jobs: tamanho dos blocos distribuídos entre processos.
+
     Retorna:
       - Objeto com os valores SHAP.
     """
-    logger.info(f"Iniciando o cálculo dos valores SHAP para o modelo com a variável alvo '{target}'.")
-
-    # Separa as features (X) do target (y)
-    X = data.drop(columns=[target])
-
+    logger.info(f"Iniciando o cálculo dos valores SHAP para o modelo com a variável alvo '{y.name}'.")
     logger.info(f"Shape de X para cálculo dos valores SHAP: {X.shape}")
 
+    if method == "auto":
+        method = "tree" if is_tree_model(model) else "sampled"
+    logger.info(f"Método SHAP selecionado: {method}")
+
     try:
-        explainer = shap.Explainer(model.predict, X)
-        shap_values = explainer(X)
+        if method == "exact":
+            explainer = shap.Explainer(model.predict, X)
+            shap_values = explainer(X)
+        elif method == "tree":
+            shap_values = _tree_shap(model, X, chunk_size, n_jobs)
+        elif method == "sampled":
+            shap_values = _sampled_shap(model, X, y, max_samples, background_size, chunk_size, n_jobs)
+        else:
+            raise ValueError("method deve ser 'auto', 'tree', 'sampled' ou 'exact'.")
         logger.info("Cálculo dos valores SHAP concluído com sucesso.")
     except Exception as e:
         logger.error(f"Erro ao calcular os valores SHAP: {e}")
         shap_values = None
-    
+
     return shap_values
+
+
+def _tree_shap(model, X: pd.DataFrame, chunk_size: int, n_jobs: int) -> shap.Explanation:
+    """TreeSHAP exato sobre todas as linhas, em blocos paralelos."""
+    transform, estimator = split_pipeline(model)
+    # Os passos anteriores (ex.: StandardScaler) são por coluna, então as atribuições
+    # continuam correspondendo às features originais.
+    X_model = transform.transform(X) if transform is not None else X.to_numpy()
+    X_model = pd.DataFrame(X_model, columns=X.columns)
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_explain_tree_chunk)(estimator, chunk.to_numpy()) for chunk in _chunks(X_model, chunk_size)
+    )
+    values = np.vstack([chunk_values for chunk_values, _ in results])
+    base_value = float(np.ravel(results[0][1])[0])
+    return shap.Explanation(
+        values=values,
+        base_values=np.full(len(values), base_value),
+        data=X.to_numpy(),
+        feature_names=X.columns.tolist()
+    )
+
+
+def _sampled_shap(model, X: pd.DataFrame, y: pd.Series, max_samples: int, background_size: int,
+                  chunk_size: int, n_jobs: int) -> shap.Explanation:
+    """Caminho agnóstico: background resumido por k-means e amostra estratificada de linhas."""
+    sample = stratified_sample(X, y, max_samples)
+    background = shap.kmeans(X, min(background_size, len(X))).data
+    logger.info(f"Explicando {len(sample)} de {len(X)} linhas com background de {len(background)} centróides.")
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_explain_model_chunk)(model.predict, background, chunk)
+        for chunk in _chunks(sample, chunk_size)
+    )
+    return shap.Explanation(
+        values=np.vstack([chunk_values for chunk_values, _ in results]),
+        base_values=np.concatenate([np.ravel(base) for _, base in results]),
+        data=sample.to_numpy(),
+        feature_names=X.columns.tolist()
+    )
+
+
+def background_sample(X: pd.DataFrame, background_size: int = DEFAULT_BACKGROUND_SIZE) -> np.ndarray:
+    """Background do caminho agnóstico: centróides k-means das linhas de X."""
+    return np.asarray(shap.kmeans(X, min(background_size, len(X))).data, dtype=np.float32)
+
+
+def explain_rows(model, X: pd.DataFrame, background: np.ndarray = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 n_jobs: int = -1):
+    """
+    Valores SHAP de todas as linhas de X, sem amostragem, para o armazenamento de explicações.
+    Árvores usam TreeSHAP; os demais modelos, o explainer agnóstico sobre `background`
+    (obrigatório nesse caso, para que linhas explicadas em momentos diferentes sejam comparáveis).
+
+    Retorna (values, base_values), alinhados às linhas de X.
+    """
+    if len(X) <= chunk_size:
+        n_jobs = 1  # um bloco só: subir processos custaria mais que a explicação
+    if is_tree_model(model):
+        explanation = _tree_shap(model, X, chunk_size, n_jobs)
+        return explanation.values, explanation.base_values
+    if background is None:
+        raise ValueError("Modelos que não são árvores precisam de um background para explain_rows.")
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_explain_model_chunk)(model.predict, background, chunk) for chunk in _chunks(X, chunk_size)
+    )
+    return (np.vstack([chunk_values for chunk_values, _ in results]),
+            np.concatenate([np.ravel(base) for _, base in results]))
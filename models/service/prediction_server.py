@@ -0,0 +1,216 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from ports.inference_port import InferencePort
+from models.logs.logger import logger
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_BATCH_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH_ROWS = 512
+LATENCY_WINDOW = 10000
+
+
+class LatencyStats:
+    """Contadores de vazão e janela deslizante de latências (thread-safe)."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.started = time.monotonic()
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.batches = 0
+        self.batch_rows = 0
+
+    def record_request(self, latency: float, rows: int, error: bool = False):
+        with self._lock:
+            self._latencies.append(latency)
+            self.requests += 1
+            self.rows += rows
+            self.errors += int(error)
+
+    def record_batch(self, rows: int):
+        with self._lock:
+            self.batches += 1
+            self.batch_rows += rows
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            uptime = time.monotonic() - self.started
+            return {
+                'requests': self.requests,
+                'rows': self.rows,
+                'errors': self.errors,
+                'batches': self.batches,
+                'mean_batch_rows': self.batch_rows / self.batches if self.batches else 0.0,
+                'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'throughput_requests_per_s': self.requests / uptime if uptime else 0.0,
+                'throughput_rows_per_s': self.rows / uptime if uptime else 0.0,
+                'uptime_s': uptime,
+            }
+
+
+class MicroBatcher:
+    """
+    Agrupa requisições concorrentes em uma única chamada vetorizada de `predict`.
+
+    O primeiro pedido da fila abre uma janela de `window_ms`; tudo o que chegar até o fim da
+    janela (ou até `max_batch_rows` linhas) é concatenado, pontuado de uma vez e redistribuído.
+    """
+
+    def __init__(self, inference: InferencePort, window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+                 max_batch_rows: int = DEFAULT_MAX_BATCH_ROWS, stats: LatencyStats = None):
+        self.inference = inference
+        self.window = window_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.stats = stats or LatencyStats()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+
+    def start(self) -> "MicroBatcher":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def submit(self, listings: pd.DataFrame) -> np.ndarray:
+        """Enfileira as listagens e bloqueia até o lote que as contém ser pontuado."""
+        future = Future()
+        self._queue.put((listings, future))
+        return future.result()
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            rows = len(item[0])
+            deadline = time.monotonic() + self.window
+            while rows < self.max_batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        frames = [listings for listings, _ in batch]
+        try:
+            predictions = self.inference.predict(pd.concat(frames, ignore_index=True))
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Erro ao pontuar requisição: {e}")
+                batch[0][1].set_exception(e)
+                return
+            # Uma requisição inválida não derruba as outras do lote: cada uma é pontuada sozinha
+            logger.warning(f"Erro ao pontuar lote de {len(batch)} requisições ({e}); pontuando uma a uma.")
+            for item in batch:
+                self._flush([item])
+            return
+
+        self.stats.record_batch(len(predictions))
+        offsets = np.cumsum([len(frame) for frame in frames])[:-1]
+        for (_, future), chunk in zip(batch, np.split(predictions, offsets)):
+            future.set_result(chunk)
+
+
+def parse_listings(payload) -> pd.DataFrame:
+    """Aceita uma listagem (objeto), uma lista de listagens ou {"listings": [...]}."""
+    if isinstance(payload, dict) and 'listings' in payload:
+        payload = payload['listings']
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list) or not payload or not all(isinstance(row, dict) for row in payload):
+        raise ValueError("Envie uma listagem (objeto JSON), uma lista de listagens ou {\"listings\": [...]}.")
+    return pd.DataFrame.from_records(payload)
+
+
+def make_handler(batcher: MicroBatcher):
+    stats = batcher.stats
+
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send_json(200, stats.snapshot())
+            elif self.path == "/health":
+                self._send_json(200, {'status': 'ok'})
+            else:
+                self._send_json(404, {'error': f"Rota desconhecida: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send_json(404, {'error': f"Rota desconhecida: {self.path}"})
+                return
+            start = time.perf_counter()
+            rows = 0
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                listings = parse_listings(json.loads(self.rfile.read(length) or b"null"))
+                rows = len(listings)
+                predictions = batcher.submit(listings)
+            except ValueError as e:
+                stats.record_request(time.perf_counter() - start, rows, error=True)
+                self._send_json(400, {'error': str(e)})
+                return
+            except Exception as e:
+                stats.record_request(time.perf_counter() - start, rows, error=True)
+                self._send_json(500, {'error': str(e)})
+                return
+            stats.record_request(time.perf_counter() - start, rows)
+            self._send_json(200, {'predictions': [float(p) for p in predictions]})
+
+        def log_message(self, format, *args):
+            logger.debug(f"[serve] {self.address_string()} {format % args}")
+
+    return PredictionHandler
+
+
+def serve(inference: InferencePort, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          window_ms: float = DEFAULT_BATCH_WINDOW_MS, max_batch_rows: int = DEFAULT_MAX_BATCH_ROWS):
+    """
+    Sobe o servidor HTTP de previsão até ser interrompido.
+
+    Rotas: POST /predict (listagens em JSON), GET /metrics (latência p50/p99 e vazão), GET /health.
+    """
+    batcher = MicroBatcher(inference, window_ms, max_batch_rows).start()
+    server = ThreadingHTTPServer((host, port), make_handler(batcher))
+    server.daemon_threads = True
+    logger.info(f"Servidor de previsão em http://{host}:{port} (janela de lote {window_ms} ms, "
+                f"até {max_batch_rows} linhas por lote)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Encerrando servidor de previsão.")
+    finally:
+        server.server_close()
+        batcher.stop()
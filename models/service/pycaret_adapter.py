@@ -1,112 +1,259 @@
 # adapters/pycaret_adapter.py
 import pandas as pd
-import matplotlib.pyplot as plt
 from ports.training_port import TrainingPort
 from models.logs.logger import logger
+from models.logs.tracing import span
 
-# PyCaret tasks
-from pycaret.classification import (
-    setup as class_setup,
-    compare_models as class_compare,
-    plot_model as class_plot,
-    predict_model as class_predict
-)
-from pycaret.regression import (
-    setup as reg_setup,
-    compare_models as reg_compare,
-    plot_model as reg_plot,
-    predict_model as reg_predict
-)
-from pycaret.clustering import (
-    setup as clus_setup,
-    create_model as clus_create,
-    plot_model as clus_plot
-)
+# PyCaret tasks (API orientada a objetos: cada experimento guarda seu próprio setup)
+from pycaret.classification import ClassificationExperiment
+from pycaret.regression import RegressionExperiment
+from pycaret.clustering import ClusteringExperiment
 
+from dataclasses import dataclass, field
 from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
 import json
+import time
+import shutil
+import subprocess
 import shap
 import numpy as np
 import os
 
-def save_model_metrics(y_true, y_pred, path):
-    metrics = {
+PYCARET_ARTIFACT_DIR = "models/artifacts"
+
+EXPERIMENTS = {
+    "classification": ClassificationExperiment,
+    "regression": RegressionExperiment,
+    "clustering": ClusteringExperiment,
+}
+
+
+@dataclass
+class PyCaretProfile:
+    """Configuração de execução do PyCaret: quais modelos comparar e quanto tempo gastar nisso."""
+    name: str
+    include: dict = field(default_factory=dict)  # por tarefa; ausente = todos os modelos
+    turbo: bool = True
+    fold: int = 5
+    budget_time: float = None  # minutos para o compare_models
+    polynomial_features: bool = False
+    remove_multicollinearity: bool = False
+
+
+PROFILES = {
+    "fast": PyCaretProfile(
+        "fast",
+        include={
+            "regression": ["lr", "ridge", "dt", "lightgbm"],
+            "classification": ["lr", "ridge", "dt", "lightgbm"],
+        },
+        fold=3, budget_time=2,
+    ),
+    "balanced": PyCaretProfile(
+        "balanced",
+        include={
+            "regression": ["lr", "ridge", "lasso", "en", "dt", "rf", "et", "gbr", "xgboost", "lightgbm"],
+            "classification": ["lr", "ridge", "dt", "rf", "et", "gbc", "xgboost", "lightgbm"],
+        },
+        fold=5, budget_time=10, remove_multicollinearity=True,
+    ),
+    # Comportamento anterior: todos os modelos, features polinomiais e 10 folds
+    "thorough": PyCaretProfile(
+        "thorough", turbo=False, fold=10, polynomial_features=True, remove_multicollinearity=True,
+    ),
+}
+DEFAULT_PROFILE = "balanced"
+
+
+def detect_gpu() -> bool:
+    """Há GPU NVIDIA visível? (nvidia-smi presente e listando ao menos um dispositivo)"""
+    if shutil.which("nvidia-smi") is None:
+        return False
+    try:
+        result = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0 and "GPU" in result.stdout
+
+
+def compute_model_metrics(y_true, y_pred) -> dict:
+    return {
         'MAE': mean_absolute_error(y_true, y_pred),
         'MSE': mean_squared_error(y_true, y_pred),
         'RMSE': mean_squared_error(y_true, y_pred, squared=False),
         'R2': r2_score(y_true, y_pred)
     }
+
+
+def save_model_metrics(y_true, y_pred, path):
+    metrics = compute_model_metrics(y_true, y_pred)
     with open(path, 'w') as f:
         json.dump(metrics, f, indent=4)
+    return metrics
 
 
 class PyCaretAdapter(TrainingPort):
+    def __init__(self, profile: str = DEFAULT_PROFILE, use_gpu: bool = None):
+        if profile not in PROFILES:
+            raise ValueError(f"Perfil do PyCaret inválido: {profile}. Opções: {list(PROFILES)}")
+        self.profile = PROFILES[profile]
+        self.use_gpu = detect_gpu() if use_gpu is None else use_gpu
+        # Preenchidos a cada treino para o registro de modelos:
+        # pipeline completo do PyCaret (pré-processamento + estimador) e métricas.
+        self.last_pipeline = None
+        self.last_metrics = {}
+        self.last_timings = {}
+        # Predições no holdout do último treino (y_true, y_pred), para os gráficos renderizados fora do treino
+        self.last_predictions = None
+        # Experimento (setup) do último treino, reaproveitado por plot() e por treinos nos mesmos dados
+        self.experiment = None
+        self.experiment_key = None
+        self.model = None
+
+    def _setup(self, df: pd.DataFrame, target: str, task_type: str):
+        """Cria o experimento ou reaproveita o anterior se dados, alvo, tarefa e perfil forem os mesmos."""
+        key = (pd.util.hash_pandas_object(df).sum(), tuple(df.columns), target, task_type, self.profile.name)
+        if self.experiment is not None and key == self.experiment_key:
+            logger.info("Reaproveitando o setup do PyCaret do treino anterior.")
+            return self.experiment
+
+        options = {'session_id': 123, 'html': False, 'verbose': False}
+        if task_type == "clustering":
+            options['data'] = df
+        else:
+            options.update(data=df, target=target, fold=self.profile.fold, use_gpu=self.use_gpu)
+        if task_type == "regression":
+            options.update(
+                normalize=True,
+                polynomial_features=self.profile.polynomial_features,
+                remove_multicollinearity=self.profile.remove_multicollinearity,
+                multicollinearity_threshold=0.95,
+            )
+
+        experiment = EXPERIMENTS[task_type]()
+        with span("pycaret.setup", inputs=df, task=task_type, profile=self.profile.name):
+            experiment.setup(**options)
+        self.experiment, self.experiment_key = experiment, key
+        return experiment
+
     def train_model(self, df: pd.DataFrame, target: str, task_type: str):
         """
         Use PyCaret to train. We'll just return the best model object.
         """
-        logger.info(f"Iniciando setup do PyCaret para tarefa: {task_type}")
+        if task_type not in EXPERIMENTS:
+            logger.error(f"Tarefa inválida passada para treinamento: {task_type}")
+            raise ValueError("Invalid task_type. Choose classification, regression, or clustering.")
+
+        logger.info(f"Iniciando setup do PyCaret para tarefa: {task_type} "
+                    f"(perfil {self.profile.name}, {'GPU' if self.use_gpu else 'CPU'})")
         #df = df.dropna(subset=[target])
         df = df.reset_index(drop=True)
 
-        model = None
-        plot_func = None
-        preds = None
-
-        if task_type == "classification":
-            class_setup(data=df, target=target, session_id=123, html=False, silent=True)
-            model = class_compare()
-            preds = class_predict(model, data=df)
-            plot_func = class_plot
-            logger.info("Modelo de classificação treinado com sucesso.")
-
-        elif task_type == "regression":
-            reg_setup(
-                data=df,
-                target=target,
-                session_id=123,
-                html=False,
-                normalize=True,
-                polynomial_features=True,
-                remove_multicollinearity=True,
-                multicollinearity_threshold=0.95,
-                use_gpu=True
-            )
-            model = reg_compare()
-            preds = reg_predict(model, data=df)
-            plot_func = reg_plot
-            logger.info("Modelo de regressão treinado com sucesso.")
-
-        elif task_type == "clustering":
-            clus_setup(data=df, session_id=123, html=False)
-            model = clus_create("kmeans")
-            plot_func = clus_plot
-            logger.info("Modelo de clustering criado com sucesso.")
-        else:
-            logger.error(f"Tarefa inválida passada para treinamento: {task_type}")
-            raise ValueError("Invalid task_type. Choose classification, regression, or clustering.")
+        self.last_pipeline = None
+        self.last_metrics = {}
 
-        # Salvar gráfico do modelo
-        try:
-            logger.info("Gerando gráfico do modelo...")
-        
-            plot_type = 'confusion_matrix' if task_type == "classification" else 'residuals'
-            plot_func(model, plot=plot_type, save=True)
-        
-            model_plot_path = f"views/{plot_type}.png"
-            logger.info(f"Gráfico do modelo salvo automaticamente como {model_plot_path}")
-        except Exception as e:
-            logger.error(f"Erro ao gerar gráfico do modelo: {e}")
+        start = time.perf_counter()
+        experiment = self._setup(df, target, task_type)
+        self.last_timings = {'profile': self.profile.name, 'use_gpu': self.use_gpu,
+                             'setup_s': time.perf_counter() - start}
 
+        start = time.perf_counter()
+        if task_type == "clustering":
+            with span("pycaret.create_model", task=task_type):
+                model = experiment.create_model("kmeans")
+            logger.info("Modelo de clustering criado com sucesso.")
+        else:
+            with span("pycaret.compare_models", task=task_type, profile=self.profile.name):
+                model = experiment.compare_models(
+                    include=self.profile.include.get(task_type), turbo=self.profile.turbo,
+                    budget_time=self.profile.budget_time
+                )
+            grid = experiment.pull()
+            self.last_timings['models'] = self._model_timings(grid)
+            logger.info(f"Modelo de {'classificação' if task_type == 'classification' else 'regressão'} "
+                        "treinado com sucesso.")
+        self.last_timings['train_s'] = time.perf_counter() - start
+        self.model = model
 
-        # Salvar métricas se for regressão ou classificação
+        # Métricas e pipeline completo seguem para o registro de modelos (em vez de JSON soltos em views/)
         if task_type in ["classification", "regression"]:
             try:
-                metrics_path = f"views/{task_type}_metrics.json"
-                save_model_metrics(df[target], preds['Label'], metrics_path)
-                logger.info(f"Métricas salvas em {metrics_path}")
+                # Métricas no holdout separado pelo setup, não no frame de treino inteiro
+                with span("pycaret.predict_model", task=task_type):
+                    preds = experiment.predict_model(model, verbose=False)
+                label = 'prediction_label' if 'prediction_label' in preds.columns else 'Label'
+                self.last_predictions = (preds[target].to_numpy(), preds[label].to_numpy())
+                self.last_metrics = compute_model_metrics(preds[target], preds[label])
+                if task_type == "regression":
+                    # R² médio da validação cruzada do melhor modelo (primeira linha da grade do compare_models)
+                    self.last_metrics['R2_cv'] = float(grid.iloc[0]['R2'])
+                logger.info(f"Métricas calculadas: {self.last_metrics}")
             except Exception as e:
-                logger.error(f"Erro ao salvar métricas: {e}")
+                logger.error(f"Erro ao calcular métricas: {e}")
 
+            os.makedirs(PYCARET_ARTIFACT_DIR, exist_ok=True)
+            self.last_pipeline, _ = experiment.save_model(
+                model, os.path.join(PYCARET_ARTIFACT_DIR, f"pycaret_{task_type}"), verbose=False
+            )
+        else:
+            self.last_pipeline = model
+
+        self.save_timings(task_type)
         print(f"Best {task_type.capitalize()} Model:", model)
         return model
+
+    @staticmethod
+    def _model_timings(grid: pd.DataFrame) -> list:
+        """Uma linha por modelo avaliado no compare_models: tempo de treino (TT) e métricas de CV."""
+        timings = []
+        for name, row in grid.iterrows():
+            entry = {'model_id': name, 'model': row.get('Model', name), 'train_s': float(row.get('TT (Sec)', np.nan))}
+            entry.update({metric: float(value) for metric, value in row.items()
+                          if metric not in ('Model', 'TT (Sec)') and isinstance(value, (int, float, np.number))})
+            timings.append(entry)
+        return timings
+
+    def save_timings(self, task_type: str) -> str:
+        """Grava os tempos do último treino (setup, compare_models e por modelo) para ajustar os perfis."""
+        os.makedirs(PYCARET_ARTIFACT_DIR, exist_ok=True)
+        path = os.path.join(PYCARET_ARTIFACT_DIR, f"pycaret_timings_{task_type}_{self.profile.name}.json")
+        with open(path, 'w') as f:
+            json.dump(self.last_timings, f, indent=4)
+        logger.info(f"Tempos do PyCaret salvos em {path}")
+        return path
+
+    def figure_jobs(self, save_dir: str = "views") -> list:
+        """
+        Gráficos do último treino (resíduos na regressão, matriz de confusão na classificação) a partir
+        das predições no holdout, para o FigureRenderer desenhar fora do processo de treino.
+        """
+        from models.service.figure_renderer import residuals_job, confusion_matrix_job
+
+        if self.last_predictions is None:
+            return []
+        task_type = self.experiment_key[3]
+        output = os.path.join(save_dir, f"{task_type}_model_plot.png")
+        if task_type == "regression":
+            return [residuals_job(*self.last_predictions, output)]
+        return [confusion_matrix_job(*self.last_predictions, output)]
+
+    def plot(self, plot_type: str = None, save_dir: str = "views"):
+        """Gera um gráfico do PyCaret para o último modelo usando o experimento em cache (sem refazer o setup)."""
+        if self.experiment is None or self.model is None:
+            logger.error("Nenhum experimento treinado para gerar gráficos.")
+            return None
+        import matplotlib
+        matplotlib.use("Agg")  # sem janela: os hosts de treino não têm display
+        task_type = self.experiment_key[3]
+        plot_type = plot_type or {'classification': 'confusion_matrix', 'regression': 'residuals',
+                                  'clustering': 'cluster'}[task_type]
+        try:
+            logger.info("Gerando gráfico do modelo...")
+            os.makedirs(save_dir, exist_ok=True)
+            with span("pycaret.plot_model", plot=plot_type):
+                model_plot_path = self.experiment.plot_model(self.model, plot=plot_type, save=save_dir)
+            logger.info(f"Gráfico do modelo salvo como {model_plot_path}")
+            return model_plot_path
+        except Exception as e:
+            logger.error(f"Erro ao gerar gráfico do modelo: {e}")
+            return None
@@ -0,0 +1,200 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import pandas as pd
+from models.logs.logger import logger
+from models.logs.tracing import span
+from models.service.model_adapter import build_candidates
+from models.service.model_search import successive_halving_search, feature_matrix, DEFAULT_MAX_FITS
+
+DEFAULT_SEGMENT_COLUMNS = ('brand',)
+# Segmentos menores que isto não ganham modelo próprio: suas listagens vão para o modelo global
+MIN_SEGMENT_ROWS = 500
+MIN_SEGMENT_FITS = 2
+SMALL_SEGMENT_CV = 3
+SMALL_SEGMENT_ROWS = 2000
+
+
+class SegmentedModel:
+    """
+    Modelo de roteamento: um regressor por segmento (ex.: marca ou marca x modelo) e um modelo global
+    para o resto.
+
+    O segmento de cada linha sai das próprias features pré-processadas: a codificação por alvo dá a cada
+    marca/modelo um valor fixo, então a mesma listagem cai sempre no mesmo segmento, em qualquer
+    chamada de predict (servidor, SHAP, registro). Valores nunca vistos (marcas novas recebem a média
+    global) vão para o modelo global.
+    """
+
+    def __init__(self, feature_names: list, segment_columns: list, routes: dict, fallback, labels: dict = None,
+                 scores: dict = None):
+        self.feature_names = list(feature_names)
+        self.segment_columns = list(segment_columns)
+        self.routes = routes
+        self.fallback = fallback
+        self.labels = labels or {}
+        self.scores = scores or {}
+
+    def segment_keys(self, X: pd.DataFrame) -> pd.Series:
+        """Chave (tupla dos valores codificados, em float32) de cada linha."""
+        values = X[self.segment_columns].to_numpy(dtype=np.float32)
+        return pd.Series(list(map(tuple, values.tolist())), index=X.index)
+
+    def predict(self, X) -> np.ndarray:
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(np.asarray(X), columns=self.feature_names)
+        predictions = np.empty(len(X), dtype=float)
+        groups = pd.RangeIndex(len(X)).groupby(self.segment_keys(X).to_numpy())
+        for key, positions in groups.items():
+            model = self.routes.get(key, self.fallback)
+            predictions[positions] = np.asarray(model.predict(X.iloc[positions]), dtype=float).ravel()
+        return predictions
+
+    def __repr__(self) -> str:
+        return f"SegmentedModel({len(self.routes)} segmentos por {self.segment_columns} + global)"
+
+
+def segment_budget(n_rows: int, largest: int, max_fits: float, min_fits: float = MIN_SEGMENT_FITS) -> float:
+    """
+    Orçamento da busca de um segmento, proporcional ao tamanho: o maior segmento usa `max_fits`
+    ajustes completos e os pequenos, que têm pouco dado para distinguir configurações, usam menos.
+    """
+    return max(min_fits, max_fits * n_rows / largest)
+
+
+def _search_segment(X_all: np.ndarray, y_all: np.ndarray, task: dict):
+    rows = task['rows']
+    # Só as linhas do segmento são copiadas; o modelo global usa a matriz compartilhada diretamente
+    X = pd.DataFrame(X_all if rows is None else X_all[rows], columns=task['columns'], copy=False)
+    y = pd.Series(y_all if rows is None else y_all[rows])
+    cv = SMALL_SEGMENT_CV if len(X) < SMALL_SEGMENT_ROWS else 5
+    return successive_halving_search(build_candidates(), X, y, max_fits=task['max_fits'], cv=cv, n_jobs=1)
+
+
+def _fit_segment(task: dict) -> dict:
+    """Ajusta um segmento num processo do pool, lendo X e y da memória compartilhada."""
+    start = time.perf_counter()
+    x_block, y_block = SharedMemory(name=task['x_name']), SharedMemory(name=task['y_name'])
+    try:
+        X_all = np.ndarray(task['x_shape'], dtype=np.float32, buffer=x_block.buf)
+        y_all = np.ndarray(task['x_shape'][:1], dtype=np.float64, buffer=y_block.buf)
+        with span("segments.fit", segment=task['label'], rows=task['n_rows'], max_fits=task['max_fits']):
+            result = _search_segment(X_all, y_all, task)
+        del X_all, y_all  # as views precisam sumir antes de fechar os blocos
+    finally:
+        x_block.close()
+        y_block.close()
+    logger.info(f"Segmento {task['label']}: {task['n_rows']} linhas, {result.best_name} R² CV {result.best_score:.4f}")
+    return {'key': task['key'], 'label': task['label'], 'rows': task['n_rows'], 'model': result.best_model,
+            'name': result.best_name, 'score': result.best_score, 'max_fits': task['max_fits'], 'y_var': task['y_var'],
+            'seconds': time.perf_counter() - start}
+
+
+def _shared_copy(array: np.ndarray) -> SharedMemory:
+    block = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block
+
+
+def train_segmented(X: pd.DataFrame, y: pd.Series, by: tuple = DEFAULT_SEGMENT_COLUMNS,
+                    max_fits: float = DEFAULT_MAX_FITS, min_segment_rows: int = MIN_SEGMENT_ROWS,
+                    max_workers: int = None, labels: pd.Series = None):
+    """
+    Treina um modelo por segmento (valores das colunas `by`) mais um modelo global de reserva.
+
+    X e y vão uma única vez para a memória compartilhada; cada segmento é ajustado num processo do
+    pool, que copia só as suas linhas. A busca de cada segmento tem orçamento proporcional ao tamanho
+    (segment_budget) e os maiores são submetidos primeiro. `labels` (opcional, alinhado a X) dá nomes
+    legíveis aos segmentos, ex.: a marca original.
+
+    Retorna (SegmentedModel, relatório por segmento).
+    """
+    missing = [col for col in by if col not in X.columns]
+    if missing:
+        raise ValueError(f"Colunas de segmentação ausentes em X: {missing}")
+
+    model = SegmentedModel(X.columns, by, routes={}, fallback=None)
+    keys = model.segment_keys(X).to_numpy()
+    sizes = pd.Series(keys).value_counts()
+    segments = sizes[sizes >= min_segment_rows]
+    logger.info(f"{len(sizes)} segmentos por {list(by)}; {len(segments)} com pelo menos {min_segment_rows} linhas "
+                f"({int(segments.sum())} de {len(X)} linhas); o resto usa o modelo global.")
+
+    positions = pd.RangeIndex(len(X)).groupby(keys)
+    names = {}
+    if labels is not None:
+        labels = pd.Series(np.asarray(labels, dtype=object))
+        names = {key: labels.iloc[positions[key]].mode().iloc[0] for key in segments.index}
+    base = {'columns': X.columns.tolist(), 'x_shape': (len(X), X.shape[1])}
+    y_values = np.asarray(y, dtype=np.float64)
+    tasks = [{**base, 'key': None, 'label': 'global', 'rows': None, 'n_rows': len(X), 'max_fits': max_fits,
+              'y_var': float(y_values.var())}]
+    largest = int(segments.max()) if len(segments) else len(X)
+    for key, n_rows in segments.items():
+        rows = np.asarray(positions[key])
+        tasks.append({**base, 'key': key, 'label': str(names.get(key, key)), 'rows': rows, 'n_rows': int(n_rows),
+                      'max_fits': round(segment_budget(n_rows, largest, max_fits), 2),
+                      'y_var': float(y_values[rows].var())})
+    tasks.sort(key=lambda task: -task['n_rows'] * task['max_fits'])
+
+    x_block = _shared_copy(feature_matrix(X))
+    y_block = _shared_copy(y_values)
+    try:
+        workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_fit_segment, {**task, 'x_name': x_block.name, 'y_name': y_block.name})
+                       for task in tasks]
+            results = [future.result() for future in futures]
+    finally:
+        for block in (x_block, y_block):
+            block.close()
+            block.unlink()
+
+    for result in results:
+        if result['key'] is None:
+            model.fallback = result['model']
+        else:
+            model.routes[result['key']] = result['model']
+        model.labels[result['key']] = result['label']
+        model.scores[result['key']] = result['score']
+
+    report = sorted(({k: v for k, v in result.items() if k != 'model'} for result in results),
+                    key=lambda r: -r['rows'])
+    return model, report
+
+
+def weighted_score(report: list) -> float:
+    """
+    R² CV do modelo segmentado na escala do dataset inteiro, comparável ao de um modelo global.
+    O R² de cada segmento é relativo à variância do alvo dentro dele: o erro quadrático de cada um é
+    (1 - R²) x variância, somado pelas linhas que ele atende (o global fica com as que sobram).
+    """
+    segments = [r for r in report if r['key'] is not None]
+    fallback = next(r for r in report if r['key'] is None)
+    total_rows, total_var = fallback['rows'], fallback['y_var']
+    remaining = total_rows - sum(r['rows'] for r in segments)
+    squared_error = sum(r['rows'] * (1 - r['score']) * r['y_var'] for r in segments)
+    squared_error += remaining * (1 - fallback['score']) * total_var
+    return 1 - squared_error / (total_rows * total_var)
+
+
+def run_segmented(csv_path: str, target: str = 'price', by: tuple = DEFAULT_SEGMENT_COLUMNS, registry=None,
+                  **options):
+    """
+    Lê o dataset, pré-processa e treina/registra o modelo segmentado. Os nomes dos segmentos no
+    relatório vêm das colunas originais (ex.: "Rolex / Submariner"). Retorna o relatório por segmento.
+    """
+    from models.service.data_preprocessor import preprocess_data, DROP_COLUMNS
+    from models.service.dataset_cache import read_dataset
+    from models.service.model_registry import ModelRegistry
+    from models.service.model_service import build_segmented_model
+
+    data = read_dataset(csv_path, exclude=DROP_COLUMNS)
+    X, y, preprocessor = preprocess_data(data, target)
+    labels = data.loc[y.index, list(by)].astype(str).agg(" / ".join, axis=1)
+    del data
+    _, report = build_segmented_model(X, y, by=tuple(by), registry=registry or ModelRegistry(),
+                                      preprocessor=preprocessor, labels=labels, **options)
+    return report
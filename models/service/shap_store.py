@@ -0,0 +1,309 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from models.logs.logger import logger
+from models.logs.tracing import span
+
+SHAP_STORE_DIR = "models/cache/shap"
+VALUE_DTYPE = np.float32
+# Linhas explicadas e gravadas por vez: limita a memória e deixa o progresso salvo se a construção parar
+DEFAULT_BUILD_CHUNK = 10_000
+# Posição livre no índice por id
+NO_SLOT = -1
+# Linhas do dataset resumidas no background do explainer agnóstico
+BACKGROUND_ROWS = 5000
+
+
+def store_key(version: str, data_fingerprint: str = None) -> str:
+    """
+    Diretório do armazenamento: versão do registro + fingerprint dos dados em que ela foi explicada.
+    Não usa o hash do modelo: o objeto em memória e o recarregado com mmap têm hashes diferentes.
+    """
+    return f"{version}-{data_fingerprint[:16]}" if data_fingerprint else version
+
+
+class ShapStore:
+    """
+    Valores SHAP persistidos como arrays mapeados em memória, um diretório por (versão, dados):
+
+      - values.f32 / data.f32: matriz linhas x features dos valores SHAP e das features explicadas;
+      - base.f64 / ids.i64: valor base e id da listagem (posição no dataset) de cada linha;
+      - index.i64: índice direto id -> linha, para a busca em tempo constante;
+      - background.f32: background do explainer agnóstico (modelos que não são árvores);
+      - meta.json: nomes das features e número de linhas gravadas.
+
+    Novas linhas são acrescentadas ao fim dos arquivos; o meta.json é gravado por último, então
+    uma escrita interrompida nunca aparece para os leitores.
+    """
+
+    def __init__(self, path: str, feature_names: list = None):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        elif feature_names is None:
+            raise FileNotFoundError(f"Armazenamento SHAP inexistente em {path}.")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.meta = {'feature_names': list(feature_names), 'rows': 0, 'next_id': 0}
+            self._save_meta()
+        self._arrays = {}
+
+    @classmethod
+    def open(cls, entry, feature_names: list = None, root: str = SHAP_STORE_DIR) -> "ShapStore":
+        """Armazenamento de uma versão registrada (ModelVersion)."""
+        return cls(os.path.join(root, store_key(entry.version, entry.data_fingerprint)), feature_names)
+
+    @property
+    def feature_names(self) -> list:
+        return self.meta['feature_names']
+
+    def __len__(self) -> int:
+        return self.meta['rows']
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _save_meta(self):
+        with open(self._file("meta.json.tmp"), "w") as f:
+            json.dump(self.meta, f, indent=4)
+        os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+
+    def _array(self, name: str, dtype, width: int = None) -> np.ndarray:
+        """Mapa somente leitura das linhas já gravadas (refeito quando o número de linhas muda)."""
+        rows = len(self) if name != "index.i64" else self.meta.get('index_size', 0)
+        cached = self._arrays.get(name)
+        if cached is None or cached.shape[0] != rows:
+            shape = (rows, width) if width else (rows,)
+            if rows == 0:
+                cached = np.empty(shape, dtype=dtype)
+            else:
+                cached = np.memmap(self._file(name), dtype=dtype, mode="r", shape=shape)
+            self._arrays[name] = cached
+        return cached
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._array("values.f32", VALUE_DTYPE, len(self.feature_names))
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._array("data.f32", VALUE_DTYPE, len(self.feature_names))
+
+    @property
+    def base_values(self) -> np.ndarray:
+        return self._array("base.f64", np.float64)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._array("ids.i64", np.int64)
+
+    def slot(self, listing_id: int) -> int:
+        """Linha do armazenamento com a explicação da listagem, ou NO_SLOT."""
+        index = self._array("index.i64", np.int64)
+        if not 0 <= listing_id < len(index):
+            return NO_SLOT
+        slot = int(index[listing_id])
+        return slot if slot < len(self) else NO_SLOT
+
+    def __contains__(self, listing_id: int) -> bool:
+        return self.slot(int(listing_id)) != NO_SLOT
+
+    def missing(self, ids) -> np.ndarray:
+        """Ids ainda sem explicação gravada."""
+        ids = np.asarray(ids, dtype=np.int64)
+        index = self._array("index.i64", np.int64)
+        known = np.zeros(len(ids), dtype=bool)
+        inside = (ids >= 0) & (ids < len(index))
+        slots = index[ids[inside]]
+        known[inside] = (slots != NO_SLOT) & (slots < len(self))
+        return ids[~known]
+
+    def background(self):
+        path = self._file("background.f32")
+        if not os.path.exists(path):
+            return None
+        return np.fromfile(path, dtype=VALUE_DTYPE).reshape(-1, len(self.feature_names))
+
+    def save_background(self, background: np.ndarray):
+        np.asarray(background, dtype=VALUE_DTYPE).tofile(self._file("background.f32"))
+
+    def append(self, ids, values, base_values, data) -> int:
+        """Acrescenta explicações (ids >= 0). Um id já gravado passa a apontar para a linha nova."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return 0
+        if (ids < 0).any():
+            raise ValueError("Ids de listagem devem ser inteiros não negativos.")
+        values = np.asarray(values, dtype=VALUE_DTYPE).reshape(len(ids), -1)
+        if values.shape[1] != len(self.feature_names):
+            raise ValueError(f"Esperadas {len(self.feature_names)} features, recebidas {values.shape[1]}.")
+
+        start = len(self)
+        columns = [("values.f32", values), ("data.f32", np.asarray(data, dtype=VALUE_DTYPE)),
+                   ("base.f64", np.asarray(base_values, dtype=np.float64)), ("ids.i64", ids)]
+        for name, array in columns:
+            with open(self._file(name), "ab") as f:
+                f.seek(start * array.itemsize * (array.size // len(ids)))
+                f.truncate()  # descarta o que uma escrita interrompida deixou além do meta.json
+                f.write(np.ascontiguousarray(array).tobytes())
+
+        old_size = self.meta.get('index_size', 0)
+        index_size = max(old_size, int(ids.max()) + 1)
+        with open(self._file("index.i64"), "ab") as f:
+            f.seek(old_size * 8)
+            f.truncate()
+            f.write(np.full(index_size - old_size, NO_SLOT, dtype=np.int64).tobytes())
+        index = np.memmap(self._file("index.i64"), dtype=np.int64, mode="r+", shape=(index_size,))
+        index[ids] = np.arange(start, start + len(ids))
+        index.flush()
+        del index
+
+        self.meta.update(rows=start + len(ids), index_size=index_size,
+                         next_id=max(self.meta['next_id'], int(ids.max()) + 1))
+        self._save_meta()
+        return len(ids)
+
+    def lookup(self, listing_id: int, top: int = None) -> dict:
+        """
+        Explicação de uma listagem em tempo constante (leitura direta da linha no mapa em memória):
+        valor base, previsão do modelo (base + soma das contribuições) e as contribuições ordenadas
+        pelo valor absoluto. Retorna None se a listagem não foi explicada.
+        """
+        slot = self.slot(int(listing_id))
+        if slot == NO_SLOT:
+            return None
+        values, data = self.values[slot], self.data[slot]
+        order = np.argsort(-np.abs(values))[:top]
+        base = float(self.base_values[slot])
+        return {
+            'listing_id': int(listing_id),
+            'base_value': base,
+            'prediction': base + float(values.sum(dtype=np.float64)),
+            'contributions': [{'feature': self.feature_names[i], 'value': float(data[i]), 'shap': float(values[i])}
+                              for i in order],
+        }
+
+    def explanation(self):
+        """Todas as linhas como shap.Explanation (sem cópia: os arrays continuam mapeados), ex.: para gráficos."""
+        import shap
+        return shap.Explanation(values=self.values, base_values=self.base_values, data=self.data,
+                                feature_names=self.feature_names)
+
+
+def _explain(model, X: pd.DataFrame, store: ShapStore, n_jobs: int):
+    from models.service.powershap_adapter import explain_rows, is_tree_model, background_sample
+
+    background = None
+    if not is_tree_model(model):
+        background = store.background()
+        if background is None:
+            if len(X) < BACKGROUND_ROWS:
+                raise ValueError(f"O armazenamento {store.path} não tem background e {len(X)} linhas não bastam "
+                                 "para resumir um; use ensure_background com o dataset.")
+            background = background_sample(X)
+            store.save_background(background)
+    return explain_rows(model, X, background=background, n_jobs=n_jobs)
+
+
+def build_shap_store(store: ShapStore, model, X: pd.DataFrame, ids, chunk_size: int = DEFAULT_BUILD_CHUNK,
+                     n_jobs: int = -1) -> int:
+    """
+    Explica as linhas de X cujos ids ainda não estão no armazenamento, em blocos de `chunk_size`
+    gravados à medida que ficam prontos: rodar de novo retoma de onde parou. Retorna quantas
+    linhas foram explicadas.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    pending = np.flatnonzero(np.isin(ids, store.missing(ids)))
+    if len(pending) == 0:
+        logger.info(f"Armazenamento SHAP {store.path} completo ({len(store)} linhas).")
+        return 0
+    logger.info(f"Explicando {len(pending)} de {len(ids)} linhas para o armazenamento SHAP {store.path}.")
+    for start in range(0, len(pending), chunk_size):
+        positions = pending[start:start + chunk_size]
+        chunk = X.iloc[positions]
+        with span("shap_store.build", inputs=chunk):
+            values, base_values = _explain(model, chunk, store, n_jobs)
+            store.append(ids[positions], values, base_values, chunk.to_numpy())
+    return len(pending)
+
+
+def explain_new_listings(store: ShapStore, model, X_new: pd.DataFrame, ids=None, first_id: int = 0) -> list:
+    """
+    Explica só as listagens novas e as acrescenta ao armazenamento, sem recalcular o resto.
+    Sem `ids`, recebem ids depois do maior já gravado e de `first_id` (o número de linhas do
+    dataset, para não colidir com listagens dele ainda não explicadas). Retorna as explicações.
+    """
+    if ids is None:
+        start = max(store.meta['next_id'], first_id)
+        ids = np.arange(start, start + len(X_new))
+    values, base_values = _explain(model, X_new, store, n_jobs=1)
+    store.append(ids, values, base_values, X_new.to_numpy())
+    return [store.lookup(listing_id) for listing_id in ids]
+
+
+def ensure_background(store: ShapStore, model, preprocessor, dataset_path: str):
+    """Modelos que não são árvores: resume uma amostra do dataset como background, se ainda não houver."""
+    from models.service.powershap_adapter import is_tree_model, background_sample
+    from models.service.data_preprocessor import DROP_COLUMNS
+    from models.service.dataset_cache import read_dataset
+
+    if is_tree_model(model) or store.background() is not None:
+        return
+    data = read_dataset(dataset_path, exclude=DROP_COLUMNS)
+    sample = data.sample(n=min(BACKGROUND_ROWS, len(data)), random_state=123)
+    store.save_background(background_sample(preprocessor.transform(sample)))
+
+
+def open_registry_store(target: str = 'price', version: str = "best", registry=None):
+    """Modelo, pré-processador e armazenamento SHAP de uma versão do registro."""
+    from models.service.inference_adapter import unwrap_model
+    from models.service.model_registry import ModelRegistry
+
+    model, preprocessor, entry = (registry or ModelRegistry()).load(target, version)
+    if preprocessor is None:
+        raise ValueError(f"A versão {entry.version} foi registrada sem pré-processador.")
+    model = unwrap_model(model)
+    store = ShapStore.open(entry, preprocessor.output_columns)
+    return model, preprocessor, store
+
+
+def explain_listing(listing_id: int, dataset_path: str, target: str = 'price', version: str = "best",
+                    registry=None, top: int = None) -> dict:
+    """
+    Explicação de uma listagem do dataset. Se ela já está no armazenamento, é só uma leitura;
+    senão, só essa linha é pré-processada, explicada e acrescentada.
+    """
+    from models.service.dataset_cache import read_window
+
+    model, preprocessor, store = open_registry_store(target, version, registry)
+    explanation = store.lookup(listing_id, top)
+    if explanation is None:
+        ensure_background(store, model, preprocessor, dataset_path)
+        listing = read_window(dataset_path, listing_id, 1)
+        if listing.empty:
+            raise KeyError(f"Listagem {listing_id} fora do dataset {dataset_path}.")
+        explain_new_listings(store, model, preprocessor.transform(listing), ids=[listing_id])
+        explanation = store.lookup(listing_id, top)
+    return explanation
+
+
+def explain_listings_file(listings_path: str, dataset_path: str, target: str = 'price', version: str = "best",
+                          registry=None, top: int = None) -> list:
+    """
+    Explica listagens novas (CSV ou JSON com uma lista de objetos) e as acrescenta ao armazenamento,
+    com ids a partir do fim de `dataset_path`.
+    """
+    from models.service.dataset_cache import dataset_rows
+
+    model, preprocessor, store = open_registry_store(target, version, registry)
+    if listings_path.endswith(".json"):
+        listings = pd.read_json(listings_path, orient="records")
+    else:
+        listings = pd.read_csv(listings_path)
+    ensure_background(store, model, preprocessor, dataset_path)
+    explanations = explain_new_listings(store, model, preprocessor.transform(listings),
+                                        first_id=dataset_rows(dataset_path))
+    return [store.lookup(explanation['listing_id'], top) for explanation in explanations]
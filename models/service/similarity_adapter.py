@@ -0,0 +1,240 @@
+import os
+import json
+import joblib
+import numpy as np
+from sklearn.neighbors import BallTree, KDTree
+from ports.similarity_port import SimilarityPort
+from models.logs.logger import logger
+from models.logs.tracing import span
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+BACKENDS = ("auto", "kdtree", "balltree", "faiss")
+# Com o faiss instalado, o "auto" usa o índice aproximado (HNSW) a partir deste tamanho de catálogo
+APPROXIMATE_MIN_ROWS = 2_000_000
+# Acima disto a KD-tree perde para a Ball-tree
+KDTREE_MAX_DIMS = 20
+LEAF_SIZE = 40
+HNSW_NEIGHBORS = 32
+# O buffer de listagens novas vira parte da árvore quando passa desta fração da base (e do mínimo)
+MERGE_FRACTION = 0.1
+MIN_MERGE_ROWS = 10_000
+# Consultas comparadas ao buffer por vez (limita a matriz de distâncias consultas x buffer)
+QUERY_BLOCK = 256
+
+
+def choose_backend(n_rows: int, n_dims: int, backend: str = "auto") -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de similaridade inválido: {backend}. Opções: {BACKENDS}")
+    if backend == "faiss" and not FAISS_AVAILABLE:
+        raise ImportError("O backend faiss exige o pacote faiss (faiss-cpu).")
+    if backend != "auto":
+        return backend
+    if FAISS_AVAILABLE and n_rows >= APPROXIMATE_MIN_ROWS:
+        return "faiss"
+    return "kdtree" if n_dims <= KDTREE_MAX_DIMS else "balltree"
+
+
+def _read_array(path: str, dtype, rows: int, width: int = None) -> np.ndarray:
+    """As `rows` primeiras linhas de um arquivo binário (o que vier depois é escrita interrompida)."""
+    if rows == 0:
+        return np.empty((0, width) if width else (0,), dtype=dtype)
+    count = rows * (width or 1)
+    array = np.fromfile(path, dtype=dtype, count=count)
+    return array.reshape(rows, width) if width else array
+
+
+def _append_array(path: str, array: np.ndarray, start_rows: int):
+    row_bytes = array.itemsize * (array.size // max(len(array), 1))
+    with open(path, "ab") as f:
+        f.seek(start_rows * row_bytes)
+        f.truncate()
+        f.write(np.ascontiguousarray(array).tobytes())
+
+
+class NeighborIndexAdapter(SimilarityPort):
+    """
+    Índice de vizinhos mais próximos das listagens no espaço das features pré-processadas.
+
+    As features são padronizadas (média e desvio da base) para que cada uma pese o mesmo na
+    distância euclidiana. Backends:
+
+      - kdtree / balltree (scikit-learn, exatos): a árvore cobre as linhas da construção; as
+        listagens acrescentadas depois ficam num buffer consultado por força bruta e mescladas
+        ao resultado da árvore. Quando o buffer passa de MERGE_FRACTION da base, a árvore é
+        reconstruída com tudo.
+      - faiss (HNSW, aproximado, opcional): as listagens novas entram direto no índice.
+
+    Arquivos em `path`: meta.json (gravado por último), tree.joblib ou faiss.index, ids.i64 e,
+    nas árvores, delta.f32 / delta_ids.i64 com o buffer.
+    """
+
+    def __init__(self, path: str, meta: dict, index, ids: np.ndarray, delta: np.ndarray = None,
+                 delta_ids: np.ndarray = None):
+        self.path = path
+        self.meta = meta
+        self.index = index
+        self.ids = ids
+        self.mean = np.asarray(meta['mean'], dtype=np.float32)
+        self.scale = np.asarray(meta['scale'], dtype=np.float32)
+        width = len(meta['feature_names'])
+        self.delta = delta if delta is not None else np.empty((0, width), dtype=np.float32)
+        self.delta_ids = delta_ids if delta_ids is not None else np.empty(0, dtype=np.int64)
+
+    @property
+    def backend(self) -> str:
+        return self.meta['backend']
+
+    @property
+    def feature_names(self) -> list:
+        return self.meta['feature_names']
+
+    @property
+    def next_id(self) -> int:
+        return self.meta['next_id']
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.delta_ids)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _scaled(self, features) -> np.ndarray:
+        features = np.asarray(features, dtype=np.float32).reshape(-1, len(self.feature_names))
+        return (features - self.mean) / self.scale
+
+    @staticmethod
+    def _build_index(backend: str, scaled: np.ndarray):
+        if backend == "faiss":
+            index = faiss.IndexHNSWFlat(scaled.shape[1], HNSW_NEIGHBORS)
+            index.add(scaled)
+            return index
+        tree = KDTree if backend == "kdtree" else BallTree
+        return tree(scaled, leaf_size=LEAF_SIZE)
+
+    @classmethod
+    def build(cls, path: str, ids, features, feature_names: list, backend: str = "auto") -> "NeighborIndexAdapter":
+        """Constrói o índice sobre `features` (linhas x features, na ordem de `ids`) e o grava em `path`."""
+        features = np.asarray(features, dtype=np.float32)
+        backend = choose_backend(len(features), features.shape[1], backend)
+        scale = features.std(axis=0)
+        meta = {'backend': backend, 'feature_names': list(feature_names), 'mean': features.mean(axis=0).tolist(),
+                'scale': np.where(scale > 0, scale, 1.0).tolist(), 'delta_rows': 0}
+        ids = np.asarray(ids, dtype=np.int64)
+        meta['next_id'] = int(ids.max()) + 1 if len(ids) else 0
+        adapter = cls(path, meta, None, ids)
+        with span("similarity.build", rows=len(ids), backend=backend):
+            adapter.index = cls._build_index(backend, adapter._scaled(features))
+        logger.info(f"Índice de similaridade ({backend}) construído com {len(ids)} listagens.")
+        adapter.save()
+        return adapter
+
+    @classmethod
+    def load(cls, path: str) -> "NeighborIndexAdapter":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta['backend'] == "faiss":
+            index = faiss.read_index(os.path.join(path, "faiss.index"))
+        else:
+            index = joblib.load(os.path.join(path, "tree.joblib"), mmap_mode="r")
+        ids = _read_array(os.path.join(path, "ids.i64"), np.int64, meta['rows'])
+        width = len(meta['feature_names'])
+        delta = _read_array(os.path.join(path, "delta.f32"), np.float32, meta['delta_rows'], width)
+        delta_ids = _read_array(os.path.join(path, "delta_ids.i64"), np.int64, meta['delta_rows'])
+        logger.info(f"Índice de similaridade carregado de {path} ({len(ids) + len(delta_ids)} listagens).")
+        return cls(path, meta, index, ids, delta, delta_ids)
+
+    def _save_meta(self):
+        self.meta.update(rows=len(self.ids), delta_rows=len(self.delta_ids))
+        with open(self._file("meta.json.tmp"), "w") as f:
+            json.dump(self.meta, f, indent=4)
+        os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+
+    def save(self) -> str:
+        """Grava o índice inteiro (na construção e quando o buffer é incorporado à árvore)."""
+        os.makedirs(self.path, exist_ok=True)
+        if self.backend == "faiss":
+            faiss.write_index(self.index, self._file("faiss.index"))
+        else:
+            joblib.dump(self.index, self._file("tree.joblib"))
+        self.ids.tofile(self._file("ids.i64"))
+        self.delta.tofile(self._file("delta.f32"))
+        self.delta_ids.tofile(self._file("delta_ids.i64"))
+        self._save_meta()
+        return self.path
+
+    def add(self, ids, features) -> int:
+        """
+        Acrescenta listagens. Nas árvores, só o buffer cresce (e só ele é gravado, ao fim dos
+        arquivos); no faiss, as linhas entram direto no índice.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return 0
+        scaled = self._scaled(features)
+        self.meta['next_id'] = max(self.next_id, int(ids.max()) + 1)
+        if self.backend == "faiss":
+            self.index.add(scaled)
+            self.ids = np.concatenate([self.ids, ids])
+            self.save()
+            return len(ids)
+
+        start = len(self.delta_ids)
+        raw = np.asarray(features, dtype=np.float32).reshape(len(ids), -1)
+        self.delta = np.vstack([self.delta, raw])
+        self.delta_ids = np.concatenate([self.delta_ids, ids])
+        if len(self.delta_ids) >= max(MIN_MERGE_ROWS, MERGE_FRACTION * len(self.ids)):
+            self._merge()
+        else:
+            _append_array(self._file("delta.f32"), raw, start)
+            _append_array(self._file("delta_ids.i64"), ids, start)
+            self._save_meta()
+        return len(ids)
+
+    def _merge(self):
+        """Reconstrói a árvore com a base e o buffer (custo amortizado pelo tamanho mínimo do buffer)."""
+        with span("similarity.merge", rows=len(self), delta_rows=len(self.delta_ids)):
+            base = np.asarray(self.index.get_arrays()[0], dtype=np.float32)
+            self.index = self._build_index(self.backend, np.vstack([base, self._scaled(self.delta)]))
+        logger.info(f"Buffer de {len(self.delta_ids)} listagens incorporado ao índice ({len(self)} no total).")
+        self.ids = np.concatenate([self.ids, self.delta_ids])
+        self.delta = self.delta[:0]
+        self.delta_ids = self.delta_ids[:0]
+        self.save()
+
+    def query(self, features, k: int) -> tuple:
+        """k vizinhos mais próximos de cada linha de `features`: (distâncias, ids), do mais próximo ao mais distante."""
+        scaled = self._scaled(features)
+        k = min(k, len(self))
+        if self.backend == "faiss":
+            distances, positions = self.index.search(scaled, k)
+            return np.sqrt(np.maximum(distances, 0)), self.ids[positions]
+
+        k_tree = min(k, len(self.ids))
+        distances, positions = self.index.query(scaled, k=k_tree)
+        ids = self.ids[positions]
+        if len(self.delta_ids) == 0:
+            return distances, ids
+
+        # Buffer por força bruta, em blocos de consultas; junta com a árvore e fica com os k melhores
+        delta = self._scaled(self.delta).astype(np.float64)
+        delta_norms = (delta ** 2).sum(axis=1)
+        k_delta = min(k, len(self.delta_ids))
+        delta_distances = np.empty((len(scaled), k_delta))
+        delta_ids = np.empty((len(scaled), k_delta), dtype=np.int64)
+        for start in range(0, len(scaled), QUERY_BLOCK):
+            block = scaled[start:start + QUERY_BLOCK].astype(np.float64)
+            # |a - b|² = |a|² + |b|² - 2ab: uma multiplicação de matrizes em vez do tensor das diferenças
+            squared = (block ** 2).sum(axis=1)[:, None] + delta_norms[None, :] - 2 * block @ delta.T
+            nearest = np.argpartition(squared, k_delta - 1, axis=1)[:, :k_delta]
+            delta_distances[start:start + QUERY_BLOCK] = np.sqrt(np.maximum(np.take_along_axis(squared, nearest, axis=1), 0))
+            delta_ids[start:start + QUERY_BLOCK] = self.delta_ids[nearest]
+
+        all_distances = np.hstack([distances, delta_distances])
+        all_ids = np.hstack([ids, delta_ids])
+        order = np.argsort(all_distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(all_distances, order, axis=1), np.take_along_axis(all_ids, order, axis=1)
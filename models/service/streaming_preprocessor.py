@@ -0,0 +1,351 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from models.logs.logger import logger
+from models.service.dataset_cache import iter_dataset_chunks, COLUMNAR_AVAILABLE
+from models.service.data_preprocessor import (
+    WatchPreprocessor, clean_target, clean_features, DROP_COLUMNS, TOP_MODELS
+)
+
+DEFAULT_CHUNK_SIZE = 200_000
+# Amostra uniforme mantida por coluna numérica para mediana e quantis do RobustScaler.
+# Arquivos com menos linhas que isso produzem exatamente as estatísticas do ajuste em memória.
+RESERVOIR_SIZE = 500_000
+# Mesmos parâmetros do TargetEncoder(smoothing=0.3) de build_column_transformer
+TARGET_SMOOTHING = 0.3
+TARGET_MIN_SAMPLES_LEAF = 20
+OTHER_MODEL = 'Other'
+
+
+class Reservoir:
+    """Amostra uniforme sem reposição de tamanho fixo (bottom-k por chave aleatória)."""
+
+    def __init__(self, capacity: int = RESERVOIR_SIZE, random_state: int = 123):
+        self.capacity = capacity
+        self.rng = np.random.default_rng(random_state)
+        self.values = np.empty(0)
+        self.keys = np.empty(0)
+        self.seen = 0
+        self.missing = 0
+
+    def update(self, values: pd.Series):
+        values = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+        present = values[~np.isnan(values)]
+        self.missing += len(values) - len(present)
+        self.seen += len(present)
+        self.values = np.concatenate([self.values, present])
+        self.keys = np.concatenate([self.keys, self.rng.random(len(present))])
+        if len(self.values) > self.capacity:
+            keep = np.argpartition(self.keys, self.capacity)[:self.capacity]
+            self.values, self.keys = self.values[keep], self.keys[keep]
+
+    def median(self) -> float:
+        return float(np.median(self.values)) if len(self.values) else np.nan
+
+    def imputed_percentiles(self, q: list, fill: float) -> np.ndarray:
+        """Percentis depois da imputação: os ausentes entram como `fill`, na mesma proporção do arquivo."""
+        total = self.seen + self.missing
+        n_fill = int(round(len(self.values) * self.missing / self.seen)) if self.seen else 0
+        if self.seen and len(self.values) == self.seen:
+            n_fill = self.missing  # amostra completa: contagem exata
+        sample = np.concatenate([self.values, np.full(n_fill, fill)]) if total else np.array([fill])
+        return np.percentile(sample, q)
+
+
+class TargetStats:
+    """Soma e contagem do alvo por categoria, acumuladas bloco a bloco."""
+
+    def __init__(self):
+        self.sums = pd.Series(dtype=float)
+        self.counts = pd.Series(dtype=float)
+        self.missing_sum = 0.0
+        self.missing_count = 0
+
+    def update(self, values: pd.Series, y: pd.Series):
+        values = values.astype(object)
+        missing = values.isna().to_numpy()
+        grouped = y[~missing].groupby(values[~missing].to_numpy()).agg(['sum', 'count'])
+        self.sums = self.sums.add(grouped['sum'], fill_value=0)
+        self.counts = self.counts.add(grouped['count'], fill_value=0)
+        self.missing_sum += float(y[missing].sum())
+        self.missing_count += int(missing.sum())
+
+    def mode(self):
+        # SimpleImputer(most_frequent) desempata pelo menor valor
+        if self.counts.empty:
+            return None
+        top = self.counts[self.counts == self.counts.max()]
+        return sorted(top.index)[0]
+
+
+class StreamingColumnTransformer:
+    """
+    Equivalente já ajustado ao ColumnTransformer de build_column_transformer:
+    numéricas com imputação pela mediana + RobustScaler, categóricas com imputação pela moda
+    + TargetEncoder. Construído a partir de estatísticas agregadas em vez de um DataFrame inteiro.
+    """
+
+    def __init__(self, numeric_features: list, categorical_features: list, medians: dict, centers: dict,
+                 scales: dict, modes: dict, encodings: dict, prior: float):
+        self.numeric_features = numeric_features
+        self.categorical_features = categorical_features
+        self.medians = medians
+        self.centers = centers
+        self.scales = scales
+        self.modes = modes
+        self.encodings = encodings
+        self.prior = prior
+
+    def transform(self, X: pd.DataFrame) -> np.ndarray:
+        output = np.empty((len(X), len(self.numeric_features) + len(self.categorical_features)))
+        for i, col in enumerate(self.numeric_features):
+            values = pd.to_numeric(X[col], errors='coerce').fillna(self.medians[col]).to_numpy(dtype=float)
+            output[:, i] = (values - self.centers[col]) / self.scales[col]
+        offset = len(self.numeric_features)
+        for i, col in enumerate(self.categorical_features):
+            values = X[col].astype(object).fillna(self.modes[col])
+            encoded = values.map(self.encodings[col]).astype(float).fillna(self.prior)
+            output[:, offset + i] = encoded.to_numpy()
+        return output
+
+
+def frozen_column_transformer(preprocessor: WatchPreprocessor) -> StreamingColumnTransformer:
+    """Mesma transformação do ColumnTransformer ajustado de um WatchPreprocessor, sem reajustar nada."""
+    fitted = preprocessor.column_transformer
+    if isinstance(fitted, StreamingColumnTransformer):
+        return fitted
+    numeric, categorical = fitted.named_transformers_['num'], fitted.named_transformers_['cat']
+    numeric_features, categorical_features = preprocessor.numeric_features, preprocessor.categorical_features
+    medians = dict(zip(numeric_features, numeric['imputer'].statistics_.astype(float)))
+    centers = dict(zip(numeric_features, numeric['scaler'].center_.astype(float)))
+    scales = dict(zip(numeric_features, numeric['scaler'].scale_.astype(float)))
+    modes = dict(zip(categorical_features, categorical['imputer'].statistics_))
+
+    # O imputer entrega um array: o TargetEncoder identifica as colunas pela posição
+    encoder = categorical['target_encoder']
+    encodings = {}
+    for ordinal in encoder.ordinal_encoder.mapping:
+        codes, values = ordinal['mapping'], encoder.mapping[ordinal['col']]
+        encodings[categorical_features[ordinal['col']]] = {
+            category: float(values[code]) for category, code in codes.items() if not pd.isna(category)
+        }
+    return StreamingColumnTransformer(numeric_features, categorical_features, medians, centers, scales,
+                                      modes, encodings, float(encoder._mean))
+
+
+def _encoding(stats: TargetStats, prior: float) -> dict:
+    weight = expit((stats.counts - TARGET_MIN_SAMPLES_LEAF) / TARGET_SMOOTHING)
+    means = stats.sums / stats.counts
+    return (prior * (1 - weight) + means * weight).to_dict()
+
+
+def _collapse_models(stats: TargetStats, top_models: list) -> TargetStats:
+    """Reagrupa as somas por modelo bruto em top models + 'Other' (ausentes também viram 'Other')."""
+    collapsed = TargetStats()
+    keys = pd.Index([key if key in set(top_models) and key != OTHER_MODEL else OTHER_MODEL
+                     for key in stats.counts.index])
+    collapsed.sums = stats.sums.groupby(keys).sum()
+    collapsed.counts = stats.counts.groupby(keys).sum()
+    if stats.missing_count:
+        collapsed.sums.loc[OTHER_MODEL] = collapsed.sums.get(OTHER_MODEL, 0.0) + stats.missing_sum
+        collapsed.counts.loc[OTHER_MODEL] = collapsed.counts.get(OTHER_MODEL, 0) + stats.missing_count
+    return collapsed
+
+
+def _impute_missing(stats: TargetStats, mode) -> TargetStats:
+    """Ausentes são imputados pela moda antes da codificação: somam na categoria mais frequente."""
+    if not stats.missing_count or mode is None:
+        return stats
+    imputed = TargetStats()
+    imputed.sums, imputed.counts = stats.sums.copy(), stats.counts.copy()
+    imputed.sums.loc[mode] += stats.missing_sum
+    imputed.counts.loc[mode] += stats.missing_count
+    return imputed
+
+
+class StreamingWatchPreprocessor(WatchPreprocessor):
+    """
+    WatchPreprocessor ajustado em duas passadas sobre o CSV, sem carregá-lo inteiro.
+
+    1ª passada: contagem dos modelos (top 30), amostras uniformes das numéricas (mediana e
+    quantis) e somas/contagens do alvo por categoria (TargetEncoder).
+    2ª passada (`transform_file`): grava blocos transformados em disco.
+    Depois de ajustado, `transform` funciona como no WatchPreprocessor (ex.: no servidor), e
+    `update` incorpora novas listagens às estatísticas sem reprocessar o arquivo original.
+    """
+
+    def __init__(self, target: str = 'price', chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 reservoir_size: int = RESERVOIR_SIZE):
+        super().__init__(target)
+        self.chunk_size = chunk_size
+        self.reservoir_size = reservoir_size
+
+    def _chunks(self, path: str):
+        for chunk in iter_dataset_chunks(path, self.chunk_size, exclude=DROP_COLUMNS):
+            chunk = clean_target(chunk, self.target)
+            if not chunk.empty:
+                yield chunk
+
+    def fit_file(self, path: str) -> "StreamingWatchPreprocessor":
+        logger.info(f"Ajuste em blocos de {self.chunk_size} linhas: {path}")
+        return self.fit_chunks(self._chunks(path))
+
+    def fit_transform(self, data: pd.DataFrame):
+        """Ajuste em memória com as mesmas estatísticas agregadas (o resultado fica atualizável)."""
+        data = clean_target(data, self.target)
+        self.fit_chunks([data])
+        return self.transform(data), data[self.target]
+
+    @classmethod
+    def from_fitted(cls, preprocessor: WatchPreprocessor, data: pd.DataFrame) -> "StreamingWatchPreprocessor":
+        """
+        Versão atualizável de um WatchPreprocessor já ajustado. As estatísticas agregadas (para os
+        próximos `update`) vêm de `data`, mas a transformação continua exatamente a ajustada:
+        mesmos top models, medianas, centro/escala e codificações do alvo.
+        """
+        updatable = cls(preprocessor.target)
+        updatable._reset(preprocessor.reference_year)
+        updatable._accumulate([clean_target(data, preprocessor.target)])
+        updatable.top_models = list(preprocessor.top_models)
+        updatable.column_transformer = frozen_column_transformer(preprocessor)
+        return updatable
+
+    def _reset(self, reference_year: int):
+        self.reference_year = reference_year
+        self.feature_columns = None
+        self.reservoirs_, self.target_stats_ = {}, {}
+        self.y_sum_, self.n_rows_ = 0.0, 0
+
+    def fit_chunks(self, chunks) -> "StreamingWatchPreprocessor":
+        """Ajusta do zero a partir de blocos rotulados já com o alvo limpo (clean_target)."""
+        self._reset(pd.Timestamp.now().year)
+        self._accumulate(chunks)
+        if self.n_rows_ == 0:
+            raise ValueError("Dataset vazio após pré-processamento.")
+        self._build_transformer()
+        logger.info(f"Ajuste em blocos concluído: {self.n_rows_} linhas, {len(self.top_models)} top models.")
+        return self
+
+    def update(self, data: pd.DataFrame) -> "StreamingWatchPreprocessor":
+        """
+        Incorpora novas listagens rotuladas às estatísticas (contagens de modelos, somas do alvo por
+        categoria, amostras numéricas) e recalcula top models e codificações, sem rever os dados antigos.
+
+        Medianas e centro/escala das numéricas ficam congeladas: o modelo atualizado por warm start
+        mantém as árvores antigas, que precisam continuar recebendo as numéricas na mesma escala.
+        As amostras numéricas seguem sendo acumuladas para um reajuste completo futuro.
+        """
+        if not self.is_fitted:
+            raise ValueError("StreamingWatchPreprocessor precisa ser ajustado antes de ser atualizado.")
+        data = clean_target(data, self.target)
+        previous = set(self.top_models)
+        self._accumulate([data])
+        self._build_transformer(freeze_numeric=True)
+        entered = [model for model in self.top_models if model not in previous]
+        logger.info(f"Pré-processador atualizado com {len(data)} linhas (total {self.n_rows_}). "
+                    f"Novos top models: {entered}")
+        return self
+
+    def _accumulate(self, chunks):
+        for chunk in chunks:
+            chunk = clean_features(chunk, self.reference_year, top_models=None)
+            X, y = chunk.drop(columns=[self.target]), chunk[self.target]
+            if self.feature_columns is None:
+                self.feature_columns = X.columns.tolist()
+                self.numeric_features = X.select_dtypes(include=[np.number]).columns.tolist()
+                self.categorical_features = X.select_dtypes(include=['object', 'category']).columns.tolist()
+                self.reservoirs_ = {col: Reservoir(self.reservoir_size) for col in self.numeric_features}
+                self.target_stats_ = {col: TargetStats() for col in self.categorical_features}
+
+            for col, reservoir in self.reservoirs_.items():
+                reservoir.update(X[col])
+            for col, col_stats in self.target_stats_.items():
+                col_stats.update(X[col], y)
+            self.y_sum_ += float(y.sum())
+            self.n_rows_ += len(y)
+
+    def _build_transformer(self, freeze_numeric: bool = False):
+        prior = self.y_sum_ / self.n_rows_
+        stats = dict(self.target_stats_)
+        if 'model' in stats:
+            counts = stats['model'].counts
+            # Mesmo critério de top_models_of (mais frequentes); empates em ordem determinística
+            self.top_models = counts.sort_values(ascending=False, kind='stable').index[:TOP_MODELS].tolist()
+            stats['model'] = _collapse_models(stats['model'], self.top_models)
+        else:
+            self.top_models = []
+
+        if freeze_numeric:
+            current = self.column_transformer
+            medians, centers, scales = current.medians, current.centers, current.scales
+        else:
+            medians, centers, scales = self._numeric_scaling()
+
+        modes = {col: col_stats.mode() for col, col_stats in stats.items()}
+        encodings = {col: _encoding(_impute_missing(col_stats, modes[col]), prior)
+                     for col, col_stats in stats.items()}
+
+        self.column_transformer = StreamingColumnTransformer(
+            self.numeric_features, self.categorical_features, medians, centers, scales, modes, encodings, prior
+        )
+
+    def _numeric_scaling(self):
+        """Mediana (imputação) e centro/escala robustos de cada numérica, a partir das amostras."""
+        medians, centers, scales = {}, {}, {}
+        for col, reservoir in self.reservoirs_.items():
+            medians[col] = reservoir.median()
+            q25, q50, q75 = reservoir.imputed_percentiles([25, 50, 75], medians[col])
+            centers[col] = q50
+            scales[col] = (q75 - q25) or 1.0
+        return medians, centers, scales
+
+    def transform_file(self, path: str, output_dir: str) -> dict:
+        """
+        Transforma o CSV bloco a bloco, gravando `part-NNNNN` (features + alvo) em `output_dir`.
+        Retorna o manifesto (também salvo em output_dir/manifest.json).
+        """
+        if not self.is_fitted:
+            raise ValueError("StreamingWatchPreprocessor precisa ser ajustado antes de transformar dados.")
+        os.makedirs(output_dir, exist_ok=True)
+        extension = "feather" if COLUMNAR_AVAILABLE else "csv"
+        parts = []
+
+        for i, chunk in enumerate(self._chunks(path)):
+            X = self.transform(chunk)
+            X[self.target] = chunk[self.target].to_numpy()
+            part = os.path.join(output_dir, f"part-{i:05d}.{extension}")
+            if COLUMNAR_AVAILABLE:
+                X.to_feather(part, compression='uncompressed')
+            else:
+                X.to_csv(part, index=False)
+            parts.append({'path': os.path.basename(part), 'rows': len(X)})
+
+        manifest = {'source': path, 'target': self.target, 'columns': self.output_columns, 'parts': parts}
+        with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=4)
+        logger.info(f"{sum(p['rows'] for p in parts)} linhas transformadas em {len(parts)} blocos em {output_dir}")
+        return manifest
+
+
+def iter_transformed_chunks(output_dir: str, columns: list = None):
+    """Lê de volta os blocos gravados por transform_file, um por vez."""
+    with open(os.path.join(output_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    for part in manifest['parts']:
+        path = os.path.join(output_dir, part['path'])
+        yield pd.read_feather(path, columns=columns) if path.endswith(".feather") else pd.read_csv(path, usecols=columns)
+
+
+def preprocess_file_streaming(path: str, target: str, output_dir: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                              preprocessor: WatchPreprocessor = None):
+    """
+    Versão fora da memória de preprocess_data: ajusta (se necessário) em blocos e grava os
+    blocos transformados em `output_dir`. Retorna (manifesto, pré-processador).
+    """
+    if preprocessor is None:
+        preprocessor = StreamingWatchPreprocessor(target, chunk_size).fit_file(path)
+    elif not isinstance(preprocessor, StreamingWatchPreprocessor):
+        raise TypeError("Use um StreamingWatchPreprocessor para transformar arquivos em blocos.")
+    return preprocessor.transform_file(path, output_dir), preprocessor
@@ -0,0 +1,138 @@
+import os
+import numpy as np
+import pandas as pd
+from models.logs.logger import logger
+
+# Colunas do Watches.csv, na ordem do arquivo original
+COLUMNS = ['Unnamed: 0', 'name', 'price', 'brand', 'model', 'ref', 'mvmt', 'casem', 'bracem', 'yop', 'cond',
+           'sex', 'size', 'condition']
+
+# Marcas com o preço mediano aproximado (USD). A frequência segue uma lei de potência: poucas marcas
+# concentram a maior parte das listagens, como no dataset real.
+BRANDS = {
+    'Rolex': 12500, 'Omega': 4800, 'Patek Philippe': 45000, 'Audemars Piguet': 38000, 'Cartier': 6200,
+    'Breitling': 4200, 'TAG Heuer': 2100, 'IWC': 6500, 'Panerai': 7000, 'Jaeger-LeCoultre': 8500,
+    'Tudor': 3400, 'Hublot': 11000, 'Longines': 1800, 'Seiko': 450, 'Zenith': 6000, 'Vacheron Constantin': 30000,
+    'A. Lange & Söhne': 42000, 'Richard Mille': 180000, 'Breguet': 22000, 'Grand Seiko': 5200,
+    'Tissot': 550, 'Oris': 1700, 'Hamilton': 650, 'Chopard': 9000, 'Blancpain': 13000, 'Bulgari': 7500,
+    'Girard-Perregaux': 8000, 'Ulysse Nardin': 7800, 'Franck Muller': 9500, 'Montblanc': 3100,
+}
+MOVEMENTS = (['Automatic', 'Manual winding', 'Quartz', 'Solar'], [0.72, 0.14, 0.12, 0.02])
+CASE_MATERIALS = (
+    ['Steel', 'Yellow gold', 'Rose gold', 'White gold', 'Gold/Steel', 'Titanium', 'Ceramic', 'Platinum', 'Bronze',
+     'Carbon', None],
+    [0.52, 0.11, 0.08, 0.06, 0.07, 0.05, 0.04, 0.02, 0.01, 0.01, 0.03],
+)
+BRACELET_MATERIALS = (
+    ['Steel', 'Leather', 'Rubber', 'Yellow gold', 'Rose gold', 'White gold', 'Gold/Steel', 'Textile', 'Titanium',
+     'Crocodile skin', None],
+    [0.38, 0.22, 0.12, 0.06, 0.04, 0.03, 0.05, 0.03, 0.02, 0.02, 0.03],
+)
+CONDITIONS = (['Unworn', 'New', 'Very good', 'Good', 'Fair', 'Incomplete'], [0.18, 0.22, 0.36, 0.17, 0.05, 0.02])
+CONDITION_EFFECT = {'Unworn': 0.12, 'New': 0.08, 'Very good': 0.0, 'Good': -0.12, 'Fair': -0.3, 'Incomplete': -0.45}
+SEX = (["Men's watch/Unisex", "Women's watch"], [0.84, 0.16])
+CONDITION_GRADES = (['A', 'B', 'C', 'D'], [0.4, 0.35, 0.2, 0.05])
+YEAR_RANGE = (1950, 2024)
+
+
+def _choice(rng, options: tuple, n_rows: int) -> np.ndarray:
+    values, weights = options
+    return np.array(values, dtype=object)[rng.choice(len(values), n_rows, p=weights)]
+
+
+def _prices(rng, log_price: np.ndarray) -> np.ndarray:
+    """'$12,500' com vírgulas de milhar, ~4% 'Price on request' e ~1% ausentes."""
+    prices = np.maximum(np.exp(log_price).round(-1), 50).astype(np.int64)
+    price = pd.Series(prices).map('${:,}'.format).to_numpy(dtype=object)
+    draw = rng.random(len(prices))
+    price[draw < 0.04] = 'Price on request'
+    price[(draw >= 0.04) & (draw < 0.05)] = None
+    return price
+
+
+def _years(rng, years: np.ndarray) -> np.ndarray:
+    """Ano como no site de origem: limpo, aproximado, por década, desconhecido ou ausente."""
+    text = years.astype(str).astype(object)
+    draw = rng.random(len(years))
+    text[draw < 0.12] = 'Unknown'
+    approx = (draw >= 0.12) & (draw < 0.20)
+    text[approx] = [f"{y} (Approximation)" for y in years[approx]]
+    circa = (draw >= 0.20) & (draw < 0.23)
+    text[circa] = [f"c. {y}" for y in years[circa]]
+    decade = (draw >= 0.23) & (draw < 0.25)
+    text[decade] = [f"{y // 10 * 10}s" for y in years[decade]]
+    text[(draw >= 0.25) & (draw < 0.27)] = None
+    return text
+
+
+def _sizes(rng, diameters: np.ndarray) -> np.ndarray:
+    """'40 mm', '38.5 mm', '40 x 48 mm' (caixas retangulares) ou ausente."""
+    half = rng.random(len(diameters)) < 0.08
+    values = np.where(half, diameters + 0.5, diameters)
+    text = pd.Series(values).map(lambda v: f"{v:g} mm").to_numpy(dtype=object)
+    draw = rng.random(len(diameters))
+    rectangular = draw < 0.05
+    text[rectangular] = [f"{int(d)} x {int(d) + 8} mm" for d in diameters[rectangular]]
+    text[(draw >= 0.05) & (draw < 0.09)] = None
+    return text
+
+
+def generate_listings(n_rows: int, seed: int = 1179, start_index: int = 0) -> pd.DataFrame:
+    """
+    Listagens sintéticas com o esquema do Watches.csv e distribuições próximas das reais.
+
+    O preço (em log) depende de marca, modelo, ouro/platina, tamanho, idade e condição, mais ruído,
+    para que os modelos tenham sinal para aprender. `start_index` continua a coluna 'Unnamed: 0'
+    ao gerar o arquivo em blocos.
+    """
+    rng = np.random.default_rng(seed)
+    brand_names = np.array(list(BRANDS), dtype=object)
+    brand_weights = 1.0 / np.arange(1, len(BRANDS) + 1) ** 1.1
+    brand_idx = rng.choice(len(BRANDS), n_rows, p=brand_weights / brand_weights.sum())
+    brands = brand_names[brand_idx]
+
+    # Modelos por marca com cauda longa (Zipf): poucos muito listados, centenas de raros
+    model_rank = np.minimum(rng.zipf(1.5, n_rows), 600)
+    models = pd.Series(brands).str.split().str[0].to_numpy(dtype=object) + ' ' + model_rank.astype(str).astype(object)
+    # Efeito fixo de cada modelo, reprodutível a partir do rank (o mesmo em qualquer bloco)
+    model_effect = np.sin(model_rank * 12.9898) * 0.35
+
+    casem = _choice(rng, CASE_MATERIALS, n_rows)
+    bracem = _choice(rng, BRACELET_MATERIALS, n_rows)
+    precious = pd.Series(casem).astype(str).str.contains('gold|Platinum', case=False).to_numpy()
+    diameters = np.clip(rng.normal(40, 3.2, n_rows).round(), 24, 50)
+    years = rng.integers(*YEAR_RANGE, n_rows)
+    cond = _choice(rng, CONDITIONS, n_rows)
+
+    log_price = (np.log(np.array(list(BRANDS.values()), dtype=float))[brand_idx] + model_effect + 0.55 * precious
+                 + 0.02 * (diameters - 40) - 0.004 * (YEAR_RANGE[1] - years)
+                 + pd.Series(cond).map(CONDITION_EFFECT).to_numpy() + rng.normal(0, 0.35, n_rows))
+
+    return pd.DataFrame({
+        'Unnamed: 0': np.arange(start_index, start_index + n_rows),
+        'name': brands + ' ' + models,
+        'price': _prices(rng, log_price),
+        'brand': brands,
+        'model': models,
+        'ref': rng.integers(1000, 999999, n_rows).astype(str),
+        'mvmt': _choice(rng, MOVEMENTS, n_rows),
+        'casem': casem,
+        'bracem': bracem,
+        'yop': _years(rng, years),
+        'cond': cond,
+        'sex': _choice(rng, SEX, n_rows),
+        'size': _sizes(rng, diameters),
+        'condition': _choice(rng, CONDITION_GRADES, n_rows),
+    }, columns=COLUMNS)
+
+
+def write_listings_csv(path: str, n_rows: int, seed: int = 1179, chunk_rows: int = 500_000) -> str:
+    """Grava `n_rows` listagens em CSV, em blocos (10M linhas não precisam caber na memória)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = f"{path}.partial"
+    for start in range(0, n_rows, chunk_rows):
+        chunk = generate_listings(min(chunk_rows, n_rows - start), seed=seed + start, start_index=start)
+        chunk.to_csv(partial, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(partial, path)
+    logger.info(f"{n_rows} listagens sintéticas gravadas em {path}")
+    return path
@@ -1,49 +1,118 @@
 import os
+import time
 import pandas as pd
 from tpot import TPOTRegressor
+from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
-from models.service.data_preprocessor import preprocess_data
+from models.service.data_preprocessor import preprocess_data, WatchPreprocessor, DROP_COLUMNS
 from models.logs.logger import logger
+from models.logs.tracing import span
+from models.service.dataset_cache import read_dataset
+from models.service.evaluation_cache import data_fingerprint
+from models.service.model_registry import ModelRegistry
 
-def train_tpot_model(file_path: str, target_column: str):
+TPOT_MAX_TIME_MINS = 30
+TPOT_CHECKPOINT_DIR = "models/checkpoints/tpot"
+TPOT_MEMORY_DIR = "models/cache/tpot"
+TPOT_POPULATION = 20
+TPOT_CV = 5
+# Avaliações que o orçamento precisa comportar (população x gerações do antigo modo rápido)
+TPOT_TARGET_EVALUATIONS = 100
+MIN_SAMPLE_ROWS = 2_000
+PROBE_ROWS = 5_000
+
+
+def resolve_n_jobs(n_jobs: int) -> int:
+    return (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+
+
+def budget_sample_size(X: pd.DataFrame, y: pd.Series, max_time_mins: float, n_jobs: int = -1,
+                       evaluations: int = TPOT_TARGET_EVALUATIONS, cv: int = TPOT_CV) -> int:
+    """
+    Número de linhas para o TPOT caber no orçamento de tempo.
+
+    Mede o custo por linha de um pipeline de referência (floresta pequena) numa fatia dos dados e
+    escolhe o tamanho que permite `evaluations` pipelines com `cv` folds cada, divididos entre os workers.
+    """
+    probe = min(len(X), PROBE_ROWS)
+    start = time.perf_counter()
+    with span("tpot.budget_probe", rows=probe):
+        RandomForestRegressor(n_estimators=10, random_state=42, n_jobs=1).fit(X.iloc[:probe], y.iloc[:probe])
+    seconds_per_row = (time.perf_counter() - start) / probe
+    budget_seconds = max_time_mins * 60 * resolve_n_jobs(n_jobs)
+    rows = int(budget_seconds / (evaluations * cv * seconds_per_row))
+    return max(min(rows, len(X)), min(MIN_SAMPLE_ROWS, len(X)))
+
+
+def train_tpot_model(file_path: str, target_column: str, preprocessor: WatchPreprocessor = None,
+                     registry: ModelRegistry = None, max_time_mins: float = TPOT_MAX_TIME_MINS, n_jobs: int = -1):
     logger.info(f"Carregando os dados do arquivo: {file_path}")
     try:
-        data = pd.read_csv(file_path)
-        data = data.sample(frac=0.1, random_state=42)  # Usa apenas 0.1% do dataset para acelerar
-        logger.info(f"Dados carregados e amostrados com sucesso: {len(data)} linhas.")
+        data = read_dataset(file_path, exclude=DROP_COLUMNS)
+        logger.info(f"Dados carregados com sucesso: {len(data)} linhas.")
     except Exception as e:
         logger.error(f"Erro ao carregar os dados: {e}")
         raise e
 
     logger.info("Iniciando o pré-processamento dos dados.")
     try:
-        X_preprocessed, y, preprocessor = preprocess_data(data, target_column)
+        X_preprocessed, y, preprocessor = preprocess_data(data, target_column, preprocessor)
         logger.info("Pré-processamento concluído com sucesso.")
     except Exception as e:
         logger.error(f"Erro durante o pré-processamento: {e}")
         raise e
 
+    return train_tpot_on_data(X_preprocessed, y, registry=registry or ModelRegistry(), preprocessor=preprocessor,
+                              target=target_column, max_time_mins=max_time_mins, n_jobs=n_jobs)
+
+
+def train_tpot_on_data(X_preprocessed: pd.DataFrame, y: pd.Series, registry: ModelRegistry = None,
+                       preprocessor: WatchPreprocessor = None, target: str = 'price',
+                       max_time_mins: float = TPOT_MAX_TIME_MINS, n_jobs: int = -1,
+                       checkpoint_dir: str = TPOT_CHECKPOINT_DIR, memory_dir: str = TPOT_MEMORY_DIR):
+    """
+    Treina o TPOT sobre dados já pré-processados (reutilizados entre estágios da pipeline).
+    Com `registry`, o pipeline otimizado é registrado com o score no conjunto de teste.
+
+    A busca para em `max_time_mins` e usa `n_jobs` workers (-1: todos os núcleos). O tamanho da amostra
+    de treino sai do orçamento (ver budget_sample_size). Os transformadores ajustados ficam em cache
+    em `memory_dir` e a população é salva periodicamente em `checkpoint_dir`/<fingerprint dos dados>:
+    uma busca interrompida recomeça de onde parou ao rodar de novo com os mesmos dados.
+    """
     if X_preprocessed.shape[0] != len(y):
         logger.error(f"Tamanhos diferentes: X={X_preprocessed.shape[0]}, y={len(y)}")
         raise ValueError("Tamanhos de X e y incompatíveis.")
     else:
         logger.info(f"Número de amostras: {X_preprocessed.shape[0]}")
 
-    # Divisão dos dados com uma pequena fatia de teste (0.1%)
+    # Divisão dos dados com 10% para teste
     X_train, X_test, y_train, y_test = train_test_split(X_preprocessed, y, test_size=0.1, random_state=42)
-    logger.info(f"Treino: {len(X_train)}, Teste: {len(X_test)}")
+    sample_rows = budget_sample_size(X_train, y_train, max_time_mins, n_jobs)
+    if sample_rows < len(X_train):
+        X_train = X_train.sample(n=sample_rows, random_state=42)
+        y_train = y_train.loc[X_train.index]
     logger.info(f"Tamanho do treino: {len(X_train)} | Tamanho do teste: {len(X_test)}")
-    logger.info(f"Valores únicos em y_test: {y_test.unique()}")
-    logger.info("Treinando TPOT Regressor (modo rápido).")
-    try:
 
+    # O checkpoint segue os dados completos: a amostra varia com a calibração do orçamento
+    fingerprint = data_fingerprint(X_preprocessed, y)
+    checkpoint_folder = os.path.join(checkpoint_dir, fingerprint[:16])
+    os.makedirs(checkpoint_folder, exist_ok=True)
+    os.makedirs(memory_dir, exist_ok=True)
+    if os.listdir(checkpoint_folder):
+        logger.info(f"Retomando a busca do TPOT a partir do checkpoint em {checkpoint_folder}")
+    logger.info(f"Treinando TPOT Regressor (orçamento de {max_time_mins} min, {resolve_n_jobs(n_jobs)} workers).")
+    try:
         tpot = TPOTRegressor(
-            generations=5,
-            population_size=20,
-            random_state=42,
-            n_jobs=1
+            population_size=TPOT_POPULATION,
+            cv=TPOT_CV,
+            max_time_mins=max_time_mins,
+            n_jobs=resolve_n_jobs(n_jobs),
+            memory=memory_dir,
+            periodic_checkpoint_folder=checkpoint_folder,
+            random_state=42
         )
-        tpot.fit(X_train, y_train)
+        with span("tpot.fit", inputs=X_train, max_time_mins=max_time_mins):
+            tpot.fit(X_train, y_train)
         logger.info("Modelo treinado com sucesso.")
     except Exception as e:
         logger.error(f"Erro durante o treinamento do TPOT: {e}")
@@ -52,7 +121,7 @@ def train_tpot_model(file_path: str, target_column: str):
     # Avaliação do modelo
     if hasattr(tpot, 'fitted_pipeline_'):
         try:
-            score = score = tpot.fitted_pipeline_.score(X_test, y_test)
+            score = tpot.fitted_pipeline_.score(X_test, y_test)
             logger.info(f"Score no teste: {score}")
             logger.info(f"Pipeline otimizado: {tpot.fitted_pipeline_}")
         except Exception as e:
@@ -62,4 +131,12 @@ def train_tpot_model(file_path: str, target_column: str):
         logger.error("Pipeline não foi treinado corretamente.")
         return None, None, None
 
+    if registry is not None:
+        registry.register(
+            tpot.fitted_pipeline_, target, preprocessor=preprocessor, source="tpot", score=score, metric="r2_holdout",
+            features=X_preprocessed.columns.tolist(), data_fingerprint=fingerprint,
+            metrics={'R2_holdout': score, 'train_rows': len(X_train)},
+            params={'max_time_mins': max_time_mins, 'population_size': TPOT_POPULATION, 'cv': TPOT_CV}
+        )
+
     return tpot, score, tpot.fitted_pipeline_
@@ -0,0 +1,21 @@
+# ports/dataset_source_port.py
+from abc import ABC, abstractmethod
+
+class DatasetSourcePort(ABC):
+    """Defines where datasets are fetched from (Kaggle or a local stand-in)."""
+
+    @abstractmethod
+    def remote_version(self, dataset_name: str) -> dict:
+        """
+        Return metadata identifying the current remote version of the dataset
+        (e.g. file names, sizes and dates). It must change whenever the content changes.
+        """
+        pass
+
+    @abstractmethod
+    def download_archive(self, dataset_name: str, dest_dir: str) -> str:
+        """
+        Download the dataset as a zip archive into dest_dir, without extracting it,
+        and return the archive path.
+        """
+        pass
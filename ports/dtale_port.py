@@ -1,14 +1,17 @@
 # ports/dtale_port.py
 from abc import ABC, abstractmethod
+from typing import Callable
 import pandas as pd
 
 class DtalePort(ABC):
     """Defines how we show/edit data with Dtale."""
     
     @abstractmethod
-    def open_in_dtale(self, df: pd.DataFrame) -> pd.DataFrame:
+    def open_in_dtale(self, df: pd.DataFrame, on_save: Callable[[pd.DataFrame], None] = None) -> pd.DataFrame:
         """
         Launch dtale for interactive editing and
         return the edited dataframe.
+        If `on_save` is given, it is called with the current data every time
+        the user saves, so edits can be persisted while the session is open.
         """
         pass
@@ -0,0 +1,15 @@
+# ports/inference_port.py
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+class InferencePort(ABC):
+    """Defines how we score listings with an already trained model."""
+
+    @abstractmethod
+    def predict(self, listings: pd.DataFrame) -> np.ndarray:
+        """
+        Score raw listings (same columns as the dataset, target optional)
+        and return one predicted price per row.
+        """
+        pass
@@ -0,0 +1,27 @@
+# ports/similarity_port.py
+from abc import ABC, abstractmethod
+import numpy as np
+
+class SimilarityPort(ABC):
+    """Defines how we find the listings closest to a query in the preprocessed feature space."""
+
+    @abstractmethod
+    def add(self, ids: np.ndarray, features: np.ndarray) -> int:
+        """
+        Add listings (one feature row per id) to the index without rebuilding it from scratch.
+        Return how many rows were added.
+        """
+        pass
+
+    @abstractmethod
+    def query(self, features: np.ndarray, k: int) -> tuple:
+        """
+        Batch query: for each feature row return its k nearest listings as
+        (distances, ids), both arrays of shape (n_queries, k), closest first.
+        """
+        pass
+
+    @abstractmethod
+    def save(self) -> str:
+        """Persist the index and return where it was written."""
+        pass